@@ -11,7 +11,7 @@ from larch.utils.logging import getLogger
 _logger = getLogger("larch.io.mergegroups")
 
 def merge_groups(grouplist, master=None, xarray='energy', yarray='mu',
-                 kind='cubic', trim=True, calc_yerr=True):
+                 kind='cubic', trim=True, calc_yerr=True, xshifts=None):
     """merge arrays from a list of groups.
 
     Arguments
@@ -23,14 +23,23 @@ def merge_groups(grouplist, master=None, xarray='energy', yarray='mu',
      kind        interpolation kind ['cubic']
      trim        whether to trim to the shortest energy range [True]
      calc_yerr   whether to use the variance in the input as yerr [True]
+     xshifts     list of shifts to add to x-array of each group [None]
 
     Returns
     --------
      group with x-array and y-array containing merged data.
 
+    Notes
+    -----
+     The mean and standard deviation are accumulated one group at a time,
+     so that the interpolated arrays are never all held at once.
     """
     if master is None:
         master = grouplist[0]
+    if xshifts is None:
+        xshifts = [0]*len(grouplist)
+    elif len(xshifts) != len(grouplist):
+        raise ValueError("xshifts must have the same length as grouplist")
 
     xarr = getattr(master, xarray)
     dxperc = np.percentile(abs(np.diff(xarr)), [1, 2, 25])
@@ -41,18 +50,21 @@ def merge_groups(grouplist, master=None, xarray='energy', yarray='mu',
     xout = remove_nans(xout, interp=True)
     xmins = [min(xout)]
     xmaxs = [max(xout)]
-    yvals = []
 
-    for g in grouplist:
+    # running mean and sum of squared deviations (Welford)
+    yave = np.zeros(len(xout))
+    ysqr = np.zeros(len(xout))
+    for ngroup, (g, xshift) in enumerate(zip(grouplist, xshifts)):
         x = remove_nans(remove_dups(getattr(g, xarray), dxmin), interp=True)
+        x = x + xshift
         y = remove_nans(getattr(g, yarray), interp=True)
-        yvals.append(interp(x, y, xout, kind=kind))
+        yint = interp(x, y, xout, kind=kind)
+        delta = yint - yave
+        yave += delta/(ngroup+1)
+        ysqr += delta*(yint - yave)
         xmins.append(min(x))
         xmaxs.append(max(x))
-
-    yvals = np.array(yvals)
-    yave = yvals.mean(axis=0)
-    ystd = yvals.std(axis=0)
+    ystd = np.sqrt(ysqr/max(1, len(grouplist)))
 
     xout_increasing = len(np.where(np.diff(np.argsort(xout))!=1)[0]) == 0
     if trim and xout_increasing:
@@ -74,8 +86,8 @@ def merge_groups(grouplist, master=None, xarray='energy', yarray='mu',
         # if the derivative gets much worse, use linear interpolation
         if max(np.diff(yave)) > 50*max(np.diff(y0)):
             grp = merge_groups(grouplist, master=master, xarray=xarray,
-                               yarray=yarray, trim=trim,
-                               calc_yerr=calc_yerr, kind='linear')
+                               yarray=yarray, trim=trim, calc_yerr=calc_yerr,
+                               kind='linear', xshifts=xshifts)
     return grp
 
 def imin(arr, debug=False):
@@ -24,8 +24,10 @@ from . import fitmodels
 
 from .curvefit import curvefit_setup, curvefit_run
 from .convolution1D import glinbroad
-from .lincombo_fitting import lincombo_fit, lincombo_fitall, groups2matrix
-from .pca import pca_train, pca_fit, nmf_train, save_pca_model, read_pca_model
+from .lincombo_fitting import (lincombo_fit, lincombo_fitall,
+                               lincombo_fit_stack, groups2matrix)
+from .pca import (pca_train, pca_fit, nmf_train, save_pca_model,
+                  read_pca_model, pca_train_incremental, pca_fit_stack)
 from .learn_regress import pls_train, pls_predict, lasso_train, lasso_predict
 from .gridxyz import gridxyz
 from .spline import spline_rep, spline_eval
@@ -46,6 +48,8 @@ _larch_builtins = {'_math': dict(linregress=linregress, polyfit=polyfit,
                                  glinbroad=glinbroad, gridxyz=gridxyz,
                                  pca_train=pca_train,
                                  pca_fit=pca_fit,
+                                 pca_train_incremental=pca_train_incremental,
+                                 pca_fit_stack=pca_fit_stack,
                                  save_pca_model=save_pca_model,
                                  read_pca_model=read_pca_model,
                                  nmf_train=nmf_train,
@@ -59,6 +63,7 @@ _larch_builtins = {'_math': dict(linregress=linregress, polyfit=polyfit,
                                  fit_peak=fit_peak,
                                  lincombo_fit=lincombo_fit,
                                  lincombo_fitall=lincombo_fitall,
+                                 lincombo_fit_stack=lincombo_fit_stack,
                                  spline_rep=spline_rep,
                                  spline_eval=spline_eval,
                                  gaussian=gaussian,
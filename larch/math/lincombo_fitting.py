@@ -7,6 +7,8 @@ import sys
 import time
 import json
 import copy
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing as mp
 
 from itertools import combinations
 from glob import glob
@@ -210,10 +212,231 @@ def lincombo_fit(group, components, weights=None, minvals=None,
                  arrayname=arrayname, rfactor=rfactor,
                  xmin=xmin, xmax=xmax)
 
+def _lincombo_start(lb, ub, sum_to_one=True):
+    """feasible starting weights for _lincombo_qp, or None if there are none"""
+    x = np.clip(np.ones(len(lb))/len(lb), lb, ub)
+    if sum_to_one:
+        resid = 1.0 - x.sum()
+        room = (ub - x) if resid > 0 else (lb - x)
+        if abs(room.sum()) < abs(resid):
+            return None
+        for i in range(len(x)):
+            delta = min(abs(room[i]), abs(resid))*np.sign(resid)
+            x[i] += delta
+            resid -= delta
+    return x
+
+def _lincombo_eqp(gram, bvec, x, free, sum_to_one=True):
+    """solve for the free weights with all other weights held fixed"""
+    fixed = ~free
+    rhs = bvec[free] - gram[np.ix_(free, fixed)] @ x[fixed]
+    amat = gram[np.ix_(free, free)]
+    if sum_to_one:
+        nfree = len(rhs)
+        kkt = np.ones((nfree+1, nfree+1))
+        kkt[:nfree, :nfree] = amat
+        kkt[nfree, nfree] = 0.0
+        amat = kkt
+        rhs = np.append(rhs, 1.0 - x[fixed].sum())
+    out = np.linalg.lstsq(amat, rhs, rcond=None)[0]
+    xnew = x.copy()
+    xnew[free] = out[:free.sum()]
+    return xnew
+
+def _lincombo_qp(gram, bvec, lb, ub, sum_to_one=True, maxiter=None):
+    """minimize |A.c - y|^2 with lb <= c <= ub and, optionally, sum(c) = 1,
+    given gram = A.T @ A and bvec = A.T @ y, with a primal active-set method.
+
+    Returns (weights, converged), with weights of None if the constraints
+    cannot be met, and converged False if maxiter iterations were reached
+    before the optimal weights were found.
+    """
+    nvar = len(bvec)
+    x = _lincombo_start(lb, ub, sum_to_one)
+    if x is None:
+        return None, False
+    if maxiter is None:
+        maxiter = 20*(nvar+1)
+    tol = 1.e-12*max(1.0, abs(np.diag(gram)).max())
+    fixed = np.zeros(nvar, dtype=bool)
+    atmax = np.zeros(nvar, dtype=bool)
+    for _ in range(maxiter):
+        free = ~fixed
+        step = _lincombo_eqp(gram, bvec, x, free, sum_to_one) - x
+        if abs(step).max() <= 1.e-12*(1.0 + abs(x).max()):
+            # check the Lagrange multipliers of the weights held at bounds
+            grad = gram @ x - bvec
+            if sum_to_one and free.any():
+                grad = grad - grad[free].mean()
+            mult = np.where(atmax, grad, -grad)
+            mult[free] = 0.0
+            imax = np.argmax(mult)
+            if mult[imax] <= tol:
+                return x, True
+            fixed[imax] = atmax[imax] = False
+            continue
+        # take as much of the step as bounds allow
+        alpha, iblock = 1.0, None
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lim = np.where(step < 0, (lb - x)/step,
+                           np.where(step > 0, (ub - x)/step, np.inf))
+        lim[fixed] = np.inf
+        if lim.min() < 1.0:
+            iblock = np.argmin(lim)
+            alpha = max(0.0, lim[iblock])
+        x = x + alpha*step
+        if iblock is not None:
+            atmax[iblock] = step[iblock] > 0
+            x[iblock] = ub[iblock] if atmax[iblock] else lb[iblock]
+            fixed[iblock] = True
+    return x, False
+
+def lincombo_solve(gram, bvec, subsets, minvals, maxvals, sum_to_one=True):
+    """solve the bounded, linear least-squares problems for linear
+    combinations of many subsets of a common set of components.
+
+    Arguments
+    ---------
+      gram        (ncomps, ncomps) matrix of component dot products, A.T @ A
+      bvec        (ncomps,) dot products of components with data, A.T @ y
+      subsets     list of tuples of component indices to fit
+      minvals     (ncomps,) array of min weights
+      maxvals     (ncomps,) array of max weights
+      sum_to_one  bool, whether weights must sum to 1.0 [True]
+
+    Returns
+    -------
+      list of weights arrays, one for each subset, with None for subsets
+      for which the bounds and sum_to_one cannot all be met, or for which
+      the active-set method did not converge.
+
+    Notes
+    -----
+      All subsets with the same number of components are first solved
+      together without bounds.  Only those subsets for which this violates
+      the bounds are then solved one at a time with an active-set method.
+    """
+    gram = np.asarray(gram, dtype=float)
+    bvec = np.asarray(bvec, dtype=float)
+    lb = np.asarray(minvals, dtype=float)
+    ub = np.asarray(maxvals, dtype=float)
+    out = [None]*len(subsets)
+    bysize = {}
+    for i, subset in enumerate(subsets):
+        bysize.setdefault(len(subset), []).append(i)
+
+    tol = 1.e-10*max(1.0, abs(lb[np.isfinite(lb)]).max(initial=0),
+                     abs(ub[np.isfinite(ub)]).max(initial=0))
+    for nsub, isubs in bysize.items():
+        index = np.array([subsets[i] for i in isubs], dtype=int)
+        amat = gram[index[:, :, None], index[:, None, :]]
+        rhs = bvec[index]
+        if sum_to_one:
+            kkt = np.ones((len(isubs), nsub+1, nsub+1))
+            kkt[:, :nsub, :nsub] = amat
+            kkt[:, nsub, nsub] = 0.0
+            amat = kkt
+            rhs = np.concatenate((rhs, np.ones((len(isubs), 1))), axis=1)
+        try:
+            wts = np.linalg.solve(amat, rhs[..., None])[:, :nsub, 0]
+            good = np.all(np.isfinite(wts) & (wts >= lb[index]-tol) &
+                          (wts <= ub[index]+tol), axis=1)
+        except np.linalg.LinAlgError:
+            wts = None
+            good = np.zeros(len(isubs), dtype=bool)
+        for j, isub in enumerate(isubs):
+            idx = index[j]
+            if good[j]:
+                out[isub] = np.clip(wts[j], lb[idx], ub[idx])
+            else:
+                wts_qp, converged = _lincombo_qp(gram[np.ix_(idx, idx)],
+                                                 bvec[idx], lb[idx], ub[idx],
+                                                 sum_to_one)
+                if converged:
+                    out[isub] = wts_qp
+    return out
+
+def _lincombo_output(xdat, ydat, ycomps, labels, wts, minvals, maxvals,
+                     sum_to_one, arrayname, xmin, xmax):
+    """build the output group for a linear combination with known weights,
+    with the same contents as the output of lincombo_fit()"""
+    npts, ncomps = ycomps.shape
+    yfit = ycomps @ wts
+    resid = yfit - ydat
+    chisqr = max((resid**2).sum(), 1.e-250*npts)
+    nvarys = ncomps - 1 if sum_to_one else ncomps
+    nfree = npts - nvarys
+    redchi = chisqr / max(1, nfree)
+    neg2_log_likel = npts * np.log(chisqr/npts)
+    ls_vals = np.linalg.lstsq(ycomps, ydat, rcond=-1)[0]
+
+    # covariance from the Jacobian of the varying weights
+    jac = ycomps[:, :nvarys]
+    if sum_to_one:
+        jac = jac - ycomps[:, -1:]
+    covar, errorbars = None, False
+    try:
+        covar = np.linalg.inv(jac.T @ jac) * redchi
+        errorbars = bool(np.all(np.isfinite(covar)) and np.all(np.diag(covar) > 0))
+    except np.linalg.LinAlgError:
+        pass
+    if not errorbars:
+        covar = None
+
+    pars = lmfit.Parameters()
+    pars.add('e0_shift', value=0., vary=False)
+    for i in range(ncomps):
+        pars.add('c%i' % i, value=wts[i], min=minvals[i], max=maxvals[i])
+    if sum_to_one:
+        expr = ['1'] + ['c%i' % i for i in range(ncomps-1)]
+        pars['c%i' % (ncomps-1)].expr = '-'.join(expr)
+    pars.add('total', expr='+'.join(['c%i' % i for i in range(ncomps)]))
+    pars.update_constraints()
+    var_names = ['c%i' % i for i in range(nvarys)]
+    if errorbars:
+        stderr = np.sqrt(np.diag(covar))
+        for i, name in enumerate(var_names):
+            pars[name].stderr = stderr[i]
+            pars[name].correl = {vname: covar[i, j]/(stderr[i]*stderr[j])
+                                 for j, vname in enumerate(var_names) if j != i}
+        ctotal = np.sqrt(max(0, covar.sum()))
+        if sum_to_one:
+            pars['c%i' % (ncomps-1)].stderr = ctotal
+            pars['total'].stderr = 0.0
+        else:
+            pars['total'].stderr = ctotal
+
+    result = lmfit.minimizer.MinimizerResult(
+        params=pars, method='linear least-squares', nfev=1,
+        success=True, message='Linear least-squares solution.',
+        errorbars=errorbars, var_names=var_names, covar=covar,
+        init_vals=list(wts[:nvarys]), residual=resid, ndata=npts,
+        nvarys=nvarys, nfree=nfree, chisqr=chisqr, redchi=redchi,
+        aic=neg2_log_likel + 2*nvarys,
+        bic=neg2_log_likel + np.log(npts)*nvarys)
+
+    weights, weights_lstsq = {}, {}
+    params, fcomps = {}, {}
+    params['e0_shift'] = copy.deepcopy(pars['e0_shift'])
+    for i, label in enumerate(labels):
+        weights[label] = wts[i]
+        params[label] = copy.deepcopy(pars['c%i' % i])
+        weights_lstsq[label] = ls_vals[i]
+        fcomps[label] = ycomps[:, i] * wts[i]
+    params['total'] = copy.deepcopy(pars['total'])
+
+    rfactor = ((ydat-yfit)**2).sum() / (ydat**2).sum()
+    return Group(result=result, chisqr=chisqr, redchi=redchi,
+                 params=params, weights=weights, weights_lstsq=weights_lstsq,
+                 xdata=xdat, ydata=ydat, yfit=yfit, ycomps=fcomps,
+                 arrayname=arrayname, rfactor=rfactor,
+                 xmin=xmin, xmax=xmax)
+
 def lincombo_fitall(group, components, weights=None, minvals=None, maxvals=None,
                     arrayname='norm', xmin=-np.inf, xmax=np.inf,
                     max_ncomps=None, sum_to_one=True, vary_e0=False,
-                    min_weight=0.0005, max_output=16):
+                    min_weight=0.0005, max_output=16, executor=None,
+                    max_workers=None):
     """perform linear combination fittings for a group with all combinations
     of 2 or more of the components given
 
@@ -232,6 +455,9 @@ def lincombo_fitall(group, components, weights=None, minvals=None, maxvals=None,
       vary_e0     bool, whether to vary e0 for data in fit [False]
       min_weight  float, minimum weight for each component to save result [0.0005]
       max_output  int, max number of outputs, sorted by reduced chi-square [16]
+      executor    None, 'threads', or 'processes' to solve chunks of
+                  combinations concurrently [None]
+      max_workers maximum number of workers for executor [cpu count]
     Returns
     -------
      list of groups with resulting weights and fit statistics, ordered by
@@ -242,6 +468,11 @@ def lincombo_fitall(group, components, weights=None, minvals=None, maxvals=None,
      1.  The names of Group members for the components must match those of the
          group to be fitted.
      2.  arrayname can be one of `norm` or `dmude`
+     3.  Unless vary_e0 is True, the data and all components are interpolated
+         once, and each combination is solved directly as a bounded linear
+         least-squares problem (see lincombo_solve), so that starting weights
+         are not needed.  With vary_e0, each combination is fit with
+         lincombo_fit().
     """
 
     ncomps = len(components)
@@ -255,6 +486,8 @@ def lincombo_fitall(group, components, weights=None, minvals=None, maxvals=None,
         minvals = -np.inf * np.ones(ncomps)
     if maxvals in (None, [None]*ncomps):
         maxvals = np.inf * np.ones(ncomps)
+    minvals = [-np.inf if v is None else v for v in minvals]
+    maxvals = [np.inf if v is None else v for v in maxvals]
 
     for i in range(ncomps):
         _save[get_label(components[i])] = (weights[i], minvals[i], maxvals[i])
@@ -263,32 +496,358 @@ def lincombo_fitall(group, components, weights=None, minvals=None, maxvals=None,
         max_ncomps = ncomps
     elif max_ncomps > 0:
         max_ncomps = int(min(max_ncomps, ncomps))
-    out = []
-    nrejected = 0
-    comps_kept = []
+
+    def fit_one(comps):
+        labs = [get_label(c) for c in comps]
+        return lincombo_fit(group, comps, weights=[1.0/len(comps)]*len(comps),
+                            arrayname=arrayname,
+                            minvals=[_save[lab][1] for lab in labs],
+                            maxvals=[_save[lab][2] for lab in labs],
+                            xmin=xmin, xmax=xmax,
+                            sum_to_one=sum_to_one, vary_e0=vary_e0)
+
+    subsets = []
     for nx in range(2, int(max_ncomps)+1):
-        for comps in combinations(components, nx):
-            labs = [get_label(c) for c in comps]
-            _wts = [1.0/nx for lab in labs]
-            _min = [_save[lab][1] for lab in labs]
-            _max = [_save[lab][2] for lab in labs]
-
-            ret = lincombo_fit(group, comps, weights=_wts,
-                               arrayname=arrayname, minvals=_min,
-                               maxvals=_max, xmin=xmin, xmax=xmax,
-                               sum_to_one=sum_to_one, vary_e0=vary_e0)
-
-            _sig_comps = []
-            for key, wt in ret.weights.items():
-                if wt > min_weight:
-                    _sig_comps.append(key)
-            _sig_comps.sort()
-            if _sig_comps not in comps_kept:
-                comps_kept.append(_sig_comps)
-                out.append(ret)
+        subsets.extend(combinations(range(ncomps), nx))
+
+    if vary_e0:
+        fits = [fit_one([components[i] for i in sub]) for sub in subsets]
+        allwts = [list(ret.weights.values()) for ret in fits]
+        redchis = [ret.redchi for ret in fits]
+    else:
+        xdat, yall = groups2matrix([group] + list(components), yname=arrayname,
+                                   xname='energy', xmin=xmin, xmax=xmax)
+        ydat, ymat = yall[0, :], yall[1:, :].transpose()
+        gram = ymat.T @ ymat
+        bvec = ymat.T @ ydat
+        yy = ydat @ ydat
+        if executor is None or len(subsets) < 2:
+            allwts = lincombo_solve(gram, bvec, subsets, minvals, maxvals,
+                                    sum_to_one=sum_to_one)
+        else:
+            executor = executor.lower()
+            if executor.startswith('thread'):
+                pool_class = ThreadPoolExecutor
+            elif executor.startswith('proc'):
+                pool_class = ProcessPoolExecutor
             else:
-                nrejected += 1
+                raise ValueError("executor must be 'threads' or 'processes'")
+            if max_workers is None:
+                max_workers = mp.cpu_count()
+            nchunk = max(1, min(max_workers, len(subsets)))
+            bounds = np.linspace(0, len(subsets), nchunk+1).astype(int)
+            allwts = []
+            with pool_class(max_workers=nchunk) as pool:
+                futures = [pool.submit(lincombo_solve, gram, bvec,
+                                       subsets[bounds[i]:bounds[i+1]],
+                                       minvals, maxvals, sum_to_one=sum_to_one)
+                           for i in range(nchunk)]
+                for fut in futures:
+                    allwts.extend(fut.result())
+        fits = [None]*len(subsets)
+        redchis = []
+        for i, wts in enumerate(allwts):
+            if wts is None:
+                # bounds and sum_to_one are inconsistent, or the active-set
+                # method did not converge: use lmfit, as before
+                fits[i] = fit_one([components[j] for j in subsets[i]])
+                allwts[i] = list(fits[i].weights.values())
+                redchis.append(fits[i].redchi)
+                continue
+            idx = list(subsets[i])
+            chisqr = yy - 2*wts@bvec[idx] + wts@gram[np.ix_(idx, idx)]@wts
+            nfree = len(ydat) - len(idx) + (1 if sum_to_one else 0)
+            redchis.append(max(chisqr, 0)/max(1, nfree))
 
-    # sort outputs by reduced chi-square
-    # print("lin combo : ", len(out), nrejected, max_output)
-    return sorted(out, key=lambda x: x.redchi)[:max_output]
+    out = []
+    comps_kept = []
+    for i, sub in enumerate(subsets):
+        _sig_comps = []
+        for j, wt in zip(sub, allwts[i]):
+            if wt > min_weight:
+                _sig_comps.append(get_label(components[j]))
+        _sig_comps.sort()
+        if _sig_comps not in comps_kept:
+            comps_kept.append(_sig_comps)
+            out.append(i)
+
+    # sort outputs by reduced chi-square, and make output groups for the best
+    out = sorted(out, key=lambda i: redchis[i])[:max_output]
+    for i in out:
+        if fits[i] is None:
+            idx = list(subsets[i])
+            fits[i] = _lincombo_output(xdat, ydat, ymat[:, idx],
+                                       [get_label(components[j]) for j in idx],
+                                       np.asarray(allwts[i], dtype=float),
+                                       [minvals[j] for j in idx],
+                                       [maxvals[j] for j in idx],
+                                       sum_to_one, arrayname, xmin, xmax)
+    return [fits[i] for i in out]
+
+def _lincombo_qp_stack(gram, bmat, lb, ub, sum_to_one=True, maxiter=None,
+                       solvers=None):
+    """_lincombo_qp() for many data arrays with the same components at once,
+    given bmat = Y @ A with shape (nspectra, ncomps).
+
+    The active-set iterations are run in lockstep, with the spectra sharing
+    the same set of weights held at bounds solved together.  The solvers for
+    each such set are kept in the solvers dict, which can be reused.
+
+    Returns (weights, converged), with converged a boolean array that is
+    False for spectra that did not reach the optimal weights in maxiter
+    iterations.  All weights are NaN if the constraints cannot be met.
+    """
+    nspec, nvar = bmat.shape
+    x0 = _lincombo_start(lb, ub, sum_to_one)
+    if x0 is None:
+        return np.nan*np.ones((nspec, nvar)), np.zeros(nspec, dtype=bool)
+    if maxiter is None:
+        maxiter = 20*(nvar+1)
+    if solvers is None:
+        solvers = {}
+    tol = 1.e-12*max(1.0, abs(np.diag(gram)).max())
+    x = np.tile(x0, (nspec, 1))
+    fixed = np.zeros((nspec, nvar), dtype=bool)
+    atmax = np.zeros((nspec, nvar), dtype=bool)
+    todo = np.arange(nspec)
+    for _ in range(maxiter):
+        if len(todo) == 0:
+            break
+        xt, ft = x[todo], fixed[todo]
+        xnew = xt.copy()
+        patterns, inverse = np.unique(ft, axis=0, return_inverse=True)
+        for ipat, pat in enumerate(patterns):
+            rows = np.where(inverse.ravel() == ipat)[0]
+            free = ~pat
+            nfree = free.sum()
+            if nfree == 0:
+                continue
+            key = pat.tobytes()
+            if key not in solvers:
+                amat = gram[np.ix_(free, free)]
+                if sum_to_one:
+                    kkt = np.ones((nfree+1, nfree+1))
+                    kkt[:nfree, :nfree] = amat
+                    kkt[nfree, nfree] = 0.0
+                    amat = kkt
+                solvers[key] = np.linalg.pinv(amat)[:nfree, :]
+            rhs = (bmat[todo[rows]][:, free] -
+                   xt[rows][:, pat] @ gram[np.ix_(pat, free)])
+            if sum_to_one:
+                rhs = np.column_stack((rhs, 1.0 - xt[rows][:, pat].sum(axis=1)))
+            xnew[np.ix_(rows, free)] = rhs @ solvers[key].T
+        step = xnew - xt
+        still = abs(step).max(axis=1) <= 1.e-12*(1.0 + abs(xt).max(axis=1))
+        done = np.zeros(len(todo), dtype=bool)
+
+        # at the solution for the current active sets:
+        # release the weight with the worst Lagrange multiplier, if any
+        if still.any():
+            rows = np.where(still)[0]
+            grad = xt[rows] @ gram - bmat[todo[rows]]
+            free = ~ft[rows]
+            if sum_to_one:
+                nfree = free.sum(axis=1)
+                lam = (grad*free).sum(axis=1) / np.maximum(nfree, 1)
+                grad = grad - lam[:, None]
+            mult = np.where(atmax[todo[rows]], grad, -grad)
+            mult[free] = 0.0
+            imax = np.argmax(mult, axis=1)
+            release = mult[np.arange(len(rows)), imax] > tol
+            irel = todo[rows[release]]
+            fixed[irel, imax[release]] = False
+            atmax[irel, imax[release]] = False
+            done[rows[~release]] = True
+
+        # otherwise, take as much of the step as bounds allow
+        rows = np.where(~still)[0]
+        if len(rows) > 0:
+            stp, xm = step[rows], xt[rows]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                lim = np.where(stp < 0, (lb - xm)/stp,
+                               np.where(stp > 0, (ub - xm)/stp, np.inf))
+            lim[ft[rows]] = np.inf
+            iblock = np.argmin(lim, axis=1)
+            amin = lim[np.arange(len(rows)), iblock]
+            blocked = amin < 1.0
+            alpha = np.where(blocked, np.maximum(amin, 0), 1.0)
+            xm = xm + alpha[:, None]*stp
+            iblk, jblk = np.where(blocked)[0], iblock[blocked]
+            upper = stp[iblk, jblk] > 0
+            xm[iblk, jblk] = np.where(upper, ub[jblk], lb[jblk])
+            x[todo[rows]] = xm
+            fixed[todo[rows[iblk]], jblk] = True
+            atmax[todo[rows[iblk]], jblk] = upper
+        todo = todo[~done]
+    converged = np.ones(nspec, dtype=bool)
+    converged[todo] = False
+    return x, converged
+
+def iter_stack_chunks(data, sel=None, chunk_size=8192):
+    """iterate over chunks of a stack of spectra, as for XANES maps
+
+    Arguments
+    ---------
+      data        array or HDF5 dataset with shape (..., npts): the last
+                  axis is x, all others index spectra
+      sel         slice to apply to the last axis [None, for all]
+      chunk_size  int, approximate number of spectra per chunk [8192]
+
+    Yields
+    ------
+      2-d float arrays of shape (nspectra, npts) in order of the
+      flattened leading axes of data, read along its first axis so that
+      an HDF5 dataset is never read into memory at once.
+    """
+    if sel is None:
+        sel = slice(None)
+    shape = tuple(data.shape[:-1])
+    if len(shape) == 0:
+        yield np.asarray(data[sel], dtype=float).reshape(1, -1)
+        return
+    nrows = shape[0]
+    rowsize = max(1, int(np.prod(shape[1:])))
+    step = max(1, chunk_size // rowsize)
+    for start in range(0, nrows, step):
+        yvals = np.asarray(data[start:start+step, ..., sel], dtype=float)
+        yield yvals.reshape(-1, yvals.shape[-1])
+
+def lincombo_fit_stack(data, x, components, minvals=None, maxvals=None,
+                       arrayname='norm', xmin=-np.inf, xmax=np.inf,
+                       sum_to_one=True, chunk_size=8192):
+    """perform linear combination fitting for a stack of spectra, as from
+    XANES imaging or time-series data, all using the same components.
+
+    Arguments
+    ---------
+      data        array or HDF5 dataset of spectra, with shape (..., npts):
+                  the last axis is x, all others index spectra (see Note 1)
+      x           array of x values (usually energy) for the last axis of data
+      components  List of groups to use as components (see Note 2)
+      minvals     array of min weights (or None to mean -inf)
+      maxvals     array of max weights (or None to mean +inf)
+      arrayname   string of array name of the components to use ['norm']
+      xmin        x-value for start of fit range [-inf]
+      xmax        x-value for end of fit range [+inf]
+      sum_to_one  bool, whether to force weights to sum to 1.0 [True]
+      chunk_size  int, approximate number of spectra to read and fit at once [8192]
+
+    Returns
+    -------
+      group with
+        weights     dict of arrays of weights by component name, each with
+                    the shape of the data without its last axis (weight maps)
+        total       array of sum of weights
+        chisqr      array of chi-square
+        redchi      array of reduced chi-square
+        rfactor     array of R-factor
+        converged   boolean array of whether the bounded solution was found
+                    (see Note 3)
+      and xdata and ycomps, the fit x values and dict of component arrays.
+
+    Notes
+    -----
+     1.  data is read in chunks along its first axis, so that an HDF5
+         dataset is never read into memory at once.
+     2.  components are interpolated onto x, which should be in the units
+         of the component arrays (k for `chi`, energy otherwise).  For
+         `chi1`, `chi2`, etc., data and components are k-weighted.
+     3.  The component matrix is factored once.  Each chunk is solved
+         without bounds in one step.  Only spectra for which that violates
+         the bounds are then solved with an active-set method, run for all
+         such spectra together.  Spectra for which this does not converge
+         are solved again one at a time, and if that also fails, their
+         weights are NaN and converged is False.
+    """
+    ncomps = len(components)
+    if minvals in (None, [None]*ncomps):
+        minvals = -np.inf * np.ones(ncomps)
+    if maxvals in (None, [None]*ncomps):
+        maxvals = np.inf * np.ones(ncomps)
+    lb = np.array([-np.inf if v is None else v for v in minvals], dtype=float)
+    ub = np.array([np.inf if v is None else v for v in maxvals], dtype=float)
+
+    yname, xname, kweight = arrayname, 'energy', 0
+    if yname.startswith('chi'):
+        xname = 'k'
+        if len(yname) > 3:
+            kweight = int(yname[3:])
+        yname = 'chi'
+
+    x = np.asarray(x, dtype=float)
+    imin = index_of(x, xmin)
+    imax = index_of(x, xmax) + 1
+    xsel = slice(imin, imax)
+    xdat = x[xsel]
+    xweight = xdat**kweight if kweight > 0 else None
+
+    labels, ycomps = [], {}
+    amat = np.zeros((len(xdat), ncomps))
+    for i, comp in enumerate(components):
+        cx, cy = get_arrays(comp, yname, xname=xname)
+        if cx is None or cy is None:
+            raise ValueError("cannot get arrays for arrayname='%s'" % yname)
+        if kweight > 0:
+            cy = cy * cx**kweight
+        amat[:, i] = interp(cx, cy, xdat, kind='cubic')
+        labels.append(get_label(comp))
+        ycomps[labels[-1]] = amat[:, i]
+
+    # factor once: weights = yvals @ proj.T + offset if no bounds are hit
+    gram = amat.T @ amat
+    if sum_to_one:
+        kkt = np.ones((ncomps+1, ncomps+1))
+        kkt[:ncomps, :ncomps] = gram
+        kkt[ncomps, ncomps] = 0.0
+        kinv = np.linalg.pinv(kkt)
+        proj = kinv[:ncomps, :ncomps] @ amat.T
+        offset = kinv[:ncomps, ncomps]
+    else:
+        proj = np.linalg.pinv(amat)
+        offset = np.zeros(ncomps)
+    tol = 1.e-10*max(1.0, abs(lb[np.isfinite(lb)]).max(initial=0),
+                     abs(ub[np.isfinite(ub)]).max(initial=0))
+    solvers = {}
+
+    shape = tuple(data.shape[:-1])
+    nspec = int(np.prod(shape))
+    wts = np.zeros((nspec, ncomps))
+    converged = np.ones(nspec, dtype=bool)
+    chisqr = np.zeros(nspec)
+    ysumsq = np.zeros(nspec)
+
+    offset_spec = 0
+    for yvals in iter_stack_chunks(data, xsel, chunk_size=chunk_size):
+        if xweight is not None:
+            yvals = yvals * xweight
+        out = yvals @ proj.T + offset
+        bad = np.where(~np.all((out >= lb-tol) & (out <= ub+tol), axis=1))[0]
+        out = np.clip(out, lb, ub)
+        ok = np.ones(len(yvals), dtype=bool)
+        if len(bad) > 0:
+            bmat = yvals[bad] @ amat
+            out[bad], ok[bad] = _lincombo_qp_stack(gram, bmat, lb, ub,
+                                                   sum_to_one=sum_to_one,
+                                                   solvers=solvers)
+            for i in np.where(~ok[bad])[0]:
+                wts_qp, ok[bad[i]] = _lincombo_qp(gram, bmat[i], lb, ub,
+                                                  sum_to_one=sum_to_one)
+                out[bad[i]] = wts_qp if ok[bad[i]] else np.nan
+        sel = slice(offset_spec, offset_spec + len(yvals))
+        wts[sel] = out
+        converged[sel] = ok
+        chisqr[sel] = ((yvals - out @ amat.T)**2).sum(axis=1)
+        ysumsq[sel] = (yvals**2).sum(axis=1)
+        offset_spec += len(yvals)
+
+    nvarys = ncomps - 1 if sum_to_one else ncomps
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rfactor = chisqr / ysumsq
+    weights = {lab: wts[:, i].reshape(shape) for i, lab in enumerate(labels)}
+    return Group(weights=weights, total=wts.sum(axis=1).reshape(shape),
+                 chisqr=chisqr.reshape(shape),
+                 redchi=chisqr.reshape(shape) / max(1, len(xdat) - nvarys),
+                 rfactor=rfactor.reshape(shape),
+                 converged=converged.reshape(shape), xdata=xdat, ycomps=ycomps,
+                 arrayname=arrayname, xmin=xmin, xmax=xmax,
+                 sum_to_one=sum_to_one)
@@ -19,12 +19,14 @@ except ImportError:
     HAS_SKLEARN = False
 
 from lmfit import minimize, Parameters
+from scipy.interpolate import interp1d
 
 from .. import Group
 from .utils import interp, index_of
 from larch.utils import str2bytes, bytes2str, read_textfile, unixpath
 
-from .lincombo_fitting import get_arrays, get_label, groups2matrix
+from .lincombo_fitting import (get_arrays, get_label, groups2matrix,
+                               iter_stack_chunks)
 
 
 def nmf_train(groups, arrayname='norm', xmin=-np.inf, xmax=np.inf,
@@ -148,22 +150,134 @@ def pca_train(groups, arrayname='norm', xmin=-np.inf, xmax=np.inf):
     eigvec, eigval = eigvec[::-1, :], eigval[::-1]
 
     variances = eigval/eigval.sum()
-
-    # calculate IND statistic
-    ind = None
-    for r in range(narr-1):
-        nr = narr - r - 1
-        indval = np.sqrt(nfreq*eigval[r:].sum()/nr)/nr**2
-        if ind is None:
-            ind = [indval]
-        ind.append(indval)
-    ind = np.array(ind)
-
+    ind = _pca_ind(eigval, narr, nfreq)
     nsig = int(np.argmin(ind))
     return Group(x=xdat, arrayname=arrayname, labels=labels, ydat=ydat,
                  xmin=xmin, xmax=xmax, mean=ymean, components=eigvec,
                  eigenvalues=eigval, variances=variances, ind=ind, nsig=nsig)
 
+def _pca_ind(eigval, narr, nfreq):
+    """IND statistic for eigenvalues from narr spectra of nfreq points"""
+    nind = min(narr-1, len(eigval))
+    tails = np.cumsum(eigval[::-1])[::-1][:nind]
+    nr = narr - np.arange(nind) - 1.0
+    ind = np.sqrt(nfreq*tails/nr)/nr**2
+    return np.concatenate((ind[:1], ind))
+
+def _standardize_spectra(ydat, ymean):
+    """spectra less the mean spectrum, each scaled to zero mean and unit
+    standard deviation, as used by pca_train()"""
+    ynorm = ydat - ymean
+    ynorm = ynorm - ynorm.mean(axis=1)[:, None]
+    return ynorm / ynorm.std(axis=1)[:, None]
+
+def pca_train_incremental(data, x=None, arrayname='norm', xmin=-np.inf,
+                          xmax=np.inf, ncomps=None, chunk_size=4096):
+    """train a Principal Component Analysis from a large number of spectra,
+    as from a XANES map, without holding them all in memory.
+
+    Arguments
+    ---------
+      data        array or HDF5 dataset of spectra with shape (..., npts),
+                  or an iterable of groups or of 1-d arrays (see Note 1)
+      x           array of x values for the last axis of data, or for
+                  arrays given by an iterable [None, needed unless data
+                  yields groups]
+      arrayname   string of array name to use from groups ['norm']
+      xmin        x-value for start of fit range [-inf]
+      xmax        x-value for end of fit range [+inf]
+      ncomps      int or None, number of components to keep [None -> all]
+      chunk_size  int, number of spectra to read and process at once [4096]
+
+    Returns
+    -------
+      group with trained PCA model, as from pca_train(), to be used with
+      pca_fit() or pca_fit_stack(), without `ydat` but with `nspectra`.
+
+    Notes
+    -----
+     1.  An array or HDF5 dataset is read twice, in chunks along its first
+         axis, first for the mean spectrum and then for the covariance.
+         The result is then the same as from pca_train(), except for the
+         signs of the components.  An iterable is read only once, so the
+         spectra are standardized with the running mean spectrum: results
+         are then close to, but not exactly those from pca_train().
+     2.  Only the mean spectrum and a (npts, npts) covariance matrix are
+         kept in memory, however many spectra are used.
+     3.  Spectra from groups are interpolated onto the x values of the
+         first group, as for pca_train().
+    """
+    scatter, ysum, narr = None, None, 0
+    labels = []
+    if hasattr(data, 'shape') and hasattr(data, '__getitem__'):
+        if x is None:
+            raise ValueError("pca_train_incremental needs x for array data")
+        x = np.asarray(x, dtype=float)
+        xsel = slice(index_of(x, xmin), index_of(x, xmax) + 1)
+        xdat = x[xsel]
+        for ydat in iter_stack_chunks(data, xsel, chunk_size=chunk_size):
+            ysum = ydat.sum(axis=0) if ysum is None else ysum + ydat.sum(axis=0)
+            narr += len(ydat)
+        ymean = ysum / narr
+        scatter = np.zeros((len(xdat), len(xdat)))
+        for ydat in iter_stack_chunks(data, xsel, chunk_size=chunk_size):
+            ynorm = _standardize_spectra(ydat, ymean)
+            scatter += ynorm.T @ ynorm
+    else:
+        xdat, first, buff = None, None, []
+        def add_chunk(buff):
+            nonlocal scatter, ysum, narr
+            ydat = np.array(buff)
+            if ysum is None:
+                ysum = np.zeros(ydat.shape[1])
+                scatter = np.zeros((ydat.shape[1], ydat.shape[1]))
+            ysum += ydat.sum(axis=0)
+            narr += len(ydat)
+            ynorm = _standardize_spectra(ydat, ysum/narr)
+            scatter += ynorm.T @ ynorm
+
+        for spect in data:
+            if isinstance(spect, np.ndarray):
+                if xdat is None:
+                    if x is None:
+                        raise ValueError("pca_train_incremental needs x for array data")
+                    x = np.asarray(x, dtype=float)
+                    xsel = slice(index_of(x, xmin), index_of(x, xmax) + 1)
+                    xdat = x[xsel]
+                buff.append(np.asarray(spect, dtype=float)[xsel])
+            else:
+                if first is None:
+                    first = spect
+                    xdat, ydat = groups2matrix([spect], arrayname, xmin=xmin, xmax=xmax)
+                else:
+                    ydat = groups2matrix([first, spect], arrayname,
+                                         xmin=xmin, xmax=xmax)[1][1:]
+                buff.append(ydat[0])
+                labels.append(get_label(spect))
+            if len(buff) >= chunk_size:
+                add_chunk(buff)
+                buff = []
+        if len(buff) > 0:
+            add_chunk(buff)
+        if narr == 0:
+            raise ValueError("pca_train_incremental found no spectra")
+        ymean = ysum / narr
+
+    nfreq = len(xdat)
+    eigval, eigvec = np.linalg.eigh(scatter / narr)
+    eigval = np.clip(eigval[::-1], 0, None)
+    eigvec = eigvec[:, ::-1]
+    # same scaling as the components from pca_train()
+    components = (eigvec * np.sqrt(eigval/narr)).T
+    variances = eigval/eigval.sum()
+    ind = _pca_ind(eigval, narr, nfreq)
+    nsig = int(np.argmin(ind))
+    if ncomps is not None:
+        components = components[:ncomps]
+    return Group(x=xdat, arrayname=arrayname, labels=labels, nspectra=narr,
+                 xmin=xmin, xmax=xmax, mean=ymean, components=components,
+                 eigenvalues=eigval, variances=variances, ind=ind, nsig=nsig)
+
 
 def save_pca_model(pca_model, filename):
     """save a PCA model to a file"""
@@ -285,3 +399,74 @@ def pca_fit(group, pca_model, ncomps=None, rescale=True):
                              pca_model=pca_model, chi_square=chi2[0],
                              data_scale=scale, weights=weights)
     return
+
+
+def pca_fit_stack(data, pca_model, x=None, ncomps=None, rescale=True,
+                  chunk_size=8192):
+    """
+    fit many spectra, as from a XANES map, to a PCA training model
+
+    Arguments
+    ---------
+      data        array or HDF5 dataset of spectra with shape (..., npts)
+      pca_model   PCA model as found from pca_train() or pca_train_incremental()
+      x           array of x values for the last axis of data [None, meaning
+                  data is on the x values of the model]
+      ncomps      number of components to included
+      rescale     whether to allow data to be renormalized (True)
+      chunk_size  int, number of spectra to read and fit at once [8192]
+
+    Returns
+    -------
+      group with arrays, each with the shape of data without its last axis:
+          weights    weights for PCA components, with an extra last axis
+          chi_square goodness-of-fit measure
+          data_scale scale factor applied to data
+      as well as x and pca_model.
+
+    Notes
+    -----
+      All spectra in a chunk are fit with a single matrix product with the
+      pseudo-inverse of the components.  With rescale, the best scale factor
+      for each spectrum is also found directly, rather than with a fit.
+    """
+    if ncomps is None:
+        ncomps = len(pca_model.components)
+    comps = pca_model.components[:ncomps].transpose()
+    cinv = np.linalg.pinv(comps)
+    ymean = pca_model.mean
+    mresid = ymean - comps @ (cinv @ ymean)
+    xmodel = pca_model.x
+    if x is not None:
+        x = np.asarray(x, dtype=float)
+        if len(x) == len(xmodel) and np.allclose(x, xmodel):
+            x = None
+
+    shape = tuple(data.shape[:-1])
+    nspec = int(np.prod(shape))
+    weights = np.zeros((nspec, ncomps))
+    chi_square = np.zeros(nspec)
+    data_scale = np.ones(nspec)
+    offset = 0
+    for ydat in iter_stack_chunks(data, chunk_size=chunk_size):
+        if x is not None:
+            ydat = interp1d(x, ydat, kind='cubic', axis=1, assume_sorted=True,
+                            fill_value='extrapolate')(xmodel)
+        sel = slice(offset, offset + len(ydat))
+        offset += len(ydat)
+        if rescale:
+            # minimize |(1-P)(scale*y - mean)|^2, P projecting onto comps
+            yresid = ydat - (ydat @ cinv.T) @ comps.T
+            denom = (yresid**2).sum(axis=1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                scale = np.where(denom > 0, (yresid @ mresid)/denom, 1.0)
+            data_scale[sel] = np.maximum(scale, 0)
+            ydat = ydat * data_scale[sel][:, None]
+        wts = (ydat - ymean) @ cinv.T
+        weights[sel] = wts
+        chi_square[sel] = ((ydat - ymean - wts @ comps.T)**2).sum(axis=1)
+
+    return Group(x=xmodel, pca_model=pca_model,
+                 weights=weights.reshape(shape + (ncomps,)),
+                 chi_square=chi_square.reshape(shape),
+                 data_scale=data_scale.reshape(shape))
@@ -76,11 +76,11 @@ def realimag(arr):
     return np.array([(i.real, i.imag) for i in arr]).flatten()
 
 def complex_phase(arr):
-    "return phase, modulo 2pi jumps"
+    "return phase, modulo 2pi jumps, along the last axis"
     phase = np.arctan2(arr.imag, arr.real)
-    d   = np.diff(phase)/np.pi
+    d   = np.diff(phase, axis=-1)/np.pi
     out = phase[:]*1.0
-    out[1:] -= np.pi*(np.round(abs(d))*np.sign(d)).cumsum()
+    out[..., 1:] -= np.pi*(np.round(abs(d))*np.sign(d)).cumsum(axis=-1)
     return out
 
 def interp1d(x, y, xnew, kind='linear', fill_value=np.nan, **kws):
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+thread and process pools for running larch calculations concurrently
+
+Process pools use the 'fork' start method, so that workers inherit
+module-level state (data and options) set just before the pool starts,
+rather than having it pickled and sent to each worker.  Where 'fork'
+is not available, processes are replaced by threads.
+"""
+import sys
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+def pool_kind(executor, caller='', _larch=None):
+    """return 'threads' or 'processes' for an executor name, using
+    'threads' with a warning if 'processes' cannot use 'fork'.
+    Raises ValueError for any other name."""
+    kind = str(executor).lower()
+    if not (kind.startswith('thread') or kind.startswith('proc')):
+        raise ValueError(f"{caller}: executor must be 'threads' or 'processes'")
+    if kind.startswith('thread'):
+        return 'threads'
+    if 'fork' not in mp.get_all_start_methods():
+        write = sys.stdout.write if _larch is None else _larch.writer.write
+        write(f"{caller}: process pool needs the 'fork' start method, using threads\n")
+        return 'threads'
+    return 'processes'
+
+def fork_pool(max_workers=None):
+    "process pool with forked workers, see pool_kind()"
+    if max_workers is None:
+        max_workers = mp.cpu_count()
+    return ProcessPoolExecutor(max_workers=max_workers,
+                               mp_context=mp.get_context('fork'))
+
+# function for run_chunks() worker processes, set before forking
+_CHUNK_STATE = {}
+
+def _run_chunk(start, stop):
+    "run the function in _CHUNK_STATE for one chunk, in a worker process"
+    return _CHUNK_STATE['func'](start, stop)
+
+def run_chunks(func, nitems, executor=None, max_workers=None, caller='',
+               _larch=None):
+    """run func(start, stop) for contiguous chunks of nitems items, one
+    chunk per worker, and return the lists it returns joined in order
+
+    Parameters:
+    ------------
+      func:        function of (start, stop) returning a list of results
+                   for items start to stop.  With 'processes', func is
+                   inherited by the forked workers, and need not be picklable.
+      nitems:      number of items
+      executor:    None, 'threads', or 'processes' [None, run serially]
+      max_workers: maximum number of workers [cpu count]
+      caller:      name of calling function, for messages ['']
+      _larch:      larch interpreter, for writing warnings [None]
+    """
+    if executor is None or nitems < 2:
+        return list(func(0, nitems))
+    kind = pool_kind(executor, caller, _larch=_larch)
+    if max_workers is None:
+        max_workers = mp.cpu_count()
+    nchunk = max(1, min(max_workers, nitems))
+    bounds = [(i*nitems)//nchunk for i in range(nchunk+1)]
+    if kind == 'processes':
+        _CHUNK_STATE['func'] = func
+        pool, worker = fork_pool(max_workers=nchunk), _run_chunk
+    else:
+        pool, worker = ThreadPoolExecutor(max_workers=nchunk), func
+    results = []
+    try:
+        futures = [pool.submit(worker, bounds[i], bounds[i+1])
+                   for i in range(nchunk)]
+        for fut in futures:
+            results.extend(fut.result())
+    finally:
+        pool.shutdown()
+        _CHUNK_STATE.clear()
+    return results
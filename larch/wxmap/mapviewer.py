@@ -1906,6 +1906,9 @@ class MapViewerFrame(wx.Frame):
         rmenu = wx.Menu()
         MenuItem(self, rmenu, 'Add / Delete ROIs',
                  'Define new ROIs, Remove ROIs',  self.manageROIs)
+        MenuItem(self, rmenu, 'Build Channel Sums for Fast ROIs',
+                 'Store cumulative sums over MCA channels, for fast ROI maps',
+                 self.onBuildChannelSums)
         MenuItem(self, rmenu, 'Load ROI File for 1DXRD',
                  'Load ROI File for 1DXRD',  self.add1DXRDFile)
         rmenu.AppendSeparator()
@@ -2165,6 +2168,16 @@ class MapViewerFrame(wx.Frame):
         elif len(self.filemap) > 0:
             ROIDialog(self, roi_callback=self.UpdateROI).Show()
 
+    def onBuildChannelSums(self, event=None):
+        "build cumulative sums over MCA channels, so new XRF ROI maps are fast"
+        if self.current_file is None:
+            return
+        fname = Path(self.current_file.filename).name
+        if self.check_ownership(fname):
+            self.message('Building channel sums for %s ...' % fname)
+            self.current_file.build_mca_cumsum()
+            self.message('Built channel sums for %s' % fname)
+
     def add1DXRDFile(self, event=None):
         if len(self.filemap) > 0:
             read = False
@@ -7,6 +7,7 @@ function         description
 ------------     ------------------------------
 pre_edge         pre_edge subtraction, normalization
 autobk           XAFS background subtraction (mu(E) to chi(k))
+autobk_batch     autobk for a series of spectra
 xftf             forward XAFS Fourier transform (k -> R)
 xftr             backward XAFS Fourier transform, Filter (R -> q)
 ftwindow         create XAFS Fourier transform window
@@ -23,30 +24,38 @@ feffit_report    create a report from feffit() results
 
 
 from .xafsutils import KTOE, ETOK, set_xafsGroup, etok, ktoe, guess_energy_units
-from .xafsft import xftf, xftr, xftf_fast, xftr_fast, ftwindow, xftf_prep
-from .pre_edge import pre_edge, preedge, find_e0, energy_align, find_energy_step
+from .xafsft import (xftf, xftr, xftf_fast, xftr_fast, ftwindow, xftf_prep,
+                     ftwindow_cache_clear)
+from .pre_edge import (pre_edge, preedge, preedge_stack, find_e0, energy_align,
+                       energy_align_batch, energy_align_merge, find_energy_step)
 from .prepeaks import prepeaks_setup, pre_edge_baseline, prepeaks_fit
-from .feffdat import FeffDatFile, FeffPathGroup, feffpath, path2chi, ff2chi, use_feffpath
+from .feffdat import (FeffDatFile, FeffPathGroup, feffpath, path2chi, ff2chi,
+                      use_feffpath, feff_cache_stats, set_feff_cache_size)
 from .feffit import (FeffitDataSet, TransformGroup, feffit,
                      feffit_dataset, feffit_transform, feffit_report,
-                     propagate_uncertainties, feffit_conf_map)
+                     propagate_uncertainties, feffit_conf_map,
+                     feffit_conf_interval)
 
-from .autobk import autobk, autobk_lmfit, autobk_delta_chi
-from .mback import mback, mback_norm
+from .autobk import autobk, autobk_batch, autobk_lmfit, autobk_delta_chi
+from .mback import mback, mback_norm, mback_batch, mback_cache_clear
 from .diffkk import diffkk, diffKKGroup
 from .fluo import fluo_corr
 
 ## from .cif2feff import cif_sites, cif2feff6l
 
-from .feffrunner import FeffRunner, feffrunner, feff6l, feff8l, find_exe
+from .feffrunner import (FeffRunner, FeffRunCache, feffrunner, feff6l, feff8l,
+                         feff_batch, find_exe)
 from .feff8lpath import feff8_xafs
 from .feffutils import get_feff_pathinfo
 
 from .cauchy_wavelet import cauchy_wavelet
 from .deconvolve import xas_convolve, xas_deconvolve
 from .estimate_noise import estimate_noise
-from .rebin_xafs import rebin_xafs, sort_xafs
-from .sigma2_models import sigma2_eins, sigma2_debye, sigma2_correldebye, gnxas
+from .xaspipeline import XASPipeline, XASHDF5Sink, XASCSVSink, iter_xas_source
+from .rebin_xafs import (rebin_xafs, rebin_xafs_stack, rebin_energy_grid,
+                         rebin_cache_clear, sort_xafs)
+from .sigma2_models import (sigma2_eins, sigma2_debye, sigma2_correldebye,
+                            sigma2_cache_clear, gnxas)
 
 
 def _larch_init(_larch):
@@ -59,7 +68,8 @@ def _larch_init(_larch):
 _larch_groups = (diffKKGroup, FeffRunner, FeffDatFile, FeffPathGroup,
                  TransformGroup, FeffitDataSet)
 
-_larch_builtins = {'_xafs': dict(autobk=autobk, autobk_lmfit=autobk_lmfit,
+_larch_builtins = {'_xafs': dict(autobk=autobk, autobk_batch=autobk_batch,
+                                 autobk_lmfit=autobk_lmfit,
                                  autobk_delta_chi=autobk_delta_chi,
                                  etok=etok, ktoe=ktoe,
                                  guess_energy_units=guess_energy_units,
@@ -69,16 +79,20 @@ _larch_builtins = {'_xafs': dict(autobk=autobk, autobk_lmfit=autobk_lmfit,
                                  find_e0=find_e0, pre_edge=pre_edge,
                                  find_energy_step=find_energy_step,
                                  energy_align=energy_align,
+                                 energy_align_batch=energy_align_batch,
+                                 energy_align_merge=energy_align_merge,
                                  prepeaks_setup=prepeaks_setup,
                                  prepeaks_fit=prepeaks_fit,
                                  pre_edge_baseline=pre_edge_baseline,
                                  mback=mback, mback_norm=mback_norm,
+                                 mback_batch=mback_batch,
                                  cauchy_wavelet=cauchy_wavelet,
                                  xas_deconvolve=xas_deconvolve,
                                  xas_convolve=xas_convolve,
                                  fluo_corr=fluo_corr,
                                  estimate_noise=estimate_noise,
                                  rebin_xafs=rebin_xafs,
+                                 rebin_xafs_stack=rebin_xafs_stack,
                                  sort_xafs=sort_xafs,
                                  gnxas=gnxas,
                                  sigma2_eins=sigma2_eins,
@@ -87,10 +101,14 @@ _larch_builtins = {'_xafs': dict(autobk=autobk, autobk_lmfit=autobk_lmfit,
                                  feffit_transform=feffit_transform,
                                  feffit_report=feffit_report,
                                  feffit_conf_map=feffit_conf_map,
+                                 feffit_conf_interval=feffit_conf_interval,
                                  feffrunner=feffrunner, feff6l=feff6l,
+                                 feff_batch=feff_batch,
                                  feff8l=feff8l,
                                  feffpath= feffpath,
                                  use_feffpath= use_feffpath,
                                  path2chi=path2chi, ff2chi=ff2chi,
+                                 feff_cache_stats=feff_cache_stats,
+                                 set_feff_cache_size=set_feff_cache_size,
                                  feff8_xafs=feff8_xafs,
                                  get_feff_pathinfo=get_feff_pathinfo)}
@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 import sys
 import time
+import hashlib
 import numpy as np
 from scipy.interpolate import splrep, splev, UnivariateSpline
+from scipy.sparse import csr_matrix
 from scipy.stats import t
 from scipy.special import erf
 from scipy.optimize import leastsq
@@ -13,6 +15,7 @@ import uncertainties
 from larch import Group, isgroup
 from larch.larchlib import Make_CallArgs, parse_group_args
 from larch.math import index_of, index_nearest, realimag, remove_dups
+from larch.utils.pools import run_chunks
 
 from .xafsutils import ETOK, TINY_ENERGY, set_xafsGroup
 from .xafsft import ftwindow, xftf_fast
@@ -20,20 +23,41 @@ from .pre_edge import find_e0, pre_edge
 
 FMT_COEF = 'coef_%2.2i'
 NFEV = 0
-def spline_eval(kraw, mu, knots, coefs, order, kout):
-    """eval bkg(kraw) and chi(k) for knots, coefs, order"""
+def interp_operator(x, xout):
+    """sparse matrix for linear interpolation from x onto xout, so that
+    interp_operator(x, xout) @ y == np.interp(xout, x, y)
+    for x increasing.
+    """
+    nx, nout = len(x), len(xout)
+    i0 = np.clip(np.searchsorted(x, xout, side='right') - 1, 0, nx-2)
+    frac = np.clip((xout - x[i0])/(x[i0+1] - x[i0]), 0, 1)
+    rows = np.repeat(np.arange(nout), 2)
+    cols = np.column_stack((i0, i0+1)).flatten()
+    vals = np.column_stack((1-frac, frac)).flatten()
+    return csr_matrix((vals, (rows, cols)), shape=(nout, nx))
+
+def spline_eval(kraw, mu, knots, coefs, order, kout, interp_op=None):
+    """eval bkg(kraw) and chi(k) for knots, coefs, order
+
+    chi(k) is interpolated onto kout with a spline, or with interp_op
+    from interp_operator(kraw, kout) if given.
+    """
     bkg = splev(kraw, [knots, coefs, order])
-    chi = UnivariateSpline(kraw, (mu-bkg), s=0)(kout)
+    if interp_op is not None:
+        chi = interp_op @ (mu-bkg)
+    else:
+        chi = UnivariateSpline(kraw, (mu-bkg), s=0)(kout)
     return bkg, chi
 
 def _resid(vcoefs, ncoef, kraw, mu, chi_std, knots, order, kout,
-            ftwin, nfft, irbkg, nclamp, clamp_lo, clamp_hi):
+            ftwin, nfft, irbkg, nclamp, clamp_lo, clamp_hi, interp_op=None):
     global NFEV
     NFEV += 1
     nspl = len(vcoefs)
     coefs = np.ones(ncoef)*vcoefs[-1]
     coefs[:nspl] = vcoefs
-    bkg, chi = spline_eval(kraw, mu, knots, coefs, order, kout)
+    bkg, chi = spline_eval(kraw, mu, knots, coefs, order, kout,
+                           interp_op=interp_op)
     if chi_std is not None:
         chi = chi - chi_std
     out =  realimag(xftf_fast(chi*ftwin, nfft=nfft)[:irbkg])
@@ -44,13 +68,150 @@ def _resid(vcoefs, ncoef, kraw, mu, chi_std, knots, order, kout,
                             abs(clamp_lo)*scale*chi[:nclamp],
                             abs(clamp_hi)*scale*chi[-nclamp:]))
 
+def _autobk_edge(energy, mu, group, e0=None, ek0=None, edge_step=None,
+                 pre_edge_kws=None, outgroup=None, _larch=None):
+    """return ek0 and edge_step for autobk, taking them from group
+    or running pre_edge() as needed.  pre_edge() results are written
+    to outgroup, which defaults to group.
+    """
+    if edge_step is None and hasattr(group, 'edge_step'):
+        edge_step = group.edge_step
+    if e0 is not None and ek0 is None:  # command-line e0 still valid
+        ek0 = e0
+    if ek0 is None and isgroup(group, 'ek0'):
+        ek0 = group.ek0
+    if ek0 is None and isgroup(group, 'e0'):
+        ek0 = group.e0
+
+    if ek0 is not None and (ek0 < energy.min() or ek0 > energy.max()):
+        ek0 = None
+    if ek0 is None or edge_step is None:
+        # need to run pre_edge:
+        if outgroup is None:
+            outgroup = group
+        pre_kws = dict(nnorm=None, nvict=0, pre1=None,
+                       pre2=None, norm1=None, norm2=None)
+        if pre_edge_kws is not None:
+            pre_kws.update(pre_edge_kws)
+        pre_edge(energy, mu, group=outgroup, _larch=_larch, **pre_kws)
+        if ek0 is None:
+            ek0 = outgroup.e0
+        if edge_step is None:
+            edge_step = outgroup.edge_step
+    return ek0, edge_step
+
+def _autobk_setup(energy, ek0, rbkg=1, nknots=None, kmin=0, kmax=None,
+                  kweight=1, dk=0.1, win='hanning', k_std=None, chi_std=None,
+                  nfft=2048, kstep=0.05, interp='spline'):
+    """set up k grids, FT window and spline knots for autobk.
+
+    These depend only on the energy array, ek0 and the autobk
+    parameters, not on mu, and so can be shared between spectra.
+    """
+    # get array indices for rkbg and ek0: irbkg, iek0
+    iek0 = index_of(energy, ek0)
+    rgrid = np.pi/(kstep*nfft)
+    rbkg = max(rbkg, 2*rgrid)
+
+    # save ungridded k (kraw) and grided k (kout)
+    # and ftwin (*k-weighting) for FT in residual
+    enpe = energy[iek0:] - ek0
+    kraw = np.sign(enpe)*np.sqrt(ETOK*abs(enpe))
+    if kmax is None or kmax < 0:
+        kmax = max(kraw)
+    else:
+        kmax = max(0, min(max(kraw), kmax))
+    kout  = kstep * np.arange(int(1.01+kmax/kstep), dtype='float64')
+    iemax = min(len(energy), 2+index_of(energy, ek0+kmax*kmax/ETOK)) - 1
+
+    # interpolate provided chi(k) onto the kout grid
+    if chi_std is not None and k_std is not None:
+        chi_std = np.interp(kout, k_std, chi_std)
+    # pre-load FT window
+    ftwin = kout**kweight * ftwindow(kout, xmin=kmin, xmax=kmax,
+                                     window=win, dx=dk, dx2=dk)
+    # calc k-value and indices of mu for initial guess of spline params
+    nspl = 1 + int(2*rbkg*(kmax-kmin)/np.pi)
+    irbkg = int(1 + (nspl-1)*np.pi/(2*rgrid*(kmax-kmin)))
+    if nknots is not None:
+        nspl = nknots
+    nspl = max(5, min(128, nspl))
+    spl_k = np.zeros(nspl)
+    spl_index = np.zeros((3, nspl), dtype=int)
+    for i in range(nspl):
+        q  = kmin + i*(kmax-kmin)/(nspl - 1)
+        ik = index_nearest(kraw, q)
+        i1 = min(len(kraw)-1, ik + 5)
+        i2 = max(0, ik - 5)
+        spl_k[i] = kraw[ik]
+        spl_index[:, i] = (ik+iek0, i1+iek0, i2+iek0)
+
+    # operator for linear interpolation of chi onto kout
+    interp_op = None
+    if interp == 'linear':
+        interp_op = interp_operator(kraw[:iemax-iek0+1], kout)
+
+    return Group(ek0=ek0, iek0=iek0, iemax=iemax, rbkg=rbkg, kmin=kmin,
+                 kmax=kmax, kraw=kraw, kout=kout, chi_std=chi_std,
+                 ftwin=ftwin, nfft=nfft, nspl=nspl, irbkg=irbkg,
+                 spl_k=spl_k, spl_index=spl_index, order=3,
+                 interp=interp, interp_op=interp_op)
+
+def _autobk_init_coefs(mu, setup):
+    """initial spline knots and coefficients for mu"""
+    ik, i1, i2 = setup.spl_index
+    spl_y = (2*mu[ik] + mu[i1] + mu[i2]) / 4.0
+    knots, coefs, order = splrep(setup.spl_k, spl_y, k=setup.order)
+    coefs[setup.nspl:] = coefs[setup.nspl-1]
+    return spl_y, knots, coefs
+
+def _autobk_outputs(mu, edge_step, setup, knots, coefs, spl_y, best, covar,
+                    chisqr, nclamp):
+    """return dict of autobk outputs for best-fit spline coefficients"""
+    nspl, iek0, iemax, order = setup.nspl, setup.iek0, setup.iemax, setup.order
+    kraw_ = setup.kraw[:iemax-iek0+1]
+    mu_ = mu[iek0:iemax+1]
+    initbkg, initchi = spline_eval(kraw_, mu_, knots, coefs, order,
+                                   setup.kout, interp_op=setup.interp_op)
+
+    final_coefs        = 1.0*coefs
+    final_coefs[:nspl] = best[:]
+    final_coefs[nspl:] = best[-1]
+
+    redchi = chisqr / (2*setup.irbkg+2*nclamp - nspl)
+    coefs_std = None
+    if covar is not None:
+        coefs_std = np.sqrt(redchi*np.diag(covar))
+
+    bkg, chi = spline_eval(kraw_, mu_, knots, final_coefs, order,
+                           setup.kout, interp_op=setup.interp_op)
+    obkg = mu[:]*1.0
+    obkg[iek0:iek0+len(bkg)] = bkg
+
+    init_bkg = mu[:]*1.0
+    init_bkg[iek0:iek0+len(bkg)] = initbkg
+    details = Group(kmin=setup.kmin, kmax=setup.kmax, irbkg=setup.irbkg,
+                    nknots=nspl, knots=knots, order=order,
+                    init_knots_y=spl_y, nspl=nspl,
+                    init_chi=initchi/edge_step, coefs=final_coefs,
+                    coefs_std=coefs_std, iek0=iek0, iemax=iemax,
+                    ek0=setup.ek0, covar=covar, chisqr=chisqr,
+                    redchi=redchi, init_bkg=init_bkg,
+                    knots_y=final_coefs[:nspl], kraw=setup.kraw, mu=mu,
+                    interp=setup.interp)
+
+    return dict(bkg=obkg, chie=(mu-obkg)/edge_step, k=setup.kout,
+                chi=chi/edge_step, ek0=setup.ek0, rbkg=setup.rbkg,
+                autobk_details=details)
+
 
 @Make_CallArgs(["energy" ,"mu"])
 def autobk(energy, mu=None, group=None, rbkg=1, nknots=None, e0=None, ek0=None,
            edge_step=None, kmin=0, kmax=None, kweight=1, dk=0.1,
            win='hanning', k_std=None, chi_std=None, nfft=2048, kstep=0.05,
            pre_edge_kws=None, nclamp=3, clamp_lo=0, clamp_hi=1,
-           calc_uncertainties=False, err_sigma=1, _larch=None, **kws):
+           calc_uncertainties=False, err_sigma=1, interp='spline',
+           _larch=None, **kws):
     """Use Autobk algorithm to remove XAFS background
 
     Parameters:
@@ -80,10 +241,19 @@ def autobk(energy, mu=None, group=None, rbkg=1, nknots=None, e0=None, ek0=None,
       calc_uncertaintites:  Flag to calculate uncertainties in
                             mu_0(E) and chi(k) [True]
       err_sigma: sigma level for uncertainties in mu_0(E) and chi(k) [1]
+      interp:    method for interpolating mu(E)-bkg(E) onto the uniform k
+                 grid for chi(k), 'spline' or 'linear' ['spline']
 
     Output arrays are written to the provided group.
 
     Follows the 'First Argument Group' convention.
+
+    Notes:
+    ------
+      With interp='linear', a sparse linear interpolation matrix is built
+      once, so that each fit iteration needs a matrix-vector product
+      instead of a new interpolating spline.  This is faster, but chi(k)
+      will differ slightly from that with the default 'spline'.
     """
     msg = sys.stdout.write
     if _larch is not None:
@@ -94,6 +264,9 @@ def autobk(energy, mu=None, group=None, rbkg=1, nknots=None, e0=None, ek0=None,
         msg('Unrecognized arguments for autobk():\n')
         msg('    %s\n' % (', '.join(kws.keys())))
         return
+    if interp not in ('spline', 'linear'):
+        msg("autobk(): interp must be 'spline' or 'linear'\n")
+        return
     energy, mu, group = parse_group_args(energy, members=('energy', 'mu'),
                                          defaults=(mu,), group=group,
                                          fcn_name='autobk')
@@ -105,141 +278,248 @@ def autobk(energy, mu=None, group=None, rbkg=1, nknots=None, e0=None, ek0=None,
     # if e0 or edge_step are not specified, get them, either from the
     # passed-in group or from running pre_edge()
     group = set_xafsGroup(group, _larch=_larch)
-
-    if edge_step is None and hasattr(group, 'edge_step'):
-        edge_step = group.edge_step
-    if e0 is not None and ek0 is None:  # command-line e0 still valid
-        ek0 = e0
-    if ek0 is None and isgroup(group, 'ek0'):
-        ek0 = group.ek0
-    if ek0 is None and isgroup(group, 'e0'):
-        ek0 = group.e0
-
-    # print(f"AUTOBK {group=}, {ek0=}, {edge_step=}")
-    if ek0 is not None and (ek0 < energy.min() or ek0 > energy.max()):
-        ek0 = None
-    if ek0 is None or edge_step is None:
-        # need to run pre_edge:
-        pre_kws = dict(nnorm=None, nvict=0, pre1=None,
-                       pre2=None, norm1=None, norm2=None)
-        if pre_edge_kws is not None:
-            pre_kws.update(pre_edge_kws)
-        pre_edge(energy, mu, group=group, _larch=_larch, **pre_kws)
-        if ek0 is None:
-            ek0 = group.e0
-        if edge_step is None:
-            edge_step = group.edge_step
+    ek0, edge_step = _autobk_edge(energy, mu, group, e0=e0, ek0=ek0,
+                                  edge_step=edge_step,
+                                  pre_edge_kws=pre_edge_kws, _larch=_larch)
     if ek0 is None or edge_step is None:
         msg('autobk() could not determine ek0 or edge_step!: trying running pre_edge first\n')
         return
 
-    # get array indices for rkbg and ek0: irbkg, iek0
-    iek0 = index_of(energy, ek0)
-    rgrid = np.pi/(kstep*nfft)
-    rbkg = max(rbkg, 2*rgrid)
-
-    # save ungridded k (kraw) and grided k (kout)
-    # and ftwin (*k-weighting) for FT in residual
-    enpe = energy[iek0:] - ek0
-    kraw = np.sign(enpe)*np.sqrt(ETOK*abs(enpe))
-    if kmax is None or kmax < 0:
-        kmax = max(kraw)
-    else:
-        kmax = max(0, min(max(kraw), kmax))
-    kout  = kstep * np.arange(int(1.01+kmax/kstep), dtype='float64')
-    iemax = min(len(energy), 2+index_of(energy, ek0+kmax*kmax/ETOK)) - 1
-
-    # interpolate provided chi(k) onto the kout grid
-    if chi_std is not None and k_std is not None:
-        chi_std = np.interp(kout, k_std, chi_std)
-    # pre-load FT window
-    ftwin = kout**kweight * ftwindow(kout, xmin=kmin, xmax=kmax,
-                                     window=win, dx=dk, dx2=dk)
-    # calc k-value and initial guess for y-values of spline params
-    nspl = 1 + int(2*rbkg*(kmax-kmin)/np.pi)
-    irbkg = int(1 + (nspl-1)*np.pi/(2*rgrid*(kmax-kmin)))
-    if nknots is not None:
-        nspl = nknots
-    nspl = max(5, min(128, nspl))
-    spl_y, spl_k  = np.ones(nspl), np.zeros(nspl)
-
-    for i in range(nspl):
-        q  = kmin + i*(kmax-kmin)/(nspl - 1)
-        ik = index_nearest(kraw, q)
-        i1 = min(len(kraw)-1, ik + 5)
-        i2 = max(0, ik - 5)
-        spl_k[i] = kraw[ik]
-        spl_y[i] = (2*mu[ik+iek0] + mu[i1+iek0] + mu[i2+iek0] ) / 4.0
-
-    order = 3
-    qmin, qmax  = spl_k[0], spl_k[nspl-1]
-    knots = [spl_k[0] - 1.e-4*(order-i) for i in range(order)]
-
-    for i in range(order, nspl):
-        knots.append((i-order)*(qmax - qmin)/(nspl-order+1))
-    qlast = knots[-1]
-    for i in range(order+1):
-        knots.append(qlast + 1.e-4*(i+1))
-
-    # coefs = [mu[index_nearest(energy, ek0 + q**2/ETOK)] for q in knots]
-    knots, coefs, order = splrep(spl_k, spl_y, k=order)
-    coefs[nspl:] = coefs[nspl-1]
+    setup = _autobk_setup(energy, ek0, rbkg=rbkg, nknots=nknots, kmin=kmin,
+                          kmax=kmax, kweight=kweight, dk=dk, win=win,
+                          k_std=k_std, chi_std=chi_std, nfft=nfft, kstep=kstep,
+                          interp=interp)
+    spl_y, knots, coefs = _autobk_init_coefs(mu, setup)
+    nspl, iek0, iemax = setup.nspl, setup.iek0, setup.iemax
     ncoefs = len(coefs)
-    kraw_ = kraw[:iemax-iek0+1]
-    mu_  = mu[iek0:iemax+1]
-    initbkg, initchi = spline_eval(kraw_, mu_, knots, coefs, order, kout)
+
     global NFEV
     NFEV = 0
 
     vcoefs = 1.0*coefs[:nspl]
-    userargs = (len(coefs), kraw_, mu_, chi_std, knots, order, kout,
-               ftwin, nfft, irbkg, nclamp, clamp_lo, clamp_hi)
+    userargs = (len(coefs), setup.kraw[:iemax-iek0+1], mu[iek0:iemax+1],
+                setup.chi_std, knots, setup.order, setup.kout, setup.ftwin,
+                nfft, setup.irbkg, nclamp, clamp_lo, clamp_hi,
+                setup.interp_op)
 
     lsout = leastsq(_resid, vcoefs, userargs, maxfev=2000*(ncoefs+1),
                     gtol=0.0, ftol=1.e-6, xtol=1.e-6, epsfcn=1.e-6,
                     full_output=1, col_deriv=0, factor=100, diag=None)
 
     best, covar, _infodict, errmsg, ier = lsout
-    final_coefs        = coefs[:]
-    final_coefs[:nspl] = best[:]
-    final_coefs[nspl:] = best[-1]
-
     chisqr = ((_resid(best, *userargs))**2).sum()
-    redchi = chisqr / (2*irbkg+2*nclamp - nspl)
-
-    coefs_std = np.array([np.sqrt(redchi*covar[i, i]) for i in range(nspl)])
-    bkg, chi = spline_eval(kraw[:iemax-iek0+1], mu[iek0:iemax+1],
-                           knots, final_coefs, order, kout)
-    obkg = mu[:]*1.0
-    obkg[iek0:iek0+len(bkg)] = bkg
 
     # outputs to group
+    out = _autobk_outputs(mu, edge_step, setup, knots, coefs, spl_y, best,
+                          covar, chisqr, nclamp)
     group = set_xafsGroup(group, _larch=_larch)
-    group.bkg  = obkg
-    group.chie = (mu-obkg)/edge_step
-    group.k    = kout
-    group.chi  = chi/edge_step
-    group.ek0  = ek0
-    group.rbkg = rbkg
-
-    knots_y  = np.array([coefs[i] for i in range(nspl)])
-    init_bkg = mu[:]*1.0
-    init_bkg[iek0:iek0+len(bkg)] = initbkg
-    # now fill in 'autobk_details' group
-
-    group.autobk_details = Group(kmin=kmin, kmax=kmax, irbkg=irbkg,
-                                 nknots=len(spl_k), knots=knots, order=order,
-                                 init_knots_y=spl_y, nspl=nspl,
-                                 init_chi=initchi/edge_step, coefs=final_coefs,
-                                 coefs_std=coefs_std, iek0=iek0, iemax=iemax,
-                                 ek0=ek0, covar=covar, chisqr=chisqr,
-                                 redchi=redchi, init_bkg=init_bkg,
-                                 knots_y=knots_y, kraw=kraw, mu=mu)
+    for attr, val in out.items():
+        setattr(group, attr, val)
 
     if  calc_uncertainties and covar is not None:
         autobk_delta_chi(group, err_sigma=err_sigma)
 
 
+def _resid_linear(vcoefs, chi0, out0, dchi, dout, nclamp, clamp_lo, clamp_hi):
+    """autobk residual using chi(k) and its FT for the data (chi0, out0)
+    and their derivatives with respect to the spline coefficients"""
+    out = out0 + dout @ vcoefs
+    if nclamp == 0:
+        return out
+    chi = chi0 + dchi @ vcoefs
+    scale = 0.1 + 10*(out*out).mean()
+    return  np.concatenate((out,
+                            abs(clamp_lo)*scale*chi[:nclamp],
+                            abs(clamp_hi)*scale*chi[-nclamp:]))
+
+def _jacob_linear(vcoefs, chi0, out0, dchi, dout, nclamp, clamp_lo, clamp_hi):
+    "jacobian for _resid_linear"
+    if nclamp == 0:
+        return dout
+    out = out0 + dout @ vcoefs
+    chi = chi0 + dchi @ vcoefs
+    scale = 0.1 + 10*(out*out).mean()
+    dscale = 20*(out @ dout)/len(out)
+    return np.concatenate((dout,
+            abs(clamp_lo)*(scale*dchi[:nclamp] + np.outer(chi[:nclamp], dscale)),
+            abs(clamp_hi)*(scale*dchi[-nclamp:] + np.outer(chi[-nclamp:], dscale))))
+
+def _autobk_linear_ops(setup, knots, ncoefs):
+    """add derivatives of chi(k) and its FT with respect to the spline
+    coefficients to an autobk setup.  As bkg, chi(k) and the FT of chi(k)
+    are all linear in the coefficients, these are the same for all spectra
+    sharing the setup."""
+    nspl, order = setup.nspl, setup.order
+    kraw_ = setup.kraw[:setup.iemax-setup.iek0+1]
+    dbkg = np.zeros((nspl, len(kraw_)))
+    for i in range(nspl):
+        coefs = np.zeros(ncoefs)
+        coefs[i] = 1.0
+        if i == nspl-1:
+            coefs[nspl:] = 1.0
+        dbkg[i] = splev(kraw_, [knots, coefs, order])
+    if setup.interp_op is not None:
+        dchi = -(setup.interp_op @ dbkg.T).T
+    else:
+        dchi = np.array([-UnivariateSpline(kraw_, b, s=0)(setup.kout)
+                         for b in dbkg])
+    dout = [realimag(xftf_fast(c*setup.ftwin, nfft=setup.nfft)[:setup.irbkg])
+            for c in dchi]
+    setup.dchi = dchi.T
+    setup.dout = np.array(dout).T
+
+def _autobk_batch_run(groups, setup_kws, ek0=None, edge_step=None,
+                      pre_edge_kws=None, nclamp=3, clamp_lo=0, clamp_hi=1,
+                      calc_uncertainties=False, err_sigma=1, warm_start=True,
+                      max_setups=16, setups=None):
+    """run autobk on a sequence of groups, returning a list of dicts of
+    outputs (None for spectra where ek0 or edge_step cannot be found).
+    setups is an optional dict of precomputed setups to use and update."""
+    if setups is None:
+        setups = {}
+    results = []
+    prev_best = None
+    for group in groups:
+        energy = group.energy.squeeze()
+        mu = group.mu.squeeze()
+        energy = remove_dups(energy, tiny=TINY_ENERGY)
+        out = Group()
+        _ek0, _step = _autobk_edge(energy, mu, group, ek0=ek0,
+                                   edge_step=edge_step, outgroup=out,
+                                   pre_edge_kws=pre_edge_kws)
+        if _ek0 is None or _step is None:
+            results.append(None)
+            continue
+        if ek0 is None:
+            # snap each spectrum's ek0 onto the energy grid, so that spectra
+            # with slightly different ek0 on the same grid share a setup
+            _ek0 = energy[index_of(energy, _ek0)]
+        key = (hashlib.sha256(energy.tobytes()).hexdigest(), _ek0)
+        setup = setups.get(key, None)
+        if setup is None:
+            setup = _autobk_setup(energy, _ek0, **setup_kws)
+            if len(setups) >= max_setups:
+                setups.pop(next(iter(setups)))
+            setups[key] = setup
+
+        spl_y, knots, coefs = _autobk_init_coefs(mu, setup)
+        nspl, iek0, iemax = setup.nspl, setup.iek0, setup.iemax
+        if getattr(setup, 'dout', None) is None:
+            _autobk_linear_ops(setup, knots, len(coefs))
+        if warm_start and prev_best is not None and len(prev_best) == nspl:
+            coefs[:nspl] = prev_best
+            coefs[nspl:] = prev_best[-1]
+
+        if setup.interp_op is not None:
+            chi0 = setup.interp_op @ mu[iek0:iemax+1]
+        else:
+            chi0 = UnivariateSpline(setup.kraw[:iemax-iek0+1],
+                                    mu[iek0:iemax+1], s=0)(setup.kout)
+        if setup.chi_std is not None:
+            chi0 = chi0 - setup.chi_std
+        out0 = realimag(xftf_fast(chi0*setup.ftwin, nfft=setup.nfft)[:setup.irbkg])
+        userargs = (chi0, out0, setup.dchi, setup.dout, nclamp,
+                    clamp_lo, clamp_hi)
+
+        lsout = leastsq(_resid_linear, 1.0*coefs[:nspl], userargs,
+                        Dfun=_jacob_linear, maxfev=2000*(len(coefs)+1),
+                        gtol=0.0, ftol=1.e-6, xtol=1.e-6, full_output=1,
+                        col_deriv=0, factor=100, diag=None)
+        best, covar = lsout[0], lsout[1]
+        chisqr = ((_resid_linear(best, *userargs))**2).sum()
+        prev_best = best
+
+        result = {k: v for k, v in out.__dict__.items()
+                  if k not in ('__name__', 'journal')}
+        result.update(_autobk_outputs(mu, _step, setup, knots, coefs, spl_y,
+                                      best, covar, chisqr, nclamp))
+        if calc_uncertainties and covar is not None:
+            tmp = Group(**result)
+            autobk_delta_chi(tmp, err_sigma=err_sigma)
+            for attr in ('delta_chi', 'delta_bkg'):
+                if hasattr(tmp, attr):
+                    result[attr] = getattr(tmp, attr)
+        results.append(result)
+    return results
+
+def autobk_batch(groups, rbkg=1, nknots=None, ek0=None, edge_step=None,
+                 kmin=0, kmax=None, kweight=1, dk=0.1, win='hanning',
+                 k_std=None, chi_std=None, nfft=2048, kstep=0.05,
+                 pre_edge_kws=None, nclamp=3, clamp_lo=0, clamp_hi=1,
+                 calc_uncertainties=False, err_sigma=1, interp='spline',
+                 warm_start=True, executor=None, max_workers=None,
+                 _larch=None, **kws):
+    """Use Autobk algorithm to remove XAFS background for a series of spectra,
+    as from a time-resolved or in-situ experiment.
+
+    Parameters:
+    -----------
+      groups:    list of groups, each with `energy` and `mu` arrays
+      warm_start: Flag to start each fit from the spline coefficients of
+                 the previous spectrum [True]
+      executor:  None, 'threads', or 'processes' to process chunks of
+                 spectra concurrently [None]
+      max_workers: maximum number of workers for executor [cpu count]
+
+    All other parameters are as for autobk(), and apply to all spectra.
+    If ek0 or edge_step are not given, they are taken from each group
+    or found with pre_edge() as for autobk().
+
+    Output arrays are written to each group, as for autobk().
+
+    Notes:
+    ------
+      1. The k grids, FT window, spline knots, and the derivatives of chi(k)
+         and its Fourier transform with respect to the spline coefficients
+         are calculated once and shared by all spectra with the same energy
+         array and ek0.  Giving a single ek0 for all spectra ensures this.
+         Otherwise, ek0 is taken as the energy point at or just below the
+         ek0 found for each spectrum, so that spectra on a common energy
+         grid usually share one setup.
+      2. The fits use these derivatives as an analytic Jacobian.  Results
+         are close to those from autobk(), usually with slightly lower
+         chi-square, as the fit does not rely on finite differences.
+      3. With executor, the spectra are split into one contiguous chunk per
+         worker, and warm starts are used within each chunk.
+    """
+    msg = sys.stdout.write
+    if _larch is not None:
+        msg = _larch.writer.write
+    if 'kw' in kws:
+        kweight = kws.pop('kw')
+    if len(kws) > 0:
+        msg('Unrecognized arguments for autobk_batch():\n')
+        msg('    %s\n' % (', '.join(kws.keys())))
+        return
+    if interp not in ('spline', 'linear'):
+        msg("autobk_batch(): interp must be 'spline' or 'linear'\n")
+        return
+    groups = list(groups)
+    setup_kws = dict(rbkg=rbkg, nknots=nknots, kmin=kmin, kmax=kmax,
+                     kweight=kweight, dk=dk, win=win, k_std=k_std,
+                     chi_std=chi_std, nfft=nfft, kstep=kstep, interp=interp)
+    opts = dict(setup_kws=setup_kws, ek0=ek0, edge_step=edge_step,
+                pre_edge_kws=pre_edge_kws, nclamp=nclamp, clamp_lo=clamp_lo,
+                clamp_hi=clamp_hi, calc_uncertainties=calc_uncertainties,
+                err_sigma=err_sigma, warm_start=warm_start)
+
+    def run_chunk(start, stop):
+        return _autobk_batch_run(groups[start:stop], **opts)
+    results = run_chunks(run_chunk, len(groups), executor=executor,
+                         max_workers=max_workers, caller='autobk_batch',
+                         _larch=_larch)
+
+    for group, result in zip(groups, results):
+        if result is None:
+            msg('autobk_batch() could not determine ek0 or edge_step for %s\n'
+                % repr(group))
+            continue
+        for attr, val in result.items():
+            setattr(group, attr, val)
+        if not hasattr(group, 'journal'):
+            set_xafsGroup(group)
+
+
 def autobk_delta_chi(group, err_sigma=1):
     """calculate uncertainties in chi(k) and bkg(E)
     after running autobk
@@ -255,6 +535,13 @@ def autobk_delta_chi(group, err_sigma=1):
     jac_bkg = np.zeros(nmue*nspl).reshape((nspl, nmue))
     tcoefs = np.ones(len(d.coefs)) * d.coefs[-1]
 
+    # the linear interpolation operator is rebuilt here, not stored with
+    # the group, so that groups can be saved and restored
+    kraw = d.kraw[:d.iemax-d.iek0+1]
+    interp_op = None
+    if getattr(d, 'interp', 'spline') == 'linear':
+        interp_op = interp_operator(kraw, group.k)
+
     step = 0.5
     # find derivatives by hand
     for i in range(nspl):
@@ -263,9 +550,9 @@ def autobk_delta_chi(group, err_sigma=1):
         for k in (0, 1):
             tcoefs = [1.0*d.coefs[j] for j in range(nspl)]
             tcoefs[i] = d.coefs[i] + (2*k-1)*step*d.coefs_std[i]
-            b[k], c[k] = spline_eval(d.kraw[:d.iemax-d.iek0+1],
-                                     d.mu[d.iek0:d.iemax+1],
-                                     d.knots, tcoefs, d.order, group.k)
+            b[k], c[k] = spline_eval(kraw, d.mu[d.iek0:d.iemax+1],
+                                     d.knots, tcoefs, d.order, group.k,
+                                     interp_op=interp_op)
         jac_chi[i] = (c[1]- c[0])/(2*step*d.coefs_std[i])
         jac_bkg[i] = (b[1]- b[0])/(2*step*d.coefs_std[i])
 
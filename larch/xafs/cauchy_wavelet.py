@@ -22,11 +22,46 @@
 #
 # 2014-Apr M Newville : translated to Python for Larch
 
+from functools import lru_cache
 import numpy as np
 from larch.larchlib import Make_CallArgs, parse_group_args
 from larch.math import complex_phase
 from .xafsutils import set_xafsGroup
 
+def cauchy_filters(kstep, nfft, r):
+    """
+    Cauchy wavelet filter bank for XAFS
+
+    Parameters:
+    -----------
+      kstep:    k step size of chi(k)
+      nfft:     value to use for N_fft
+      r:        1-d array of R values (with no zero values)
+
+    Returns:
+    --------
+      read-only 2-d array (len(r), nfft) of filters, to be multiplied by
+      the FFT of chi(k).
+
+    Filter banks are cached for repeated kstep, nfft, and r.
+    """
+    r = np.asarray(r, dtype='float64')
+    return _cauchy_filters(float(kstep), int(nfft), r.tobytes())
+
+@lru_cache(maxsize=16)
+def _cauchy_filters(kstep, nfft, rbytes):
+    "cached calculation of cauchy_filters(), with r given as bytes"
+    r = np.frombuffer(rbytes, dtype='float64')
+    nrpts = len(r)
+    omega = np.pi*np.arange(nfft)/(kstep*nfft)
+    aom = (nrpts/(2*r))[:, np.newaxis] * omega
+    aom[np.where(aom==0)] = 1.e-19
+    # Characteristic values for Cauchy wavelet:
+    cauchy_sum = np.log(2*np.pi) - np.log(1.0+np.arange(nrpts)).sum()
+    filt = np.exp(cauchy_sum + nrpts*np.log(aom) - aom)
+    filt.flags.writeable = False
+    return filt
+
 @Make_CallArgs(["k" ,"chi"])
 def cauchy_wavelet(k, chi=None, group=None, kweight=0, rmax_out=10,
                    nfft=2048, _larch=None):
@@ -82,30 +117,16 @@ def cauchy_wavelet(k, chi=None, group=None, kweight=0, rmax_out=10,
         knew = k[:NFT]
         xnew = chi[:NFT]
 
-    # FT parameters
-    freq = (1.0/kstep)*np.arange(nfft)/(2*nfft)
-    omega = 2*np.pi*freq
-
     # simple FT calculation
     tff = np.fft.fft(xnew, n= 2*nfft)
 
     # scale parameter
     r  = np.linspace(0, rmax, nrpts)
     r[0] = 1.e-19
-    a  = nrpts/(2*r)
-
-    # Characteristic values for Cauchy wavelet:
-    cauchy_sum = np.log(2*np.pi) - np.log(1.0+np.arange(nrpts)).sum()
 
-    # Main calculation:
-    out = np.zeros(nkout*nrpts,
-                   dtype='complex128').reshape(nrpts, nkout)
-    for i in range(nrpts):
-        aom = a[i]*omega
-        aom[np.where(aom==0)] = 1.e-19
-        filt = cauchy_sum + nrpts*np.log(aom) - aom
-        tmp  = np.conj(np.exp(filt))*tff[:nfft]
-        out[i, :] = np.fft.ifft(tmp, 2*nfft)[:nkout]
+    # Main calculation: all R values as one batch of inverse FFTs
+    filt = cauchy_filters(kstep, nfft, r)
+    out = np.fft.ifft(filt*tff[:nfft], 2*nfft, axis=-1)[:, :nkout]
 
     group = set_xafsGroup(group, _larch=_larch)
     group.wcauchy_r  =  r
@@ -1,6 +1,7 @@
 import time
 import numpy as np
 from scipy.special import erfc
+from scipy.signal import fftconvolve
 
 from larch import Group
 from larch.math import interp
@@ -70,7 +71,7 @@ def kkmclf_sca(e, finp):
     fout = [0.0]*npts
     if npts >= 2:
         factor = FOPI * (e[npts-1] - e[0]) / (npts - 1)
-        nptsk = npts / 2
+        nptsk = npts // 2
         for i in range(npts):
             fout[i] = 0.0
             ei2 = e[i]*e[i]
@@ -105,7 +106,7 @@ def kkmclr_sca(e, finp):
     fout = [0.0]*npts
 
     factor = -FOPI * (e[npts-1] - e[0]) / (npts - 1)
-    nptsk  = npts / 2
+    nptsk  = npts // 2
     for i in range(npts):
         fout[i] = 0.0
         ei2 = e[i]*e[i]
@@ -192,6 +193,110 @@ def kkmclr(e, finp):
     return fout
 
 
+###
+###  FFT and chunked forms of the same MacLaurin series sums, for long arrays.
+###
+###  On the even grid e[j] = e[0] + j*h, the sums over points of opposite
+###  parity use
+###     1/(e[j]**2 - e[i]**2)  = (1/(e[j]-e[i]) - 1/(e[j]+e[i])) / (2*e[i])
+###     e[j]/(e[j]**2 - e[i]**2) = (1/(e[j]-e[i]) + 1/(e[j]+e[i])) / 2
+###  where e[j]-e[i] = h*(j-i) gives a convolution, and
+###  e[j]+e[i] = 2*e[0] + h*(i+j) gives a convolution with reversed input,
+###  both done with FFTs in O(N log N).
+###
+
+def _kk_fft_sums(e, finp):
+    """return sums over points of opposite parity of
+    finp[j]/(e[j]-e[i]) and finp[j]/(e[j]+e[i]) for even grid e"""
+    npts = len(e)
+    h = (e[-1] - e[0]) / (npts-1)
+    offsets = np.arange(-(npts-1), npts)
+    odd = (offsets % 2) == 1
+    # kernel for sum_j finp[j]/(h*(j-i)), as convolution over (i-j)
+    kdiff = np.zeros(2*npts-1)
+    kdiff[odd] = -1.0/(h*offsets[odd])
+    tsum = fftconvolve(finp, kdiff)[npts-1:2*npts-1]
+    # kernel for sum_j finp[j]/(2*e[0] + h*(i+j)), with reversed finp
+    isum = np.arange(2*npts-1)
+    ksum = np.zeros(2*npts-1)
+    ksum[isum % 2 == 1] = 1.0/(2*e[0] + h*isum[isum % 2 == 1])
+    hsum = fftconvolve(finp[::-1], ksum)[npts-1:2*npts-1]
+    return tsum, hsum
+
+def kkmclf_fft(e, finp):
+    """
+    forward (f'->f'') kk transform, using maclaurin series algorithm,
+    with FFT convolutions.  Gives the same result as kkmclf().
+
+    arguments:
+      e      energy array *must be on an even grid with an even number of points* [npts] (in)
+      finp   f' array [npts] (in)
+      fout   f'' array [npts] (out)
+    """
+    npts = len(e)
+    factor = FOPI * (e[-1] - e[0]) / (npts-1)
+    tsum, hsum = _kk_fft_sums(e, np.asarray(finp, dtype='float64'))
+    return factor * (tsum - hsum) / (2*e)
+
+def kkmclr_fft(e, finp):
+    """
+    reverse (f''->f') kk transform, using maclaurin series algorithm,
+    with FFT convolutions.  Gives the same result as kkmclr().
+
+    arguments:
+      e      energy array *must be on an even grid with an even number of points* [npts] (in)
+      finp   f'' array [npts] (in)
+      fout   f' array [npts] (out)
+    """
+    npts = len(e)
+    factor = -FOPI * (e[-1] - e[0]) / (npts-1)
+    tsum, hsum = _kk_fft_sums(e, np.asarray(finp, dtype='float64'))
+    return factor * (tsum + hsum) / 2
+
+def kkmclr_chunked(e, finp, chunk_size=2**22):
+    """
+    reverse (f''->f') kk transform, using maclaurin series algorithm,
+    evaluating blocks of output points at once, with each block using
+    about chunk_size values of memory.  Gives the same result as kkmclr().
+
+    arguments:
+      e      energy array *must be on an even grid with an even number of points* [npts] (in)
+      finp   f'' array [npts] (in)
+      fout   f' array [npts] (out)
+    """
+    npts = len(e)
+    factor = -FOPI * (e[-1] - e[0]) / (npts-1)
+    e = np.asarray(e, dtype='float64')
+    efinp = e*np.asarray(finp, dtype='float64')
+    index = np.arange(npts)
+    nrows = max(1, chunk_size//max(1, npts//2))
+    fout = np.zeros(npts)
+    for i0 in range(0, npts, nrows):
+        rows = index[i0:i0+nrows]
+        for parity in (0, 1):
+            prows = rows[rows % 2 == parity]
+            cols = index[1-parity::2]
+            de2 = e[cols]**2 - (e[prows]**2)[:, np.newaxis]
+            fout[prows] = (efinp[cols]/de2).sum(axis=1)
+    return fout * factor
+
+
+KK_METHODS = {'fft': kkmclr_fft, 'chunked': kkmclr_chunked,
+              'vector': kkmclr, 'scalar': kkmclr_sca}
+
+def _get_kkmethod(how=None):
+    "KK transform function for a method name or unique prefix [None -> 'fft']"
+    if how is None:
+        how = 'fft'
+    how = how.lower()
+    if how in KK_METHODS:
+        return KK_METHODS[how]
+    matches = [name for name in KK_METHODS if len(how) > 0 and name.startswith(how)]
+    if len(matches) != 1:
+        raise ValueError(f"diffKK: unknown KK method '{how}': use one of {', '.join(KK_METHODS)}")
+    return KK_METHODS[matches[0]]
+
+
 class diffKKGroup(Group):
     """
     A Larch Group for generating f'(E) and f"(E) from a XAS measurement of mu(E).
@@ -211,7 +316,7 @@ class diffKKGroup(Group):
 
 
 # e0=None, z=None, edge=None, order=3, form='mback', whiteline=False, how=None
-    def kk(self, energy=None, mu=None, z=None, edge='K', how='scalar', mback_kws=None):
+    def kk(self, energy=None, mu=None, z=None, edge='K', how='fft', mback_kws=None):
         """
         Convert mu(E) data into f'(E) and f"(E).  f"(E) is made by
         matching mu(E) to the tabulated values of the imaginary part
@@ -224,6 +329,12 @@ class diffKKGroup(Group):
             mu:         array with mu(E) data
             z:          Z number of absorber
             edge:       absorption edge, usually 'K' or 'L3'
+            how:        method for the KK transform (or a unique prefix), one of
+                          'fft'     convolution with FFTs, O(N log N) [default, or None]
+                          'chunked' direct sum, in blocks of limited memory
+                          'vector'  direct sum, looping over energy points
+                          'scalar'  direct sum, looping over all pairs of points
+                        all of these give the same result.
             mback_kws:  arguments for the mback algorithm
 
           Returns
@@ -245,6 +356,8 @@ class diffKKGroup(Group):
         if edge != None: self.edge = edge
         if mback_kws != None: self.mback_kws = mback_kws
 
+        kkmethod = _get_kkmethod(how)
+
         if self.z == None:
             Exception("Z for absorber not provided for diffKK")
         if self.edge == None:
@@ -266,10 +379,7 @@ class diffKKGroup(Group):
         fpp = interp(self.energy, self.fpp-self.f2, self.grid, fill_value=0.0)
 
         ## do difference KK
-        if repr(how).startswith('sca'):
-            fp = kkmclr_sca(self.grid, fpp)
-        else:
-            fp = kkmclr(self.grid, fpp)
+        fp = kkmethod(self.grid, fpp)
 
         ## interpolate back to original grid and add diffKK result to f1 to make fp array
         self.fp = self.f1 + interp(self.grid, fp, self.energy, fill_value=0.0)
@@ -13,10 +13,14 @@ the path represented by the feffNNNN.dat
 creates a group that contains the chi(k) for the sum of paths.
 """
 from pathlib import Path
+from collections import OrderedDict
+import hashlib
+import warnings
+from threading import RLock
 import numpy as np
 import re
 from copy import deepcopy
-from scipy.interpolate import UnivariateSpline
+from scipy.interpolate import UnivariateSpline, BSpline
 from lmfit import Parameters, Parameter
 
 from xraydb import atomic_mass, atomic_symbol
@@ -40,6 +44,193 @@ FDAT_ARRS = ('real_phc', 'mag_feff', 'pha_feff', 'red_fact',
 FEFFDAT_VALUES = ('reff', 'nleg', 'degen', 'rmass', 'rnorman',
                   'gam_ch', 'rs_int', 'vint', 'vmu', 'vfermi')
 
+# Feff.dat arrays that are interpolated onto the e0-shifted k grid
+FEFF_LOOKUP_ARRS = ('pha', 'amp', 'rep', 'lam')
+
+class FeffLookupCache:
+    """LRU cache of Feff.dat arrays (pha, amp, rep, lam) interpolated
+    onto e0-shifted k grids.
+
+    Entries are keyed by (Feff.dat digest, e0, k-array digest, interp),
+    so that identical paths in different datasets share entries, and
+    the total size of cached arrays is bounded by `maxbytes`.
+    """
+    def __init__(self, maxbytes=64*1024*1024):
+        self.maxbytes = maxbytes
+        self._tables = OrderedDict()
+        self._lock = RLock()
+        self.clear()
+
+    def clear(self):
+        "remove all cached tables and reset statistics"
+        with self._lock:
+            self._tables.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    @staticmethod
+    def kgrid_key(k):
+        "digest for a k array"
+        k = np.ascontiguousarray(k, dtype='float64')
+        return (len(k), hashlib.sha256(k.tobytes()).hexdigest())
+
+    def get(self, key):
+        "return cached table for key, or None"
+        with self._lock:
+            table = self._tables.get(key, None)
+            if table is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._tables.move_to_end(key)
+        return table
+
+    def put(self, key, table):
+        "add table to cache, evicting least recently used tables as needed"
+        if self.maxbytes <= 0 or table.nbytes > self.maxbytes:
+            return
+        table.flags.writeable = False
+        with self._lock:
+            if key in self._tables:
+                self.nbytes -= self._tables.pop(key).nbytes
+            self._tables[key] = table
+            self.nbytes += table.nbytes
+            self._trim()
+
+    def resize(self, maxbytes):
+        "set maximum size in bytes, evicting tables as needed"
+        with self._lock:
+            self.maxbytes = maxbytes
+            self._trim()
+
+    def _trim(self):
+        while self._tables and self.nbytes > max(0, self.maxbytes):
+            _key, old = self._tables.popitem(last=False)
+            self.nbytes -= old.nbytes
+            self.evictions += 1
+
+    def stats(self):
+        "return dict of cache statistics"
+        ntot = self.hits + self.misses
+        return dict(hits=self.hits, misses=self.misses,
+                    hit_rate=self.hits/max(1, ntot),
+                    evictions=self.evictions, entries=len(self._tables),
+                    nbytes=self.nbytes, maxbytes=self.maxbytes)
+
+FEFF_LOOKUP_CACHE = FeffLookupCache()
+
+def feff_cache_stats(reset=False):
+    """return statistics for the cache of interpolated Feff.dat arrays
+
+    Parameters:
+    ------------
+      reset:   whether to clear the cache and statistics afterwards [False]
+
+    Returns:
+    ---------
+      dict with hits, misses, hit_rate, evictions, entries, nbytes, maxbytes
+    """
+    out = FEFF_LOOKUP_CACHE.stats()
+    if reset:
+        FEFF_LOOKUP_CACHE.clear()
+    return out
+
+def set_feff_cache_size(maxbytes):
+    """set the maximum size in bytes for the cache of interpolated Feff.dat arrays.
+    Use 0 to disable caching."""
+    FEFF_LOOKUP_CACHE.resize(maxbytes)
+
+def default_kgrid(feffdat, kmax=None, kstep=None):
+    """default k array for calculating chi(k) for a Feff.dat file"""
+    if kmax is None:
+        kmax = 30.0
+    kmax = min(max(feffdat.k), kmax)
+    if kstep is None:
+        kstep = 0.05
+    return kstep * np.arange(int(1.01 + kmax/kstep), dtype='float64')
+
+def e0_shifted_q(k, e0):
+    """e0-shifted wavenumber q = sqrt(k^2 - e0*ETOK), careful to look for |e0| ~= 0.
+
+    e0 can be a scalar, or an array of shape (npaths, 1) to give one
+    row of q for each path.
+    """
+    en = k*k - e0*ETOK
+    aen = abs(en)
+    small = (aen < SMALL_ENERGY).any(axis=-1, keepdims=True)
+    if small.any():
+        en = np.where(small & (aen < 1.5*SMALL_ENERGY), SMALL_ENERGY, en)
+    return np.sign(en)*np.sqrt(abs(en))
+
+def xafs_equation(q, pha, amp, rep, lam, reff, degen=1, s02=1, deltar=0,
+                  sigma2=0, third=0, fourth=0, ei=0):
+    """evaluate the EXAFS equation from interpolated Feff.dat values
+
+    All path parameters can be scalars or arrays of shape (npaths, 1)
+    when q and the Feff.dat values have shape (npaths, nk), so that a
+    whole set of paths can be calculated at once.
+
+    Returns complex chi and complex wavenumber p, each with the shape of q.
+    """
+    # p = complex wavenumber, and its square:
+    pp   = (rep + 1j/lam)**2 + 1j * ei * ETOK
+    p    = np.sqrt(pp)
+
+    # the xafs equation:
+    cchi = np.exp(-2*reff*p.imag - 2*pp*(sigma2 - pp*fourth/3) +
+                  1j*(2*q*reff + pha +
+                      2*p*(deltar - 2*sigma2/reff - 2*pp*third/3) ))
+
+    cchi = degen * s02 * amp * cchi / (q*(reff + deltar)**2)
+    cchi[..., 0] = 2*cchi[..., 1] - cchi[..., 2]
+    return cchi, p
+
+def xafs_equation_derivs(q, table, dtable, reff, degen=1, s02=1, deltar=0,
+                         sigma2=0, third=0, fourth=0, ei=0):
+    """derivatives of chi(k) from the EXAFS equation with respect to the
+    path parameters, in the order of PATH_PARS:
+       (s02, e0, deltar, sigma2, third, fourth, ei)
+
+    table holds the interpolated (pha, amp, rep, lam) and dtable their
+    derivatives with respect to q, each with shape (4,)+q.shape.  Path
+    parameters can be scalars or arrays of shape (npaths, 1), as for
+    xafs_equation().
+
+    Returns real array of shape (7,)+q.shape.
+    """
+    pha, amp, rep, lam = table
+    dpha, damp, drep, dlam = dtable
+    pp   = (rep + 1j/lam)**2 + 1j * ei * ETOK
+    p    = np.sqrt(pp)
+    fac  = deltar - 2*sigma2/reff - 2*pp*third/3
+    phi  = (-2*reff*p.imag - 2*pp*(sigma2 - pp*fourth/3) +
+            1j*(2*q*reff + pha + 2*p*fac))
+    base = degen * np.exp(phi) / (q*(reff + deltar)**2)
+    cchi = s02 * amp * base
+
+    def dphi(dpp):
+        "derivative of exponent for a change in pp"
+        dp = dpp / (2*p)
+        return (-2*reff*dp.imag - 2*dpp*(sigma2 - 2*pp*fourth/3) +
+                2j*(dp*fac - 2*p*dpp*third/3))
+
+    # e0 enters only through q:  dq/de0 = -ETOK/(2|q|)
+    dpp_dq = 2*(rep + 1j/lam)*(drep - 1j*dlam/(lam*lam))
+    dchi_dq = (cchi*(dphi(dpp_dq) + 1j*(2*reff + dpha) - 1/q) +
+               s02*damp*base)
+
+    out = np.array([amp*base,                           # s02
+                    -dchi_dq*ETOK/(2*abs(q)),           # e0
+                    cchi*(2j*p - 2/(reff + deltar)),    # deltar
+                    cchi*(-2*pp - 4j*p/reff),           # sigma2
+                    cchi*(-4j*p*pp/3),                  # third
+                    cchi*(2*pp*pp/3),                   # fourth
+                    cchi*dphi(1j*ETOK)])                # ei
+    out[..., 0] = 2*out[..., 1] - out[..., 2]
+    return out.imag
+
 class FeffDatFile(Group):
     def __init__(self, filename=None,  **kws):
         kwargs = dict(name='feff.dat: %s' % filename)
@@ -49,6 +240,7 @@ class FeffDatFile(Group):
         self.__nleg__ = 0
         self.__rmass = None
         self.__geometry = None
+        self.__digest = None
         Group.__init__(self,  **kwargs)
         if filename not in ('', None) and Path(filename).exists():
             self._read(filename)
@@ -128,9 +320,25 @@ class FeffDatFile(Group):
     def geometry(self, val):
         pass
 
+    @property
+    def digest(self):
+        """sha256 digest of the Feff.dat arrays, used to key cached interpolations"""
+        if self.__digest is None and getattr(self, 'k', None) is not None:
+            _hash = hashlib.sha256()
+            for attr in ('k',) + FEFF_LOOKUP_ARRS:
+                arr = np.ascontiguousarray(getattr(self, attr), dtype='float64')
+                _hash.update(arr.tobytes())
+            self.__digest = _hash.hexdigest()
+        return self.__digest
+
+    @digest.setter
+    def digest(self, val):
+        pass
+
     def _set_from_dict(self, **kws):
         self.__rmass = None
         self.__geometry = None
+        self.__digest = None
         for key, val in kws.items():
             if key  == 'rmass':
                 continue
@@ -158,6 +366,7 @@ class FeffDatFile(Group):
         self.rep = np.array(self.rep)
         self.pha = np.array(self.pha)
         self.amp = np.array(self.amp)
+        self.__digest = None
 
     def __getstate__(self):
         return (self.filename, self.title, self.version, self.shell,
@@ -258,6 +467,7 @@ class FeffDatFile(Group):
         self.amp = data[2] * data[4]
         self.__rmass = None  # reduced mass of path
         self.__geometry = None  # path geometry list [atom, dist, angle]
+        self.__digest = None  # digest of arrays, set when needed
 
 class FeffPathGroup(Group):
     def __init__(self, filename=None, label='', feffrun='', s02=None, degen=None,
@@ -442,6 +652,16 @@ class FeffPathGroup(Group):
                 attr = 'expr'
             kws =  {'vary': False, attr: val}
             parname = self.pathpar_name(pname)
+            # re-adding an unchanged path parameter is expensive and
+            # not needed: expressions are re-evaluated when used.
+            par = self.params.get(parname, None)
+            if (par is not None and getattr(par, 'is_pathparam', False)
+                and not par.vary):
+                if attr == 'expr' and par.expr == val:
+                    continue
+                if (attr == 'value' and par.expr is None and
+                    isinstance(val, (int, float)) and par.value == val):
+                    continue
             self.params.add(parname, **kws)
             self.params[parname].is_pathparam = True
 
@@ -453,6 +673,51 @@ class FeffPathGroup(Group):
         self.spline_coefs['amp'] = UnivariateSpline(fdat.k, fdat.amp, s=0)
         self.spline_coefs['rep'] = UnivariateSpline(fdat.k, fdat.rep, s=0)
         self.spline_coefs['lam'] = UnivariateSpline(fdat.k, fdat.lam, s=0)
+        # all four splines share the knots from fdat.k, so that they can
+        # also be evaluated together as one vector-valued B-spline
+        knots, _c, order = self.spline_coefs['pha']._eval_args
+        coefs = np.array([self.spline_coefs[a]._eval_args[1]
+                          for a in FEFF_LOOKUP_ARRS]).T
+        self.spline_coefs['all'] = BSpline(knots, coefs, order)
+        self.spline_coefs['knotkey'] = (order, knots.tobytes())
+
+    def lookup_feffdat(self, q, e0=None, k=None, interp='cubic', kgrid_key=None,
+                       deriv=False):
+        """interpolate Feff.dat arrays (pha, amp, rep, lam) onto q
+
+        Returns an array of shape (4, len(q)), or the derivatives of these
+        arrays with respect to q if deriv is True.  If e0 and k are given,
+        the result is kept in the Feff lookup cache, and is reused for
+        later calls with the same Feff.dat data, e0, k, and interp, as
+        when only amplitude parameters change.
+        """
+        key = None
+        if e0 is not None and k is not None:
+            if kgrid_key is None:
+                kgrid_key = FEFF_LOOKUP_CACHE.kgrid_key(k)
+            key = (self._feffdat.digest, float(e0), kgrid_key,
+                   f'{interp}/dq' if deriv else interp)
+            table = FEFF_LOOKUP_CACHE.get(key)
+            if table is not None:
+                return table
+        if self.spline_coefs is None:
+            self.create_spline_coefs()
+        if interp.startswith('lin'):
+            fdat = self._feffdat
+            def lininterp(x):
+                return np.array([np.interp(x, fdat.k, getattr(fdat, attr))
+                                 for attr in FEFF_LOOKUP_ARRS])
+            if deriv:
+                table = (lininterp(q+1.e-5) - lininterp(q-1.e-5))/2.e-5
+            else:
+                table = lininterp(q)
+        elif deriv:
+            table = self.spline_coefs['all'].derivative()(q).T
+        else:
+            table = self.spline_coefs['all'](q).T
+        if key is not None:
+            FEFF_LOOKUP_CACHE.put(key, table)
+        return table
 
     def store_feffdat(self):
         """stores data about this Feff path in the Parameters
@@ -641,48 +906,27 @@ class FeffPathGroup(Group):
         """calculate chi(k) with the provided parameters"""
         fdat = self._feffdat
         if fdat.reff < 0.05:
-            print('reff is too small to calculate chi(k)')
+            warnings.warn('reff is too small to calculate chi(k)')
             return
         # make sure we have a k array
         if k is None:
-            if kmax is None:
-                kmax = 30.0
-            kmax = min(max(fdat.k), kmax)
-            if kstep is None: kstep = 0.05
-            k = kstep * np.arange(int(1.01 + kmax/kstep), dtype='float64')
+            k = default_kgrid(fdat, kmax=kmax, kstep=kstep)
         if not self.use:
             self.k = k
             self.p = k
             self.chi = 0.0 * k
             self.chi_imag = 0.0 * k
             return
-        reff = fdat.reff
         # get values for all the path parameters
         (s02, e0, deltar, sigma2, third, fourth, ei)  = \
           self.__path_params(s02=s02, e0=e0, deltar=deltar,
                             sigma2=sigma2, third=third, fourth=fourth, ei=ei)
 
-        # create e0-shifted energy and k, careful to look for |e0| ~= 0.
-        en = k*k - e0*ETOK
-        if min(abs(en)) < SMALL_ENERGY:
-            try:
-                en[np.where(abs(en) < 1.5*SMALL_ENERGY)] = SMALL_ENERGY
-            except ValueError:
-                pass
         # q is the e0-shifted wavenumber
-        q = np.sign(en)*np.sqrt(abs(en))
+        q = e0_shifted_q(k, e0)
 
         # lookup Feff.dat values (pha, amp, rep, lam)
-        if interp.startswith('lin'):
-            pha = np.interp(q, fdat.k, fdat.pha)
-            amp = np.interp(q, fdat.k, fdat.amp)
-            rep = np.interp(q, fdat.k, fdat.rep)
-            lam = np.interp(q, fdat.k, fdat.lam)
-        else:
-            pha = self.spline_coefs['pha'](q)
-            amp = self.spline_coefs['amp'](q)
-            rep = self.spline_coefs['rep'](q)
-            lam = self.spline_coefs['lam'](q)
+        pha, amp, rep, lam = self.lookup_feffdat(q, e0=e0, k=k, interp=interp)
 
         if debug:
             self.debug_k   = q
@@ -691,17 +935,9 @@ class FeffPathGroup(Group):
             self.debug_rep = rep
             self.debug_lam = lam
 
-        # p = complex wavenumber, and its square:
-        pp   = (rep + 1j/lam)**2 + 1j * ei * ETOK
-        p    = np.sqrt(pp)
-
-        # the xafs equation:
-        cchi = np.exp(-2*reff*p.imag - 2*pp*(sigma2 - pp*fourth/3) +
-                      1j*(2*q*reff + pha +
-                          2*p*(deltar - 2*sigma2/reff - 2*pp*third/3) ))
-
-        cchi = self.degen * s02 * amp * cchi / (q*(reff + deltar)**2)
-        cchi[0] = 2*cchi[1] - cchi[2]
+        cchi, p = xafs_equation(q, pha, amp, rep, lam, fdat.reff,
+                                degen=self.degen, s02=s02, deltar=deltar,
+                                sigma2=sigma2, third=third, fourth=fourth, ei=ei)
         # outputs:
         self.k = k
         self.p = p
@@ -709,6 +945,144 @@ class FeffPathGroup(Group):
         self.chi_imag = -cchi.real
 
 
+def path_values(pathlist, k):
+    """evaluate path parameters for the paths in pathlist to be used
+    in calculating chi(k), setting chi(k) for unused paths to zero.
+
+    Path parameters are evaluated in the symbol table of the Parameters
+    of each path, and so should not be evaluated concurrently for paths
+    sharing Parameters.
+
+    Returns list of used paths and array of (npaths, 9, 1) with
+    (degen, reff, s02, e0, deltar, sigma2, third, fourth, ei)
+    """
+    zeros = np.zeros(len(k), dtype='float64')
+    paths, pvals = [], []
+    for path in pathlist:
+        if path._feffdat.reff < 0.05 or not path.use:
+            if path.use:
+                warnings.warn('reff is too small to calculate chi(k)')
+            path.k, path.p = k, k
+            path.chi, path.chi_imag = zeros.copy(), zeros.copy()
+            continue
+        pars = path.path_paramvals()
+        paths.append(path)
+        pvals.append([path.degen, path._feffdat.reff] +
+                     [pars[pname] for pname in PATH_PARS])
+    return paths, np.array(pvals, dtype='float64').reshape(len(paths), -1, 1)
+
+def _lookup_paths(paths, q, e0, k, interp='cubic', deriv=False):
+    """collect Feff.dat lookups for a list of paths from the cache, and
+    batch the cubic splines for cache misses with common knots and e0.
+
+    Returns array of shape (npaths, 4, nk)
+    """
+    kgrid_key = FEFF_LOOKUP_CACHE.kgrid_key(k)
+    tables = [None]*len(paths)
+    batches = {}
+    tinterp = f'{interp}/dq' if deriv else interp
+    for i, path in enumerate(paths):
+        e0val = float(e0[i, 0])
+        if interp.startswith('lin'):
+            tables[i] = path.lookup_feffdat(q[i], e0=e0val, k=k, interp=interp,
+                                            kgrid_key=kgrid_key, deriv=deriv)
+            continue
+        key = (path._feffdat.digest, e0val, kgrid_key, tinterp)
+        tables[i] = FEFF_LOOKUP_CACHE.get(key)
+        if tables[i] is None:
+            if path.spline_coefs is None:
+                path.create_spline_coefs()
+            bkey = (e0val, path.spline_coefs['knotkey'])
+            batches.setdefault(bkey, []).append((i, key))
+
+    nlook = len(FEFF_LOOKUP_ARRS)
+    for (e0val, knotkey), ipaths in batches.items():
+        spl = paths[ipaths[0][0]].spline_coefs['all']
+        coefs = np.concatenate([paths[i].spline_coefs['all'].c
+                                for i, key in ipaths], axis=1)
+        spl = BSpline(spl.t, coefs, spl.k)
+        if deriv:
+            spl = spl.derivative()
+        vals = spl(q[ipaths[0][0]]).T
+        for j, (i, key) in enumerate(ipaths):
+            tables[i] = vals[j*nlook:(j+1)*nlook].copy()
+            FEFF_LOOKUP_CACHE.put(key, tables[i])
+    return np.array(tables)
+
+def calc_chi_paths(pathlist, k, interp='cubic', pathvals=None):
+    """calculate chi(k) for a list of Feff Paths in a single pass
+
+    The path parameters for all paths must already be set up, as with
+    `create_path_params()`.  The Feff.dat lookups for all paths that
+    need new interpolation and share the same e0 and the same Feff
+    k grid are done together, then the EXAFS equation is evaluated
+    for all paths as (npaths, nk) arrays.
+
+    Parameters:
+    ------------
+      pathlist:  list of FeffPath Groups
+      k:         array of k values to calculate chi.
+      interp:    interpolation of Feff.dat arrays, 'cubic' or 'linear' ['cubic']
+      pathvals:  output of path_values(pathlist, k), if already evaluated [None]
+
+    Returns:
+    ---------
+      array of the sum of chi(k) for all paths.
+
+    The arrays k, p, chi, and chi_imag are written to each path.
+    """
+    if pathvals is None:
+        pathvals = path_values(pathlist, k)
+    paths, pvals = pathvals
+    if len(paths) == 0:
+        return np.zeros(len(k), dtype='float64')
+
+    (degen, reff, s02, e0, deltar, sigma2, third, fourth, ei) = pvals.transpose(1, 0, 2)
+    q = e0_shifted_q(k, e0)
+    pha, amp, rep, lam = _lookup_paths(paths, q, e0, k, interp=interp).transpose(1, 0, 2)
+    cchi, p = xafs_equation(q, pha, amp, rep, lam, reff, degen=degen,
+                            s02=s02, deltar=deltar, sigma2=sigma2,
+                            third=third, fourth=fourth, ei=ei)
+    for i, path in enumerate(paths):
+        path.k = k
+        path.p = p[i]
+        path.chi = cchi[i].imag
+        path.chi_imag = -cchi[i].real
+    return cchi.imag.sum(axis=0)
+
+def calc_chi_paths_derivs(pathlist, k, interp='cubic'):
+    """calculate derivatives of chi(k) with respect to the path parameters
+    for a list of Feff Paths, using the current values of the path parameters.
+
+    Parameters:
+    ------------
+      pathlist:  list of FeffPath Groups
+      k:         array of k values to calculate chi.
+      interp:    interpolation of Feff.dat arrays, 'cubic' or 'linear' ['cubic']
+
+    Returns:
+    ---------
+      array of shape (npaths, 7, nk) of dchi/dpar, with parameters in the
+      order of PATH_PARS: (s02, e0, deltar, sigma2, third, fourth, ei).
+      Derivatives for unused paths are zero.
+    """
+    out = np.zeros((len(pathlist), len(PATH_PARS), len(k)), dtype='float64')
+    paths, pvals = path_values(pathlist, k)
+    if len(paths) == 0:
+        return out
+
+    (degen, reff, s02, e0, deltar, sigma2, third, fourth, ei) = pvals.transpose(1, 0, 2)
+    q = e0_shifted_q(k, e0)
+    table = _lookup_paths(paths, q, e0, k, interp=interp).transpose(1, 0, 2)
+    dtable = _lookup_paths(paths, q, e0, k, interp=interp, deriv=True).transpose(1, 0, 2)
+    derivs = xafs_equation_derivs(q, table, dtable, reff, degen=degen, s02=s02,
+                                  deltar=deltar, sigma2=sigma2, third=third,
+                                  fourth=fourth, ei=ei)
+    used = [id(path) for path in paths]
+    index = [i for i, path in enumerate(pathlist) if id(path) in used]
+    out[index] = derivs.transpose(1, 0, 2)
+    return out
+
 
 def path2chi(path, params=None, paramgroup=None, **kws):
     """calculate chi(k) for a Feff Path,
@@ -752,8 +1126,9 @@ def ff2chi(paths, group=None, params=None, k=None, kmax=None, kstep=0.05,
     ---------
        group contain arrays for k and chi
 
-    This essentially calls path2chi() for each of the paths in the
-    `paths` and writes the resulting arrays to group.k and group.chi.
+    This calculates chi(k) for all of the paths in `paths` together
+    (see calc_chi_paths()), writes chi(k) for each path to the path
+    group, and writes the summed arrays to group.k and group.chi.
 
     """
     if params is None:
@@ -778,11 +1153,10 @@ def ff2chi(paths, group=None, params=None, k=None, kmax=None, kstep=0.05,
             print(f"{path} is not a valid Feff Path")
             return
         path.create_path_params(params=params)
-        path._calc_chi(k=k, kstep=kstep, kmax=kmax)
-    k = pathlist[0].k[:]*1.0
-    out = np.zeros_like(k)
-    for path in pathlist:
-        out += path.chi
+    if k is None:
+        k = default_kgrid(pathlist[0]._feffdat, kmax=kmax, kstep=kstep)
+    k = k[:]*1.0
+    out = calc_chi_paths(pathlist, k, interp=kws.get('interp', 'cubic'))
 
     if group is None:
         group = Group()
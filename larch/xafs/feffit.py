@@ -7,8 +7,11 @@ try:
 except ImportError:
     from collections import Iterable
 from copy import copy, deepcopy
-from functools import partial
+from functools import partial, lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import multiprocessing as mp
 import ast
+import os
 import numpy as np
 from numpy import array, arange, interp, pi, zeros, sqrt, concatenate
 
@@ -20,21 +23,25 @@ except ImportError:
 
 from scipy.interpolate import splrep, splev
 from scipy.interpolate import InterpolatedUnivariateSpline as IUSpline
-from lmfit import Parameters, Parameter, Minimizer, conf_interval2d
+from lmfit import Parameters, Parameter, Minimizer, conf_interval
 from lmfit.printfuncs import getfloat_attr
 
 from larch import Group
 from larch.larchlib import isNamedClass
 from larch.utils.strutils import b32hash, random_varname
+from larch.utils.pools import pool_kind, fork_pool
 from ..math import index_of, realimag, complex_phase, remove_nans
 from ..fitting import (correlated_values, eval_stderr, ParameterGroup,
                        dict2params, group2params, params2group, isParameter)
 
 from .sigma2_models import add_sigma2funcs
+from .cauchy_wavelet import cauchy_filters
 from .xafsutils import set_xafsGroup, gfmt
 from .xafsft import xftf_fast, xftr_fast, ftwindow
 from .autobk import autobk_delta_chi
-from .feffdat import FeffPathGroup, ff2chi, PATH_PARS, FEFFDAT_VALUES
+from .feffdat import (FeffPathGroup, ff2chi, feff_cache_stats, path_values,
+                      calc_chi_paths, calc_chi_paths_derivs, PATH_PARS,
+                      FEFFDAT_VALUES)
 
 def propagate_uncertainties(result, datasets, _larch=None):
     """propagate uncertainties from fitting Parameters to all constrained
@@ -263,6 +270,7 @@ class TransformGroup(Group):
         if self._cauchymask is None:
             if self.wavelet_mask is not None:
                 self._cauchymask = self.wavelet_mask
+                self._cauchyslice = (slice(None), slice(None))
             else:
                 ikmin = int(max(0, 0.01 + self.kmin/self.kstep))
                 ikmax = int(min(self.nfft/2,  0.01 + self.kmax/self.kstep))
@@ -282,8 +290,6 @@ class TransformGroup(Group):
         if self.kwin is None:
             self.make_cwt_arrays(nkpts, nrpts)
 
-        omega = pi*np.arange(self.nfft)/(self.kstep*self.nfft)
-
         if kweight is None:
             kweight = self.get_kweight()
         if kweight != 0:
@@ -300,20 +306,15 @@ class TransformGroup(Group):
         nrpts = int(np.round(self.rmax/self.rstep))
         r   = self.rstep * arange(nrpts)
         r[0] = 1.e-19
-        alpha = nrpts/(2*r)
 
         self.make_cwt_arrays(nkpts, nrpts)
 
-        cauchy_sum = np.log(2*pi) - np.log(1.0+np.arange(nrpts)).sum()
-
-        out = np.zeros(nrpts*nkpts, dtype='complex128').reshape(nrpts, nkpts)
-
-        for i in range(nrpts):
-            aom = alpha[i]*omega
-            filt = cauchy_sum + nrpts*np.log(aom) - aom
-            out[i, :] = np.fft.ifft(np.exp(filt)*_ffchi, 2*self.nfft)[:nkpts]
-
-        return (out*self._cauchymask)[self._cauchyslice]
+        # only the R values kept by the mask are calculated, all as
+        # one batch of inverse FFTs with a cached filter bank
+        rows, cols = self._cauchyslice
+        filt = cauchy_filters(self.kstep, self.nfft, r)[rows]
+        out = np.fft.ifft(filt*_ffchi, 2*self.nfft, axis=-1)[:, :nkpts]
+        return (out*self._cauchymask[rows])[:, cols]
 
 class FeffitDataSet(Group):
     def __init__(self, data=None, paths=None, transform=None, epsilon_k=None,
@@ -600,18 +601,34 @@ class FeffitDataSet(Group):
 
 
 
-    def _residual(self, params, data_only=False, **kws):
+    def _path_values(self, params):
+        """evaluate path parameters for all paths, for use in _residual()"""
+        if not self._prepared:
+            self.prepare_fit(params)
+        pathlist = list(self.paths.values())
+        for path in pathlist:
+            path.create_path_params(params=params)
+        return path_values(pathlist, self.model.k)
+
+    def _residual(self, params, data_only=False, pathvals=None, **kws):
         """return the residual for this data set
         residual = self.transform.apply(data_chi - model_chi)
         where model_chi is the result of ff2chi(paths)
+
+        pathvals, the output of _path_values(), can be given when the
+        path parameters have already been evaluated.
         """
         if not isNamedClass(self.transform, TransformGroup):
             return
         if not self._prepared:
             self.prepare_fit(params)
 
-        ff2chi(self.paths, params=params, k=self.model.k,
-                _larch=self._larch, group=self.model)
+        if pathvals is None:
+            ff2chi(self.paths, params=params, k=self.model.k,
+                   _larch=self._larch, group=self.model)
+        else:
+            self.model.chi = calc_chi_paths(list(self.paths.values()),
+                                            self.model.k, pathvals=pathvals)
 
         self._bkg = 0.0
         if self.refine_bkg:
@@ -625,13 +642,45 @@ class FeffitDataSet(Group):
                 coefs.append(par.value)
             self._bkg = splev(self.model.k, [knots, coefs, order])
 
-        eps_k = self.epsilon_k
-        if isinstance(eps_k, np.ndarray):
-            eps_k[np.where(eps_k<1.e-12)[0]] = 1.e-12
-
         diff  = self._chi - self._bkg
         if not data_only:  # data_only for extracting transformed data
             diff -= self.model.chi
+        return self._transform_diff(diff)
+
+    def _jacobian(self, params, var_names, pathpar_grads):
+        """return the Jacobian of the residual for this data set, with
+        shape (len(residual), len(var_names)), given the derivatives of
+        the path parameters with respect to the variables
+        (see _pathpar_gradients)
+        """
+        if not self._prepared:
+            self.prepare_fit(params)
+        k = self.model.k
+        pathlist = list(self.paths.values())
+        nvars = len(var_names)
+        # d(model chi)/d(var) = sum over paths and path params of
+        # d(chi)/d(path param) * d(path param)/d(var)
+        dchi = calc_chi_paths_derivs(pathlist, k)
+        grads = np.array([pathpar_grads[id(path)] for path in pathlist])
+        dmodel = np.einsum('pjk,pjv->vk', dchi, grads.reshape(len(pathlist), -1, nvars))
+        if self.refine_bkg:
+            knots = self.bkg_spline['knots']
+            order = self.bkg_spline['order']
+            for i in range(self.bkg_spline['nspline']):
+                parname = f'bkg{i:02d}_{self.hashkey}'
+                if parname in var_names:
+                    unit = np.zeros(len(self.bkg_spline['coefs']))
+                    unit[i] = 1.0
+                    dmodel[var_names.index(parname)] += splev(k, [knots, unit, order])
+        # residual is transform(data - bkg - model), linear in model and bkg
+        return np.array([self._transform_diff(-dm) for dm in dmodel]).T
+
+    def _transform_diff(self, diff):
+        """apply fit-space transform (weighting, windows, and Fourier
+        transforms) to a difference in chi(k), giving the residual"""
+        eps_k = self.epsilon_k
+        if isinstance(eps_k, np.ndarray):
+            eps_k[np.where(eps_k<1.e-12)[0]] = 1.e-12
         trans = self.transform
         k     = trans.k_[:len(diff)]
 
@@ -650,7 +699,7 @@ class FeffitDataSet(Group):
             if all_kweights:
                 out = []
                 for i, kw in enumerate(trans.kweight):
-                    cwt = trans.cwt(diff/eps_k, kweight=kw)
+                    cwt = trans.cwt(diff/eps_k[i], kweight=kw)
                     out.append(realimag(cwt).ravel())
                 return np.concatenate(out)
             else:
@@ -778,12 +827,175 @@ def feffit_transform(_larch=None, **kws):
     """
     return TransformGroup(_larch=_larch, **kws)
 
-def _feffit_resid(params, datasets=None, **kwargs):
+def _feffit_resid(params, datasets=None, executor=None, **kwargs):
     """ this is the residual function for feffit"""
+    if executor is not None and len(datasets) > 1:
+        return concatenate(executor.residuals(params, datasets))
     return concatenate([d._residual(params) for d in datasets])
 
+# parameters and datasets for feffit worker processes, set before forking
+_WORKER_STATE = {}
+
+def _worker_residual(index, values):
+    "residual for one dataset in a feffit worker process"
+    params = _WORKER_STATE['params']
+    for name, val in values.items():
+        params[name].value = val
+    params.update_constraints()
+    return _WORKER_STATE['datasets'][index]._residual(params)
+
+class FeffitExecutor:
+    """evaluate the residuals for several Feffit Datasets concurrently
+
+    Parameters:
+    ------------
+      kind:         'threads' or 'processes' ['threads']
+      max_workers:  maximum number of workers [number of datasets, up to cpu count]
+      _larch:       larch interpreter, for writing warnings [None]
+
+    With 'threads', path parameters are evaluated serially (they share
+    one symbol table), and chi(k) and the Fourier transforms for each
+    dataset are calculated in a thread pool.
+
+    With 'processes', each worker process gets a copy of the datasets and
+    Parameters when the pool starts and is then sent only the values of
+    the variables.
+    """
+    def __init__(self, kind='threads', max_workers=None, _larch=None):
+        self.kind = pool_kind(kind, 'feffit', _larch=_larch)
+        self.max_workers = max_workers
+        self.pool = None
+
+    def _start(self, params, datasets):
+        nworkers = self.max_workers
+        if nworkers is None:
+            nworkers = min(len(datasets), mp.cpu_count())
+        if self.kind == 'threads':
+            self.pool = ThreadPoolExecutor(max_workers=nworkers)
+        else:
+            _WORKER_STATE.update(params=params, datasets=datasets)
+            self.pool = fork_pool(max_workers=nworkers)
+
+    def residuals(self, params, datasets):
+        "return list of residuals for datasets, in order"
+        if self.pool is None:
+            self._start(params, datasets)
+        if self.kind == 'threads':
+            pathvals = [ds._path_values(params) for ds in datasets]
+            futures = [self.pool.submit(ds._residual, params, pathvals=pvals)
+                       for ds, pvals in zip(datasets, pathvals)]
+        else:
+            values = {name: par.value for name, par in params.items() if par.vary}
+            futures = [self.pool.submit(_worker_residual, i, values)
+                       for i in range(len(datasets))]
+        return [f.result() for f in futures]
+
+    def close(self):
+        "shut down worker pool"
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        _WORKER_STATE.clear()
+
+@lru_cache(maxsize=1024)
+def _expr_names(expr):
+    "names used in a parameter expression"
+    return frozenset(node.id for node in ast.walk(ast.parse(expr))
+                     if isinstance(node, ast.Name))
+
+def _update_constraints(params, names):
+    """update values of constrained parameters in names, evaluating
+    dependencies (also in names) first"""
+    names = set(names)
+    def update(name):
+        if name not in names:
+            return
+        names.discard(name)
+        par = params[name]
+        for dname in getattr(par, '_expr_deps', []):
+            update(dname)
+        params._asteval.symtable[name] = par.value
+    for name in list(names):
+        update(name)
+
+def _pathpar_gradients(params, datasets, var_names):
+    """derivatives of all path parameters with respect to the variables.
+
+    Only parameter expressions are evaluated here, using central
+    differences, and only for path parameters that depend on each
+    variable.  Returns dict of {id(path): array of shape (7, nvars)},
+    with path parameters in the order of PATH_PARS.
+    """
+    deps = {}
+    def vardeps(name):
+        "set of variable names that a parameter depends on"
+        if name not in deps:
+            deps[name] = set()
+            par = params.get(name, None)
+            if par is None:
+                return deps[name]
+            if par.vary:
+                deps[name] = {name}
+            elif par.expr is not None:
+                out = set()
+                for dname in _expr_names(par.expr):
+                    if dname != name:
+                        out |= vardeps(dname)
+                deps[name] = out
+        return deps[name]
+
+    pathpars = []
+    for ds in datasets:
+        for path in ds.paths.values():
+            pathpars.append((path, [path.pathpar_name(p) for p in PATH_PARS]))
+    constraints = [name for name, par in params.items()
+                   if par.expr is not None and not getattr(par, 'is_pathparam', False)]
+
+    nvars = len(var_names)
+    grads = {id(path): zeros((len(PATH_PARS), nvars)) for path, _ in pathpars}
+    for ivar, vname in enumerate(var_names):
+        # (path, index of path parameter, parameter name) depending on this variable
+        affected = [(path, i, pname) for path, pnames in pathpars
+                    for i, pname in enumerate(pnames) if vname in vardeps(pname)]
+        if len(affected) == 0:
+            continue
+        dependents = [name for name in constraints if vname in vardeps(name)]
+        par = params[vname]
+        val0 = par.value
+        step = 1.e-7*max(abs(val0), 1.0)
+        vhi, vlo = min(val0+step, par.max), max(val0-step, par.min)
+        if vhi <= vlo:
+            continue
+        pvals = []
+        for val in (vhi, vlo):
+            par.value = val
+            _update_constraints(params, dependents)
+            vals, current = [], None
+            for path, i, pname in affected:
+                if path is not current:
+                    path.store_feffdat()
+                    current = path
+                vals.append(params[pname].value)
+            pvals.append(np.array(vals))
+        par.value = val0
+        _update_constraints(params, dependents)
+        dvals = (pvals[0] - pvals[1])/(vhi - vlo)
+        for (path, i, pname), dval in zip(affected, dvals):
+            grads[id(path)][i, ivar] = dval
+    return grads
+
+def _feffit_jacobian(params, datasets=None, **kwargs):
+    """analytic Jacobian for the feffit residual, with derivatives of
+    chi(k) from the EXAFS equation, and only path parameter expressions
+    differentiated numerically"""
+    var_names = [name for name, par in params.items() if par.vary]
+    pathpar_grads = _pathpar_gradients(params, datasets, var_names)
+    return concatenate([d._jacobian(params, var_names, pathpar_grads)
+                        for d in datasets])
+
 def feffit(paramgroup, datasets, rmax_out=10, path_outputs=True,
-           fix_unused_variables=True,  _larch=None, **kws):
+           fix_unused_variables=True, analytic_jacobian=False, executor=None,
+           max_workers=None, _larch=None, **kws):
     """execute a Feffit fit: a fit of feff paths to a list of datasets
 
     Parameters:
@@ -794,6 +1006,12 @@ def feffit(paramgroup, datasets, rmax_out=10, path_outputs=True,
       path_output:  Flag to set whether all Path outputs should be written.
       fix_unused_variables: Flag for whether to set `vary=False` for unused
                     variable parameters.  Otherwise, a warning will be printed.
+      analytic_jacobian: Flag for whether to use derivatives of the EXAFS
+                    equation for the Jacobian instead of finite differences
+                    of the full residual [False]
+      executor:     None, 'threads', or 'processes' to evaluate the residuals
+                    for multiple datasets concurrently [None]
+      max_workers:  maximum number of workers for executor [None]
     Returns:
     ---------
       a fit results group.  This will contain subgroups of:
@@ -890,10 +1108,25 @@ def feffit(paramgroup, datasets, rmax_out=10, path_outputs=True,
             print(f"Feffit Warning: unused variables: {vlist}")
 
     # run fit
-    fit = Minimizer(_feffit_resid, params, fcn_kws=dict(datasets=datasets),
+    fcn_kws = dict(datasets=datasets)
+    if executor is not None and len(datasets) > 1:
+        fcn_kws['executor'] = FeffitExecutor(kind=executor, max_workers=max_workers,
+                                             _larch=_larch)
+    fit = Minimizer(_feffit_resid, params, fcn_kws=fcn_kws,
                     scale_covar=False, **fit_kws)
 
-    result = fit.leastsq()
+    cache0 = feff_cache_stats()
+    try:
+        if analytic_jacobian:
+            result = fit.leastsq(Dfun=_feffit_jacobian, col_deriv=False)
+        else:
+            result = fit.leastsq()
+    finally:
+        if 'executor' in fcn_kws:
+            fcn_kws['executor'].close()
+    cache1 = feff_cache_stats()
+    feff_cache = {'hits': cache1['hits'] - cache0['hits'],
+                  'misses': cache1['misses'] - cache0['misses']}
     dat = concatenate([d._residual(result.params, data_only=True)
                        for d in datasets])
 
@@ -926,37 +1159,217 @@ def feffit(paramgroup, datasets, rmax_out=10, path_outputs=True,
                 datasets=datasets, fit_details=result,
                 chi_square=chi_square, n_independent=n_idp,
                 chi2_reduced=chi2_reduced, redchi=chi2_reduced,
-                rfactor=rfactor, aic=aic, bic=bic, covar=result.covar)
+                rfactor=rfactor, aic=aic, bic=bic, covar=result.covar,
+                feff_cache=feff_cache)
 
     for attr in ('params', 'nvarys', 'nfree', 'ndata', 'var_names', 'nfev',
                  'success', 'errorbars', 'message', 'lmdif_message'):
         setattr(out, attr, getattr(result, attr, None))
     return out
 
-def feffit_conf_map(result, xpar, ypar, nsamples=41, nsigma=3.5):
+# fit result and options for confidence map and interval workers,
+# set before forking
+_CONF_STATE = {}
+
+def _conf_fitter(params):
+    "Minimizer for refitting the datasets in _CONF_STATE"
+    return Minimizer(_feffit_resid, params,
+                     fcn_kws=dict(datasets=_CONF_STATE['datasets']),
+                     scale_covar=False, **_CONF_STATE['fit_kws'])
+
+def _conf_map_column(xval, yvals, iy0):
+    """chi-square for refits with the x parameter fixed at xval and the y
+    parameter fixed at each of yvals, starting at index iy0 and working
+    outward, warm-starting each refit from the one next to it"""
+    state = _CONF_STATE
+    params = state['params']
+    best = state['best']
+    for name, val in best.items():
+        params[name].value = val
+    params[state['xpar']].value = xval
+    chi2 = np.zeros(len(yvals))
+    order = list(range(iy0, len(yvals))) + list(range(iy0-1, -1, -1))
+    start = None
+    for iy in order:
+        if iy == iy0 - 1 and start is not None:
+            for name, val in start.items():
+                params[name].value = val
+        params[state['ypar']].value = yvals[iy]
+        out = _conf_fitter(params).leastsq()
+        chi2[iy] = out.chisqr
+        fitvals = {name: out.params[name].value for name in best}
+        if iy == iy0:
+            start = fitvals
+        if not state['warm_start']:
+            fitvals = best
+        for name, val in fitvals.items():
+            params[name].value = val
+    return chi2
+
+def _conf_interval_param(name, sigmas, kws):
+    "lmfit confidence intervals for one parameter of a feffit result"
+    fit_details = _CONF_STATE['fit_details']
+    return conf_interval(_conf_fitter(fit_details.params), fit_details,
+                         p_names=[name], sigmas=sigmas, **kws)
+
+def _conf_pool(executor, max_workers, ntasks, caller, _larch=None):
+    """process pool for confidence workers, or None for serial evaluation.
+    The refits share and modify one set of Parameters and datasets, so
+    threads run serially."""
+    if executor is None or pool_kind(executor, caller, _larch=_larch) == 'threads':
+        return None
+    if max_workers is None:
+        max_workers = mp.cpu_count()
+    return fork_pool(max_workers=max(1, min(max_workers, ntasks)))
+
+def feffit_conf_map(result, xpar, ypar, nsamples=41, nsigma=3.5,
+                    executor=None, max_workers=None, warm_start=True,
+                    callback=None, outfile=None, _larch=None):
     """
     return 2d map of confidence interval (sigma values) for a pair of variables from feffit
 
+    Parameters:
+    ------------
+      result:      Feffit result, output group from feffit()
+      xpar:        name of variable for x axis of map
+      ypar:        name of variable for y axis of map
+      nsamples:    number of values for each variable [41]
+      nsigma:      extent of each variable, in units of its stderr [3.5]
+      executor:    None, 'threads' or 'processes' to refit columns of the
+                   map in a process pool [None]
+      max_workers: maximum number of worker processes [cpu count]
+      warm_start:  whether to start each refit from the best-fit values of
+                   its neighbor [True]
+      callback:    function called as each column of the map is finished,
+                   as callback(xvals, yvals, sigma_map, ndone, ntotal) [None]
+      outfile:     name of .npz file to write with xvals, yvals, chi2_map and
+                   sigma_map as each column is finished [None]
+
+    Returns:
+    ---------
+      xvals, yvals, sigma_map, where sigma_map has shape (nsamples, nsamples)
+      and sigma_map[iy, ix] is for xvals[ix], yvals[iy].
+
+    Notes:
+    ------
+      1. At each point of the map, all other variables are refit.  Each
+         column (fixed value of xpar) is refit in order, outward from the
+         best-fit value of ypar, so that each refit can be started from the
+         values found for its neighbor.
+      2. With executor='processes', columns are distributed to worker
+         processes, and finished columns are reported through callback and
+         outfile as they arrive, starting from the center of the map.
+         Parts of the map not yet calculated are NaN.  As all refits
+         modify the same Parameters, executor='threads' runs serially.
     """
-    def show_progress(i, imax):
-        if i > (imax-1):
-            print('done.')
-        elif i % round(imax//10) == 0:
-            print(f"{i}/{imax}", flush=True, end=', ')
-
-    fitter = Minimizer(_feffit_resid, result.params,
-                       fcn_kws=dict(datasets=result.datasets),
-                       scale_covar=False, **result.fit_kws)
-
-    xvals, yvals, chi2_map = conf_interval2d(fitter, result.fit_details, xpar, ypar,
-                                             nsamples, nsamples, nsigma=nsigma, chi2_out=True)
-
-    chi2_map = chi2_map * result.n_independent / result.fit_details.ndata
-    chisqr0 = min(result.chi_square, chi2_map.min())
-    sigma_map = np.sqrt((chi2_map-chisqr0)/result.chi2_reduced)
+    params = result.params
+    xvar, yvar = params[xpar], params[ypar]
+    xvals = np.linspace(xvar.value - nsigma*xvar.stderr,
+                        xvar.value + nsigma*xvar.stderr, nsamples)
+    yvals = np.linspace(yvar.value - nsigma*yvar.stderr,
+                        yvar.value + nsigma*yvar.stderr, nsamples)
+    ix0 = int(np.argmin(abs(xvals - xvar.value)))
+    iy0 = int(np.argmin(abs(yvals - yvar.value)))
+    columns = sorted(range(nsamples), key=lambda ix: abs(ix - ix0))
+
+    chi2_scale = result.n_independent / result.fit_details.ndata
+    chi2_map = np.nan*np.ones((nsamples, nsamples))
+    sigma_map = np.nan*np.ones((nsamples, nsamples))
+
+    def add_column(ix, chi2, ndone):
+        chi2_map[:, ix] = chi2 * chi2_scale
+        chisqr0 = min(result.chi_square, np.nanmin(chi2_map))
+        sigma_map[:, :] = np.sqrt((chi2_map-chisqr0)/result.chi2_reduced)
+        if outfile is not None:
+            tmpfile = f'{outfile}.tmp'
+            with open(tmpfile, 'wb') as fh:
+                np.savez(fh, xvals=xvals, yvals=yvals, chi2_map=chi2_map,
+                         sigma_map=sigma_map)
+            os.replace(tmpfile, outfile)
+        if callback is not None:
+            callback(xvals, yvals, sigma_map, ndone, nsamples)
+
+    save_vary = xvar.vary, yvar.vary
+    xbest, ybest = xvar.value, yvar.value
+    best = {name: par.value for name, par in params.items()
+            if par.vary and name not in (xpar, ypar)}
+    pool = None
+    try:
+        _CONF_STATE.update(params=params, datasets=result.datasets,
+                           fit_kws=result.fit_kws, xpar=xpar, ypar=ypar,
+                           best=best, warm_start=warm_start)
+        xvar.vary, yvar.vary = False, False
+        pool = _conf_pool(executor, max_workers, nsamples, 'feffit_conf_map',
+                          _larch=_larch)
+        if pool is None:
+            for ndone, ix in enumerate(columns):
+                add_column(ix, _conf_map_column(xvals[ix], yvals, iy0), ndone+1)
+        else:
+            futures = {pool.submit(_conf_map_column, xvals[ix], yvals, iy0): ix
+                       for ix in columns}
+            for ndone, fut in enumerate(as_completed(futures)):
+                add_column(futures[fut], fut.result(), ndone+1)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        _CONF_STATE.clear()
+        xvar.vary, yvar.vary = save_vary
+        xvar.value, yvar.value = xbest, ybest
+        for name, val in best.items():
+            params[name].value = val
+        params.update_constraints()
     return xvals, yvals, sigma_map
 
+def feffit_conf_interval(result, p_names=None, sigmas=(1, 2, 3),
+                         executor=None, max_workers=None, _larch=None, **kws):
+    """
+    return confidence intervals for variables from feffit, found by
+    refitting with each variable stepped away from its best-fit value
+
+    Parameters:
+    ------------
+      result:      Feffit result, output group from feffit()
+      p_names:     list of variable names [None, for all variables]
+      sigmas:      sigma levels to find [(1, 2, 3)]
+      executor:    None, 'threads' or 'processes' to find the intervals
+                   for each variable in a process pool [None]
+      max_workers: maximum number of worker processes [cpu count]
+      kws:         other arguments for lmfit.conf_interval
 
+    Returns:
+    ---------
+      dict of confidence intervals, as from lmfit.conf_interval, which
+      can be printed with lmfit.printfuncs.ci_report.
+
+    Notes:
+    ------
+      With executor='processes', each variable is handled by a separate
+      worker process.  With executor='threads', the variables are handled
+      serially, as for feffit_conf_map().
+    """
+    fit_details = result.fit_details
+    if p_names is None:
+        p_names = list(fit_details.var_names)
+    out = {}
+    pool = None
+    try:
+        _CONF_STATE.update(params=result.params, datasets=result.datasets,
+                           fit_kws=result.fit_kws, fit_details=fit_details)
+        pool = _conf_pool(executor, max_workers, len(p_names),
+                          'feffit_conf_interval', _larch=_larch)
+        if pool is None:
+            for name in p_names:
+                out.update(_conf_interval_param(name, sigmas, kws))
+        else:
+            futures = [pool.submit(_conf_interval_param, name, sigmas, kws)
+                       for name in p_names]
+            for fut in futures:
+                out.update(fut.result())
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        _CONF_STATE.clear()
+    return out
 
 def feffit_report(result, min_correl=0.1, with_paths=True, _larch=None):
     """return a printable report of fit for feffit
@@ -2,7 +2,12 @@ import sys
 import os
 
 import glob
-from shutil import copy, move
+import json
+import hashlib
+import tempfile
+from shutil import copy, move, rmtree
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing as mp
 import subprocess
 import time
 import re
@@ -15,6 +20,7 @@ from pyshortcuts import bytes2str, uname, get_cwd
 from larch import Group
 from larch.larchlib import isNamedClass
 from larch.utils import isotime, bindir
+from larch.site_config import user_larchdir
 
 def find_exe(exename):
     if isinstance(exename, Path):
@@ -25,6 +31,116 @@ def find_exe(exename):
     if exefile.exists() and os.access(exefile, os.X_OK):
         return exefile
 
+def normalize_feffinp(text):
+    """normalize text of a feff.inp file for comparison: comment lines
+    (starting with '*') and blank lines are removed, and whitespace
+    within lines is collapsed to single spaces"""
+    lines = []
+    for line in text.replace('\r', '').split('\n'):
+        line = ' '.join(line.split())
+        if len(line) > 0 and not line.startswith('*'):
+            lines.append(line)
+    return '\n'.join(lines)
+
+def exe_signature(exe):
+    """identify a Feff executable for the Feff run cache: the resolved
+    path, size, and modification time of the executable file, as found
+    by FeffRunner, or just its name if it cannot be found"""
+    exefile = find_exe(exe)
+    if exefile is None and Path(exe).is_file():
+        exefile = Path(exe)
+    if exefile is None:
+        return [Path(exe).name]
+    exefile = Path(exefile).resolve()
+    stat = exefile.stat()
+    return [exefile.as_posix(), stat.st_size, stat.st_mtime_ns]
+
+class FeffRunCache:
+    """
+    content-addressed store of the output files of complete Feff runs,
+    keyed by a hash of the normalized feff.inp text, the modules run, and
+    the executables used (see exe_signature()), so that entries are not
+    reused after a Feff executable is changed or updated.
+
+        cache = FeffRunCache()
+        key = cache.key(open('feff.inp').read(), exe='feff8l')
+        if cache.fetch(key, 'MyFolder') is None:
+            ...  run feff and then
+            cache.store(key, 'MyFolder', output_files)
+
+    Each entry is a folder named by the key, holding the output files
+    (such as phase.pad, files.dat, and feffNNNN.dat) and a manifest.json
+    file.  The default location is the 'feff_cache' folder in the
+    user larch folder.
+    """
+    def __init__(self, folder=None):
+        if folder is None:
+            folder = Path(user_larchdir, 'feff_cache')
+        self.folder = Path(folder).absolute()
+
+    def key(self, feffinp_text, exe='feff8l', modules=None):
+        "hash key for a feff.inp text, executable and list of modules"
+        exe = 'feff8l' if exe is None else str(exe)
+        if modules is None and exe == 'feff8l':
+            modules = FeffRunner.Feff8l_modules
+        modules = [] if modules is None else list(modules)
+        if exe == 'feff8l':
+            exes = [exe_signature(f'feff8l_{mod}') for mod in modules]
+        else:
+            exes = [exe_signature(exe)]
+        text = json.dumps([Path(exe).name, modules, exes,
+                           normalize_feffinp(feffinp_text)])
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def entry(self, key):
+        "folder for a cache entry"
+        return Path(self.folder, key[:2], key)
+
+    def fetch(self, key, dest):
+        """copy the files for key into folder dest, returning the list of
+        file names, or None if key is not in the cache"""
+        entry = self.entry(key)
+        manifest = Path(entry, 'manifest.json')
+        if not manifest.is_file():
+            return None
+        with open(manifest, 'r') as fh:
+            files = json.load(fh)['files']
+        dest = Path(dest)
+        dest.mkdir(parents=True, exist_ok=True)
+        for fname in files:
+            copy(Path(entry, fname), Path(dest, fname))
+        return files
+
+    def store(self, key, srcdir, files):
+        """store files (names relative to folder srcdir) for key"""
+        entry = self.entry(key)
+        if Path(entry, 'manifest.json').is_file():
+            return
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmpdir = Path(tempfile.mkdtemp(prefix=f'{key}_', dir=entry.parent))
+        files = sorted(files)
+        for fname in files:
+            copy(Path(srcdir, fname), Path(tmpdir, fname))
+        with open(Path(tmpdir, 'manifest.json'), 'w') as fh:
+            json.dump({'files': files, 'time': isotime()}, fh)
+        try:
+            os.replace(tmpdir, entry)
+        except OSError:   # stored concurrently by another run
+            rmtree(tmpdir, ignore_errors=True)
+
+    def clear(self):
+        "remove all cache entries"
+        rmtree(self.folder, ignore_errors=True)
+
+def _folder_state(folder):
+    "dict of (mtime, size) for the files in a folder"
+    out = {}
+    for fpath in Path(folder).iterdir():
+        if fpath.is_file():
+            stat = fpath.stat()
+            out[fpath.name] = (stat.st_mtime_ns, stat.st_size)
+    return out
+
 class FeffRunner(Group):
     """
     A Larch plugin for managing calls to the feff85exafs stand-alone executables.
@@ -73,7 +189,7 @@ class FeffRunner(Group):
     Feff8l_modules = ('rdinp', 'pot', 'xsph', 'pathfinder', 'genfmt', 'ff2x')
 
     def __init__(self, feffinp='feff.inp', folder='.', verbose=True, _larch=None,
-                 message_writer=None, **kws):
+                 message_writer=None, use_cache=False, cache_folder=None, **kws):
         kwargs = dict(name='Feff runner')
         kwargs.update(kws)
         Group.__init__(self,  **kwargs)
@@ -89,16 +205,28 @@ class FeffRunner(Group):
         self.resolved = None
         self.threshold = []
         self.chargetransfer = []
+        self.use_cache = use_cache
+        self.cache = FeffRunCache(cache_folder)
+        self.cache_key = None
+        self.from_cache = False
 
     def __repr__(self):
         ffile = Path(self.folder, self.feffinp)
         return f'<External Feff Group: {ffile}>'
 
-    def run(self, feffinp=None, folder=None, exe='feff8l'):
+    def run(self, feffinp=None, folder=None, exe='feff8l', use_cache=None):
         """
         Make system call to run one or more of the stand-alone executables,
         writing a log file to the folder containing the input file.
 
+        With use_cache (default: the use_cache attribute), the output files
+        of a complete run (of all feff8l modules, or of another executable
+        such as feff6l) are stored in the Feff run cache, and are copied
+        from there when the same feff.inp is run again.  The from_cache
+        attribute is set to whether the outputs came from the cache.
+
+        Feff is run in the folder of the feff.inp file: the current working
+        directory of the process is not changed.
         """
         if folder is not None:
             self.folder = folder
@@ -108,25 +236,44 @@ class FeffRunner(Group):
 
         if self.feffinp is None:
             raise Exception("no feff.inp file was specified")
+        if use_cache is None:
+            use_cache = self.use_cache
 
         savefile = '.save_.inp'
-        here = Path.cwd().absolute()
-        os.chdir(Path(self.folder).absolute())
-
+        workdir = Path(self.folder).absolute()
         pfeff = Path(self.feffinp)
         feffinp_dir, feffinp_file = pfeff.parent, pfeff.name
-        if feffinp_dir.exists():
-            os.chdir(feffinp_dir)
+        if Path(workdir, feffinp_dir).exists():
+            workdir = Path(workdir, feffinp_dir).absolute()
 
-        if not Path(feffinp_file).is_file():
+        if not Path(workdir, feffinp_file).is_file():
             raise Exception(f"feff.inp file '{feffinp_file}' could not be found")
 
+        self.from_cache = False
+        cache_ok = use_cache and exe not in self.Feff8l_modules
+        if cache_ok:
+            with open(Path(workdir, feffinp_file), 'r') as fh:
+                self.cache_key = self.cache.key(fh.read(), exe=exe)
+            if self.cache.fetch(self.cache_key, workdir) is not None:
+                self.from_cache = True
+                return
+            state0 = _folder_state(workdir)
+
         if exe in (None, 'feff8l'):
             for module in self.Feff8l_modules:
-                os.chdir(here)
-                self.run(exe=module)
-            return
+                self.run(exe=module, use_cache=False)
+        else:
+            self._run_exe(exe, workdir, feffinp_file, savefile)
 
+        if cache_ok:
+            state1 = _folder_state(workdir)
+            skip = (feffinp_file, 'feff.inp', savefile)
+            files = [fname for fname, val in state1.items()
+                     if state0.get(fname, None) != val and fname not in skip]
+            self.cache.store(self.cache_key, workdir, files)
+
+    def _run_exe(self, exe, workdir, feffinp_file, savefile):
+        "run one executable in workdir"
         #
         # exe is set, find the corresponding executable file
         ## find program to run:
@@ -138,7 +285,7 @@ class FeffRunner(Group):
         if resolved_exe is not None:
             program = resolved_exe
 
-        else:
+        elif self._larch is not None:
             getsym = self._larch.symtable.get_symbol
             try:
                 program = getsym('_xafs._feff8_executable')
@@ -148,27 +295,30 @@ class FeffRunner(Group):
                 except (NameError, AttributeError) as exc:
                     program = None
 
+        if program is None and exe is not None and Path(exe).is_file():
+            program = Path(exe).absolute()
+
         if program is not None:
             if not os.access(program, os.X_OK):
                 program = None
 
         if program is None:  # Give up!
-            os.chdir(here)
             raise Exception(f"'{exe}' executable cannot be found")
+        self.resolved = program
 
         ## preserve an existing feff.inp file if this is not called feff.inp
         if feffinp_file != 'feff.inp':
-            if Path('feff.inp').is_file():
-                copy('feff.inp', savefile)
-            copy(feffinp_file, 'feff.inp')
+            if Path(workdir, 'feff.inp').is_file():
+                copy(Path(workdir, 'feff.inp'), Path(workdir, savefile))
+            copy(Path(workdir, feffinp_file), Path(workdir, 'feff.inp'))
 
         logname = Path(program).name
         if logname.endswith('.exe'):
             logname = logname[:4]
 
-        log = f'feffrun_{logname}.log'
+        log = Path(workdir, f'feffrun_{logname}.log')
 
-        if Path(log).is_file():
+        if log.is_file():
             os.unlink(log)
 
         f = open(log, 'a')
@@ -185,7 +335,7 @@ class FeffRunner(Group):
         if self.verbose:
             write(header)
         f.write(header)
-        process=subprocess.Popen(program, shell=False,
+        process=subprocess.Popen(program, shell=False, cwd=workdir,
                                  stdout=subprocess.PIPE,
                                  stderr=subprocess.STDOUT)
         flag = False
@@ -221,11 +371,11 @@ class FeffRunner(Group):
                 this = line.split()
                 thislist.append(this[1])
             f.write(line)
-        f.close
+        f.close()
+        process.wait()
 
-        if Path(savefile).is_file():
-            move(savefile, 'feff.inp')
-        os.chdir(here)
+        if Path(workdir, savefile).is_file():
+            move(Path(workdir, savefile), Path(workdir, 'feff.inp'))
         return None
 
 ######################################################################
@@ -245,6 +395,7 @@ def feff6l(feffinp='feff.inp', folder='.', verbose=True, _larch=None, **kws):
       feffinp (str): name of feff.inp file to use ['feff.inp']
       folder (str): folder for calculation, containing 'feff.inp' file ['.']
       verbose (bool): whether to print out extra messages [False]
+      use_cache (bool): whether to use the Feff run cache [False]
 
     Returns:
     --------
@@ -311,6 +462,7 @@ def feff8l(feffinp='feff.inp', folder='.', module=None, verbose=True, _larch=Non
       folder (str): folder for calculation, containing 'feff.inp' file ['.']
       module (None or str): module of Feff8l to run [None -- run all]
       verbose (bool): whether to print out extra messages [False]
+      use_cache (bool): whether to use the Feff run cache [False]
 
     Returns:
     --------
@@ -326,6 +478,114 @@ def feff8l(feffinp='feff.inp', folder='.', module=None, verbose=True, _larch=Non
     return feffrunner
 
 
+def _feff_batch_job(feffinp, folder, exe, use_cache, cache_folder, verbose):
+    """run one job for feff_batch in a temporary folder, copying outputs to
+    folder, and return a Group describing the job"""
+    out = Group(folder=Path(folder).absolute().as_posix(), exe=str(exe),
+                cache_key=None, from_cache=False, files=[], error=None)
+    try:
+        cache = FeffRunCache(cache_folder)
+        out.cache_key = cache.key(feffinp, exe=exe)
+        if use_cache:
+            files = cache.fetch(out.cache_key, folder)
+            if files is not None:
+                out.files, out.from_cache = files, True
+                return out
+        with tempfile.TemporaryDirectory(prefix='feffrun_') as workdir:
+            with open(Path(workdir, 'feff.inp'), 'w') as fh:
+                fh.write(feffinp)
+            runner = FeffRunner(folder=workdir, feffinp='feff.inp',
+                                verbose=verbose, use_cache=False)
+            runner.run(exe=exe)
+            out.threshold = runner.threshold
+            out.files = sorted(fname for fname in _folder_state(workdir)
+                               if fname != 'feff.inp')
+            Path(folder).mkdir(parents=True, exist_ok=True)
+            for fname in out.files:
+                copy(Path(workdir, fname), Path(folder, fname))
+            if use_cache:
+                cache.store(out.cache_key, workdir, out.files)
+    except Exception as exc:
+        out.error = f'{exc.__class__.__name__}: {exc}'
+    return out
+
+def feff_batch(feffinps, folders=None, exe='feff8l', use_cache=True,
+               cache_folder=None, executor='threads', max_workers=None,
+               verbose=False):
+    """
+    run Feff for many feff.inp files, such as those from structure2feff
+    for each site of a structure, in parallel
+
+    Arguments:
+    ----------
+      feffinps (list): feff.inp files (or folders containing a feff.inp
+                       file), or text of feff.inp files
+      folders (list or None): output folder for each job [None, meaning the
+                       folder of each feff.inp file]
+      exe (str):       executable to run ['feff8l' -- all feff8l modules]
+      use_cache (bool): whether to use the Feff run cache [True]
+      cache_folder (str or None): folder for run cache [None, for default]
+      executor (str):  'threads' or 'processes' for the worker pool ['threads']
+      max_workers (int or None): maximum number of concurrent jobs [cpu count]
+      verbose (bool):  whether to print Feff output [False]
+
+    Returns:
+    --------
+      list of Groups, one per job in order, with attributes
+         folder, exe, files (list of output files), cache_key,
+         from_cache (bool), and error (None, or a message if the job failed)
+
+    Notes:
+    ------
+      1. Each job runs in its own temporary folder, and only the output
+         files are copied to the output folder.  The working directory of
+         the process is never changed, so jobs do not interfere.
+      2. Feff itself runs in subprocesses, so 'threads' gives parallel
+         runs with the least overhead.
+      3. Jobs with the same normalized feff.inp text are taken from the
+         run cache (see FeffRunCache) after the first has run.
+    """
+    if isinstance(feffinps, (str, Path)):
+        feffinps = [feffinps]
+    if folders is None:
+        folders = [None]*len(feffinps)
+    if len(folders) != len(feffinps):
+        raise ValueError("feff_batch needs one folder for each feff.inp")
+
+    jobs = []
+    for inp, folder in zip(feffinps, folders):
+        text = None
+        if isinstance(inp, Path) or '\n' not in inp:
+            pinp = Path(inp).absolute()
+            if pinp.is_dir():
+                pinp = Path(pinp, 'feff.inp')
+            if not pinp.is_file():
+                raise ValueError(f"feff.inp file '{inp}' could not be found")
+            with open(pinp, 'r') as fh:
+                text = fh.read()
+            if folder is None:
+                folder = pinp.parent
+        else:
+            text = inp
+        if folder is None:
+            raise ValueError("feff_batch needs folders for feff.inp text")
+        jobs.append((text, Path(folder).absolute().as_posix(), exe,
+                     use_cache, cache_folder, verbose))
+
+    if max_workers is None:
+        max_workers = mp.cpu_count()
+    nworkers = max(1, min(max_workers, len(jobs)))
+    if executor.lower().startswith('proc'):
+        pool = ProcessPoolExecutor(max_workers=nworkers)
+    elif executor.lower().startswith('thread'):
+        pool = ThreadPoolExecutor(max_workers=nworkers)
+    else:
+        raise ValueError("executor must be 'threads' or 'processes'")
+    with pool:
+        futures = [pool.submit(_feff_batch_job, *job) for job in jobs]
+        return [fut.result() for fut in futures]
+
+
 def feff8l_cli():
     """run feff8l as  a command line program to run all or some of
      feff8l_rdinp
@@ -2,6 +2,7 @@
 """
   XAFS MBACK normalization algorithms.
 """
+from functools import lru_cache
 import numpy as np
 from scipy.special import erfc
 
@@ -13,6 +14,7 @@ from lmfit import Parameter, Parameters, minimize
 from larch import Group, isgroup
 from larch.larchlib import Make_CallArgs, parse_group_args
 from larch.math import index_of, index_nearest, remove_dups, remove_nans2
+from larch.utils.pools import run_chunks
 
 from .xafsutils import set_xafsGroup, TINY_ENERGY
 from .pre_edge import find_e0, preedge, pre_edge
@@ -32,6 +34,34 @@ def find_xray_line(z, edge):
                 line      = key
     return xray_line(z, line[:-1])
 
+def chantler_f1f2(z, energy):
+    """
+    tabulated f1(E) and f2(E) from the Chantler tables for an element
+    on an energy array.
+
+    Values are cached for repeated (z, energy) pairs, as for many spectra
+    on the same energy array.  Use mback_cache_clear() to clear this cache.
+    """
+    energy = np.asarray(energy, dtype='float64')
+    f1, f2 = _chantler_f1f2(z, energy.tobytes())
+    return f1.copy(), f2.copy()
+
+def mback_cache_clear():
+    "clear cache of tabulated f1, f2 and emission line energies"
+    _chantler_f1f2.cache_clear()
+    _xray_line_energy.cache_clear()
+
+@lru_cache(maxsize=64)
+def _chantler_f1f2(z, ebytes):
+    "cached f1, f2 from Chantler tables, with energy given as bytes"
+    energy = np.frombuffer(ebytes, dtype='float64')
+    return f1_chantler(z, energy), f2_chantler(z, energy)
+
+@lru_cache(maxsize=256)
+def _xray_line_energy(z, edge):
+    "cached energy of most intense emission line for an element and edge"
+    return find_xray_line(z, edge).energy
+
 def match_f2(p, en=0, mu=1, f2=1, e0=0, em=0, weight=1, theta=1, order=None,
              leexiang=False):
     """
@@ -113,6 +143,83 @@ def mback(energy, mu=None, group=None, z=None, edge='K', e0=None, pre1=None, pre
     if _larch is not None:
         group = set_xafsGroup(group, _larch=_larch)
 
+    setup = _mback_setup(energy, mu, group, z=z, edge=edge, e0=e0,
+                         pre1=pre1, pre2=pre2, norm1=norm1, norm2=norm2,
+                         order=order)
+    opars = _mback_fit(mu, setup, leexiang=leexiang, fit_erfc=fit_erfc)
+    for attr, val in _mback_outputs(mu, setup, opars,
+                                    return_f1=return_f1).items():
+        setattr(group, attr, val)
+
+def mback_batch(groups, z=None, edge='K', e0=None, pre1=None, pre2=-50,
+                norm1=100, norm2=None, order=3, leexiang=False,
+                fit_erfc=False, return_f1=False, warm_start=True,
+                executor=None, max_workers=None, _larch=None):
+    """
+    Match mu(E) data for tabulated f''(E) using the MBACK algorithm for a
+    series of spectra of the same element and edge, as from XANES mapping
+    or time-resolved experiments.
+
+    Arguments
+    ----------
+      groups:      list of groups, each with `energy` and `mu` arrays
+      warm_start:  whether to start each fit from the result for the
+                   previous spectrum [True]
+      executor:    None, 'threads', or 'processes' to process chunks of
+                   spectra concurrently [None]
+      max_workers: maximum number of workers for executor [cpu count]
+
+    All other parameters are as for mback(), and apply to all spectra.
+    If e0 is not given, it is found for each spectrum as for mback().
+
+    Output arrays are written to each group, as for mback().
+
+    Notes:
+      1. Tabulated f1 and f2 and the emission line energy are found once
+         for each (z, edge, energy array) and cached.
+      2. With executor, the spectra are split into one contiguous chunk per
+         worker, and warm starts are used within each chunk.
+    """
+    groups = list(groups)
+    opts = dict(z=z, edge=edge, e0=e0, pre1=pre1, pre2=pre2, norm1=norm1,
+                norm2=norm2, order=max(min(order, MAXORDER), 0),
+                leexiang=leexiang, fit_erfc=fit_erfc, return_f1=return_f1,
+                warm_start=warm_start)
+
+    def run_chunk(start, stop):
+        return _mback_batch_run(groups[start:stop], **opts)
+    results = run_chunks(run_chunk, len(groups), executor=executor,
+                         max_workers=max_workers, caller='mback_batch',
+                         _larch=_larch)
+
+    for group, result in zip(groups, results):
+        for attr, val in result.items():
+            setattr(group, attr, val)
+        if _larch is not None:
+            set_xafsGroup(group, _larch=_larch)
+
+def _mback_batch_run(groups, z=None, edge='K', e0=None, pre1=None, pre2=-50,
+                     norm1=100, norm2=None, order=3, leexiang=False,
+                     fit_erfc=False, return_f1=False, warm_start=True):
+    """run mback fits for a list of groups, returning list of output dicts"""
+    results = []
+    start = None
+    for group in groups:
+        energy = np.asarray(group.energy).squeeze()
+        mu = np.asarray(group.mu).squeeze()
+        setup = _mback_setup(energy, mu, Group(), z=z, edge=edge, e0=e0,
+                             pre1=pre1, pre2=pre2, norm1=norm1, norm2=norm2,
+                             order=order)
+        opars = _mback_fit(mu, setup, leexiang=leexiang, fit_erfc=fit_erfc,
+                           start=start)
+        if warm_start:
+            start = opars
+        results.append(_mback_outputs(mu, setup, opars, return_f1=return_f1))
+    return results
+
+def _mback_setup(energy, mu, group, z=None, edge='K', e0=None, pre1=None,
+                 pre2=-50, norm1=100, norm2=None, order=3):
+    """energy ranges, weights, and tabulated f1, f2 for mback fit"""
     energy = remove_dups(energy, tiny=TINY_ENERGY)
     if energy.size <= 1:
         raise ValueError("energy array must have at least 2 points")
@@ -122,9 +229,6 @@ def mback(energy, mu=None, group=None, z=None, edge='K', e0=None, pre1=None, pre
     ie0 = index_nearest(energy, e0)
     e0 = energy[ie0]
 
-    pre1_input = pre1
-    norm2_input = norm2
-
     if pre1 is None:  pre1  = min(energy) - e0
     if norm2 is None: norm2 = max(energy) - e0
     if norm2 < 0:     norm2 = max(energy) - e0 - norm2
@@ -158,14 +262,16 @@ def mback(energy, mu=None, group=None, z=None, edge='K', e0=None, pre1=None, pre
     weight[n1:(n2+1)] = np.sqrt(np.sum(weight[n1:(n2+1)]))
 
     ## get the f'' function from CL or Chantler
-    f1 = f1_chantler(z, energy)
-    f2 = f2_chantler(z, energy)
-    group.f2 = f2
-    if return_f1:
-        group.f1 = f1
-
-    em = find_xray_line(z, edge).energy # erfc centroid
-
+    f1, f2 = chantler_f1f2(z, energy)
+    em = _xray_line_energy(z, edge) # erfc centroid
+    return dict(energy=energy, e0=e0, em=em, f1=f1, f2=f2, theta=theta,
+                weight=weight, pre1=pre1, pre2=pre2, norm1=norm1,
+                norm2=norm2, order=order)
+
+def _mback_fit(mu, setup, leexiang=False, fit_erfc=False, start=None):
+    """fit mu to tabulated f2 for mback, optionally starting from the
+    parameter values of a previous fit, returning best-fit values"""
+    order = setup['order']
     params = Parameters()
     params.add(name='s',  value=1.0,  vary=True)  # scale of data
     params.add(name='xi', value=50.0, vary=False, min=0) # width of erfc
@@ -178,31 +284,45 @@ def mback(energy, mu=None, group=None, z=None, edge='K', e0=None, pre1=None, pre
     for i in range(order+1): # polynomial coefficients
         params.add(name='c%d' % i, value=0, vary=True)
 
+    if start is not None:
+        for name, val in start.items():
+            if name in params and params[name].vary:
+                params[name].value = val
+
     out = minimize(match_f2, params, method='leastsq',
                    gtol=1.e-5, ftol=1.e-5, xtol=1.e-5, epsfcn=1.e-5,
-                   kws = dict(en=energy, mu=mu, f2=f2, e0=e0, em=em,
-                              order=order, weight=weight, theta=theta, leexiang=leexiang))
-
-    opars = out.params.valuesdict()
+                   kws = dict(en=setup['energy'], mu=mu, f2=setup['f2'],
+                              e0=setup['e0'], em=setup['em'], order=order,
+                              weight=setup['weight'], theta=setup['theta'],
+                              leexiang=leexiang))
+    return out.params.valuesdict()
+
+def _mback_outputs(mu, setup, opars, return_f1=False):
+    """dict of output arrays for mback, from best-fit values"""
+    energy, e0, em = setup['energy'], setup['e0'], setup['em']
+    f2 = setup['f2']
     eoff = energy - e0
 
     norm_function = opars['a']*erfc((energy-em)/opars['xi']) + opars['c0']
-    for i in range(order):
+    for i in range(setup['order']):
         attr = 'c%d' % (i + 1)
         if attr in opars:
             norm_function  += opars[attr]* eoff**(i + 1)
 
-    group.e0 = e0
-    group.fpp = opars['s']*mu - norm_function
+    out = dict(f2=f2, e0=e0)
+    if return_f1:
+        out['f1'] = setup['f1']
+    out['fpp'] = opars['s']*mu - norm_function
     # calculate edge step and normalization from f2 + norm_function
-    pre_f2 = preedge(energy, group.f2+norm_function, e0=e0, pre1=pre1,
-                 pre2=pre2, norm1=norm1, norm2=norm2, nnorm=2, nvict=0)
-    group.edge_step = pre_f2['edge_step'] / opars['s']
-    group.norm = (opars['s']*mu -  pre_f2['pre_edge']) / pre_f2['edge_step']
-    group.mback_details = Group(params=opars, pre_f2=pre_f2,
-                                f2_scaled=opars['s']*f2,
-                                norm_function=norm_function)
-
+    pre_f2 = preedge(energy, f2+norm_function, e0=e0, pre1=setup['pre1'],
+                     pre2=setup['pre2'], norm1=setup['norm1'],
+                     norm2=setup['norm2'], nnorm=2, nvict=0)
+    out['edge_step'] = pre_f2['edge_step'] / opars['s']
+    out['norm'] = (opars['s']*mu -  pre_f2['pre_edge']) / pre_f2['edge_step']
+    out['mback_details'] = Group(params=opars, pre_f2=pre_f2,
+                                 f2_scaled=opars['s']*f2,
+                                 norm_function=norm_function)
+    return out
 
 
 def f2norm(params, en=1, mu=1, f2=1, weights=1):
@@ -292,7 +412,7 @@ def mback_norm(energy, mu=None, group=None, z=None, edge='K', e0=None,
         nnorm = group.pre_edge_details.nnorm
 
     mu_pre = mu - group.pre_edge
-    f2 = f2_chantler(z, energy)
+    f1, f2 = chantler_f1f2(z, energy)
 
     weights = np.ones(len(energy))*1.0
 
@@ -2,7 +2,9 @@
 """
   XAFS pre-edge subtraction, normalization algorithms
 """
+from math import comb
 import numpy as np
+from scipy.fft import rfft, irfft, next_fast_len
 
 from lmfit import Parameters, Minimizer, report_fit
 from xraydb import guess_edge
@@ -10,6 +12,7 @@ from larch import Group
 from larch.larchlib import Make_CallArgs, parse_group_args
 from larch.math import (index_of, index_nearest, interp, smooth,
                         polyfit, remove_dups, remove_nans, remove_nans2)
+from larch.utils.pools import run_chunks
 from .xafsutils import set_xafsGroup, TINY_ENERGY
 
 MODNAME = '_xafs'
@@ -153,6 +156,209 @@ def _finde0(energy, mu_input, estep=None, use_smooth=True):
 def flat_resid(pars, en, mu):
     return pars['c0'] + en * (pars['c1'] + en * pars['c2']) - mu
 
+def _index_of_sorted(energy, values):
+    "vectorized index_of() for increasing energy"
+    return np.maximum(np.searchsorted(energy, values, side='right') - 1, 0)
+
+def _index_nearest_sorted(energy, values):
+    "vectorized index_nearest() for increasing energy"
+    i = np.clip(np.searchsorted(energy, values), 1, len(energy)-1)
+    below = abs(values - energy[i-1]) <= abs(energy[i] - values)
+    return np.where(below, i-1, i)
+
+def _find_e0_stack(energy, mu):
+    """estimate E0 for each row of mu as the maximum of the smoothed
+    derivative, ignoring the first 5% of energy points"""
+    npts = len(energy)
+    nmin = max(3, int(npts*0.02))
+    dmu = np.gradient(mu, axis=1)/np.gradient(energy)
+    dmu[~np.isfinite(dmu)] = -1.0
+    dmu[:, 1:-1] = (dmu[:, :-2] + 2*dmu[:, 1:-1] + dmu[:, 2:])/4.0
+    dmu[:, :max(nmin, int(0.05*npts))] = -np.inf
+    dmu[:, npts-nmin:] = -np.inf
+    return energy[np.argmax(dmu, axis=1)]
+
+def _polyfit_stack(energy, y, i1, i2, degree, ndeg=None, maxsize=2**24):
+    """fit polynomials to each row of y over energy[i1:i2], where i1, i2
+    and degree are arrays with one value per row.  This is solved as one
+    batch of normal equations, in scaled energy for each row's range,
+    working on blocks of rows to limit memory use to about maxsize values.
+
+    returns coefficients (nrows, max(degree)+1) in powers of energy"""
+    nrows, npts = y.shape
+    if ndeg is None:
+        ndeg = int(degree.max()) + 1
+    nblock = max(1, maxsize//(npts*(2*ndeg-1)))
+    if nrows > nblock:
+        return np.concatenate([_polyfit_stack(energy, y[i:i+nblock],
+                                              i1[i:i+nblock], i2[i:i+nblock],
+                                              degree[i:i+nblock], ndeg=ndeg)
+                               for i in range(0, nrows, nblock)])
+    cen = (energy[i1] + energy[i2-1])/2.0
+    wid = np.maximum((energy[i2-1] - energy[i1])/2.0, TINY_ENERGY)
+    index = np.arange(npts)
+    mask = (index >= i1[:, None]) & (index < i2[:, None])
+    xs = np.where(mask, (energy - cen[:, None])/wid[:, None], 0.0)
+
+    xpow = np.ones((2*ndeg-1, nrows, npts))
+    for n in range(1, 2*ndeg-1):
+        xpow[n] = xpow[n-1]*xs
+    xpow *= mask
+    moments = xpow.sum(axis=2).T
+    amat = moments[:, np.add.outer(np.arange(ndeg), np.arange(ndeg))]
+    bvec = (xpow[:ndeg]*y).sum(axis=2).T
+
+    # fix coefficients above each row's polynomial degree at 0
+    unused = np.arange(ndeg) > degree[:, None]
+    amat[unused] = 0.0
+    amat.transpose(0, 2, 1)[unused] = 0.0
+    amat[:, np.arange(ndeg), np.arange(ndeg)] += unused
+    bvec[unused] = 0.0
+    acoefs = np.linalg.solve(amat, bvec[..., None])[..., 0]
+
+    # convert from powers of (energy-cen)/wid to powers of energy
+    coefs = np.zeros((nrows, ndeg))
+    for i in range(ndeg):
+        scaled = acoefs[:, i]/wid**i
+        for j in range(i+1):
+            coefs[:, j] += scaled*comb(i, j)*(-cen)**(i-j)
+    return coefs
+
+def _polyval_stack(energy, coefs):
+    "evaluate polynomials (nrows, ncoefs) in powers of energy"
+    out = np.zeros((len(coefs), len(energy)))
+    for c in coefs.T[::-1]:
+        out = out*energy + c[:, None]
+    return out
+
+def preedge_stack(energy, mu, e0=None, step=None, nnorm=None, nvict=0,
+                  npre=1, pre1=None, pre2=None, norm1=None, norm2=None):
+    """pre edge subtraction, normalization for a stack of XAFS spectra
+    sharing an energy array, as from XAS mapping or time series.
+
+    Arguments
+    ----------
+    energy:  1-d array of x-ray energies, in eV
+    mu:      2-d array of mu(E) (nspectra, len(energy))
+    e0:      edge energy, in eV, either one value or one per spectrum.
+             If None, it will be determined here.
+    step:    edge jump, one value or one per spectrum.
+             If None, it will be determined here.
+
+    All other arguments are as for preedge(), and are applied to all spectra.
+
+    Returns
+    -------
+      dictionary with elements as for preedge(), but with arrays of
+      values for each spectrum:
+          e0          (nspectra) energy origin in eV
+          edge_step   (nspectra) edge step
+          norm        (nspectra, npts) normalized mu(E)
+          pre_edge    (nspectra, npts) determined pre-edge curve
+          post_edge   (nspectra, npts) determined post-edge, normalization curve
+
+    Notes
+    -----
+      1. The pre-edge lines and post-edge polynomials for all spectra are
+         found together, as one batch of linear least-squares problems.
+         Ranges and polynomial degrees for each spectrum are chosen as in
+         preedge().
+      2. If not given, e0 is taken as the maximum of a lightly smoothed
+         derivative of mu(E) for each spectrum.  This is usually very close
+         to, but is not identical to, the value from find_e0().
+      3. mu should not contain NaNs.
+    """
+    energy = np.asarray(energy, dtype='float64').squeeze()
+    mu = np.atleast_2d(np.asarray(mu, dtype='float64'))
+    if mu.shape[1] != len(energy):
+        raise ValueError("mu must have shape (nspectra, len(energy))")
+    if energy.size <= 1:
+        raise ValueError("energy array must have at least 2 points")
+    order = np.argsort(energy)
+    if np.any(np.diff(order) != 1):
+        energy = energy[order]
+        mu = mu[:, order]
+    energy = remove_dups(energy, tiny=TINY_ENERGY)
+    nspec, npts = mu.shape
+    rows = np.arange(nspec)
+
+    # e0, with guesses for missing or out-of-range values
+    e0_guess = None
+    if e0 is not None:
+        e0 = np.ones(nspec)*np.asarray(e0, dtype='float64')
+        bad = ~np.isfinite(e0) | (e0 < energy[1]) | (e0 > energy[-2])
+        if bad.any():
+            e0[bad] = _find_e0_stack(energy, mu[bad])
+    else:
+        e0 = _find_e0_stack(energy, mu)
+    ie0 = _index_nearest_sorted(energy, e0)
+
+    # pre-edge range
+    if pre1 is None:
+        pre1 = np.where(ie0 > 20, 5.0*np.round((energy[1] - e0)/5.0),
+                        2.0*np.round((energy[1] - e0)/2.0))
+    pre1 = np.maximum(pre1, energy.min() - e0)
+    if pre2 is None:
+        pre2 = 0.5*pre1
+    pre1, pre2 = np.minimum(pre1, pre2), np.maximum(pre1, pre2)
+
+    ipre1 = _index_of_sorted(energy, pre1+e0)
+    ipre2 = _index_of_sorted(energy, pre2+e0)
+    few = (ipre2 - ipre1) < 3
+    nvict = np.where(few, 0, nvict)
+    npre = np.where(few, 0, npre)
+
+    # post-edge range
+    emax = energy.max()
+    if norm2 is None:
+        norm2 = 5.0*np.round((emax - e0)/5.0)
+    norm2 = np.ones(nspec)*norm2
+    norm2 = np.where(norm2 < 0, emax - e0 - norm2, norm2)
+    norm2 = np.minimum(norm2, emax - e0)
+    if norm1 is None:
+        norm1 = np.minimum(25, 5.0*np.round(norm2/15.0))
+    norm1, norm2 = np.minimum(norm1, norm2), np.maximum(norm1, norm2)
+    norm1 = np.minimum(norm1, norm2 - 2)
+
+    if nnorm is None:
+        nnorm = np.where(norm2-norm1 < 300, 1, 2)
+        nnorm = np.where(norm2-norm1 < 30, 0, nnorm)
+    nnorm = np.clip(np.ones(nspec, dtype=int)*nnorm, 0, MAX_NNORM)
+
+    # pre-edge: line fit to mu*energy**nvict, or mean of mu for npre=0
+    p1 = _index_of_sorted(energy, pre1+e0)
+    p2 = _index_nearest_sorted(energy, pre2+e0)
+    p2 = np.where(npre == 0, np.where(p2 == p1, p2+1, p2),
+                  np.where(p2-p1 < 2, np.minimum(npts, p1+2), p2))
+    nvict = np.where(npre == 0, 0, nvict)
+    evict = energy**nvict[:, None]
+    precoefs = _polyfit_stack(energy, mu*evict, p1, p2, np.minimum(npre, 1))
+    if precoefs.shape[1] == 1:
+        precoefs = np.column_stack((precoefs, np.zeros(nspec)))
+    pre_edge = _polyval_stack(energy, precoefs)/evict
+
+    # post-edge: polynomial fit to mu - pre_edge
+    p1 = np.minimum(_index_of_sorted(energy, norm1+e0), npts-3)
+    p2 = _index_nearest_sorted(energy, norm2+e0)
+    short = (p2 - p1) < 2
+    p1 = np.where(short, p1-2, p1)
+    nnorm = np.where(short, 0, np.where(p2-p1 < 5, np.minimum(1, nnorm), nnorm))
+    norm_coefs = _polyfit_stack(energy, mu-pre_edge, p1, p2, nnorm)
+    post_edge = pre_edge + _polyval_stack(energy, norm_coefs)
+
+    if step is None:
+        edge_step = post_edge[rows, ie0] - pre_edge[rows, ie0]
+    else:
+        edge_step = np.ones(nspec)*step
+    edge_step = np.maximum(1.e-12, abs(edge_step))
+    norm = (mu - pre_edge)/edge_step[:, None]
+    return {'e0': e0, 'edge_step': edge_step, 'norm': norm,
+            'pre_edge': pre_edge, 'post_edge': post_edge,
+            'norm_coefs': norm_coefs, 'nvict': nvict, 'npre': npre,
+            'nnorm': nnorm, 'norm1': norm1, 'norm2': norm2,
+            'pre1': pre1, 'pre2': pre2, 'precoefs': precoefs,
+            'energy': energy}
+
 def preedge(energy, mu, e0=None, step=None, nnorm=None, nvict=0, npre=1, pre1=None,
             pre2=None, norm1=None, norm2=None, iscalc=False):
     """pre edge subtraction, normalization for XAFS (straight python)
@@ -204,8 +410,16 @@ def preedge(energy, mu, e0=None, step=None, nnorm=None, nvict=0, npre=1, pre1=No
          nnorm = 2 in norm2-norm1>300, 1 if norm2-norm1>30, or 0 if less.
          norm2 = max energy - e0, rounded to 5 eV
          norm1 = roughly min(150, norm2/3.0), rounded to 5 eV
-    """
 
+    3  if mu is a 2-d array of spectra (nspectra, len(energy)), the spectra
+       are processed together with preedge_stack().
+    """
+    if np.ndim(mu) == 2 and np.shape(mu)[0] > 1:
+        if iscalc:
+            raise ValueError("iscalc is not supported for a stack of spectra")
+        return preedge_stack(energy, mu, e0=e0, step=step, nnorm=nnorm,
+                             nvict=nvict, npre=npre, pre1=pre1, pre2=pre2,
+                             norm1=norm1, norm2=norm2)
     energy, mu = remove_nans2(energy, mu)
     energy = remove_dups(energy, tiny=TINY_ENERGY)
     if energy.size <= 1:
@@ -378,10 +592,24 @@ def pre_edge(energy, mu=None, group=None, e0=None, step=None, nnorm=None,
               nnorm = 2 in norm2-norm1>300, 1 if norm2-norm1>30, or 0 if less.
       5. flattening fits a quadratic curve (no matter nnorm) to the post-edge
          normalized mu(E) and subtracts that curve from it.
+      6. if mu is a 2-d array of spectra (nspectra, len(energy)), the spectra
+         are processed together with preedge_stack(), and the outputs are
+         arrays with one value or one row per spectrum.  For these, `flat`
+         is made from the post-edge curve, and `flat_alt`, `norm_area`, and
+         `d2mude` are not calculated.
     """
     energy, mu, group = parse_group_args(energy, members=('energy', 'mu'),
                                          defaults=(mu,), group=group,
                                          fcn_name='pre_edge')
+    if np.ndim(mu) == 2 and np.shape(mu)[0] > 1:
+        if group is not None and e0 is None:
+            e0 = getattr(group, 'e0', None)
+        pre_dat = preedge(energy, mu, e0=e0, step=step, nnorm=nnorm,
+                          nvict=nvict, npre=npre, pre1=pre1, pre2=pre2,
+                          norm1=norm1, norm2=norm2, iscalc=iscalc)
+        _pre_edge_stack_outputs(pre_dat, set_xafsGroup(group, _larch=_larch),
+                                make_flat=make_flat)
+        return
     energy, mu = remove_nans2(energy, mu)
     if len(energy.shape) > 1:
         energy = energy.squeeze()
@@ -489,6 +717,148 @@ def pre_edge(energy, mu=None, group=None, e0=None, step=None, nnorm=None,
         if group.edge is None:  group.edge = _edge
     return
 
+def _pre_edge_stack_outputs(pre_dat, group, make_flat=True):
+    "write outputs of preedge_stack() to group"
+    energy, norm = pre_dat['energy'], pre_dat['norm']
+    ie0 = _index_nearest_sorted(energy, pre_dat['e0'])
+    for attr in ('e0', 'edge_step', 'norm', 'pre_edge', 'post_edge'):
+        setattr(group, attr, pre_dat[attr])
+    group.edge_step_poly = pre_dat['edge_step']
+    group.norm_poly = 1.0*norm
+    group.flat = 1.0*norm
+    if make_flat:
+        flat_residue = (pre_dat['post_edge'] - pre_dat['pre_edge'])
+        flat_residue /= pre_dat['edge_step'][:, None]
+        flat_e0 = flat_residue[np.arange(len(ie0)), ie0]
+        group.flat = np.where(np.arange(len(energy)) < ie0[:, None], norm,
+                              norm - flat_residue + flat_e0[:, None])
+    group.dmude = np.gradient(norm, axis=1)/np.gradient(energy)
+
+    group.pre_edge_details = Group()
+    for attr in ('pre1', 'pre2', 'norm1', 'norm2', 'nnorm', 'nvict', 'npre'):
+        setattr(group.pre_edge_details, attr, pre_dat[attr])
+    group.pre_edge_details.pre_offset = pre_dat['precoefs'][:, 0]
+    group.pre_edge_details.pre_slope  = pre_dat['precoefs'][:, 1]
+    for i, c in enumerate(pre_dat['norm_coefs'].T):
+        setattr(group.pre_edge_details, 'norm_c%i' % i, c)
+
+def _align_ref_arrays(reference, array='dmude', emin=-15, emax=35):
+    """check reference group, return (xref, yref, i1, i2) for alignment"""
+    if not (hasattr(reference, 'energy') and hasattr(reference, 'mu')
+            and hasattr(reference, 'e0') ):
+        raise ValueError("reference must have attributes 'energy', 'mu', and 'e0'")
+    xref, yref = _align_arrays(reference, array=array)
+    i1 = index_of(xref, reference.e0-emin)
+    i2 = index_of(xref, reference.e0+emax)
+    return xref, yref, i1, i2
+
+def _align_arrays(group, array='dmude'):
+    """return (energy, y) arrays of a group to use for alignment"""
+    if not hasattr(group, 'dmude'):
+        mu = getattr(group, 'norm', getattr(group, 'mu'))
+        en = getattr(group, 'energy')
+        group.dmude = np.gradient(mu)/np.gradient(en)
+
+    xdat = group.energy[:]*1.0
+    ydat = group.dmude[:]*1.0
+    if array == 'mu':
+        ydat = group.mu[:]*1.0
+    elif array == 'norm':
+        ydat = group.norm[:]*1.0
+    xdat = remove_nans(xdat[:], interp=True)
+    ydat = remove_nans(ydat[:], interp=True)
+    return xdat, ydat
+
+def _align_resid(params, xdat, ydat, xref, yref, i1, i2):
+    "fit residual for energy alignment"
+    newx = xdat + params['eshift'].value
+    scale = params['scale'].value
+    ytmp = interp(newx, ydat, xref, kind='cubic')
+    return (ytmp*scale - yref)[i1:i2]
+
+def _align_refine(xdat, ydat, xref, yref, i1, i2, eshift=0):
+    """refine energy shift of one spectrum, starting at eshift"""
+    params = Parameters()
+    params.add('eshift', value=eshift, min=-50, max=50)
+    params.add('scale', value=1, min=0, max=50)
+    try:
+        fit = Minimizer(_align_resid, params,
+                        fcn_args=(xdat, ydat, xref, yref, i1, i2))
+        result = fit.leastsq()
+        eshift = result.params['eshift'].value
+    except:
+        eshift = 0
+    return eshift
+
+def _align_refine_chunk(arrays, eshifts, xref, yref, i1, i2):
+    """refine energy shifts for a list of (xdat, ydat)"""
+    return [_align_refine(xdat, ydat, xref, yref, i1, i2, eshift=e0)
+            for (xdat, ydat), e0 in zip(arrays, eshifts)]
+
+def _align_xcorr(arrays, xref, yref, i1, i2, srange=50, chunk_size=256):
+    """estimate energy shifts for many spectra at once by normalized
+    cross-correlation with the reference, evaluated by FFT.
+
+    Arguments
+    ---------
+    arrays      list of (xdat, ydat) arrays
+    xref, yref  reference energy and y arrays
+    i1, i2      indices of xref for the reference window
+    srange      maximum absolute shift to search [50]
+    chunk_size  number of spectra to correlate at once [256]
+
+    Returns
+    -------
+    array of estimated shifts, to be added to each xdat
+    """
+    nspec = len(arrays)
+    xlo, xhi = xref[min(i1, i2)], xref[max(i1, i2)]
+    if nspec == 0 or xhi - xlo <= 0:
+        return np.zeros(nspec)
+    ilo, ihi = min(i1, i2), max(i1, i2)
+    de = max(np.median(np.diff(xref[ilo:ihi+1]))/4.0, 0.01)
+
+    xwin = np.arange(xlo, xhi+de/2, de)
+    ywin = np.interp(xwin, xref, yref)
+    ywin = ywin - ywin.mean()
+    nwin = len(xwin)
+    xgrid = np.arange(xlo-srange, xhi+srange+de/2, de)
+    ngrid = len(xgrid)
+    nlags = ngrid - nwin + 1
+    nfft = next_fast_len(ngrid + nwin)
+    fref = np.conj(rfft(ywin, nfft))
+    wnorm = np.sqrt((ywin*ywin).sum())
+
+    eshifts = np.zeros(nspec)
+    for j0 in range(0, nspec, chunk_size):
+        chunk = arrays[j0:j0+chunk_size]
+        ydat = np.array([np.interp(xgrid, x, y) for x, y in chunk])
+        corr = irfft(rfft(ydat, nfft, axis=1)*fref, nfft,
+                            axis=1)[:, :nlags]
+        # local variance of each spectrum over the sliding window
+        csum = np.zeros((len(chunk), ngrid+1))
+        csum2 = np.zeros((len(chunk), ngrid+1))
+        csum[:, 1:] = np.cumsum(ydat, axis=1)
+        csum2[:, 1:] = np.cumsum(ydat*ydat, axis=1)
+        wsum = csum[:, nwin:] - csum[:, :nlags]
+        wvar = (csum2[:, nwin:] - csum2[:, :nlags]) - wsum*wsum/nwin
+        corr = corr/(wnorm*np.sqrt(np.maximum(wvar, 0)) + 1.e-30)
+
+        imax = np.argmax(corr, axis=1)
+        rows = np.arange(len(chunk))
+        lag = imax.astype(float)
+        inner = (imax > 0) & (imax < nlags-1)
+        cm = corr[rows[inner], imax[inner]-1]
+        c0 = corr[rows[inner], imax[inner]]
+        cp = corr[rows[inner], imax[inner]+1]
+        denom = cm - 2*c0 + cp
+        good = abs(denom) > 0
+        off = np.zeros(len(c0))
+        off[good] = 0.5*(cm[good] - cp[good])/denom[good]
+        lag[inner] += np.clip(off, -0.5, 0.5)
+        eshifts[j0:j0+len(chunk)] = srange - lag*de
+    return np.clip(eshifts, -srange, srange)
+
 def energy_align(group, reference, array='dmude', emin=-15, emax=35):
     """
     align XAFS data group to a reference group
@@ -518,58 +888,112 @@ def energy_align(group, reference, array='dmude', emin=-15, emax=35):
     if not (hasattr(group, 'energy') and hasattr(group, 'mu')):
         raise ValueError("group must have attributes 'energy' and 'mu'")
 
-    if not hasattr(group, 'dmude'):
-        mu = getattr(group, 'norm', getattr(group, 'mu'))
-        en = getattr(group, 'energy')
-        group.dmude = gradient(mu)/gradient(en)
-
+    xdat, ydat = _align_arrays(group, array=array)
+    xref, yref, i1, i2 = _align_ref_arrays(reference, array=array,
+                                           emin=emin, emax=emax)
+    eshift = _align_refine(xdat, ydat, xref, yref, i1, i2)
+    group.eshift = eshift
+    return eshift
 
-    if not (hasattr(reference, 'energy') and hasattr(reference, 'mu')
-            and hasattr(reference, 'e0') ):
-        raise ValueError("reference must have attributes 'energy', 'mu', and 'e0'")
+def energy_align_batch(groups, reference, array='dmude', emin=-15, emax=35,
+                       refine=True, executor=None, max_workers=None):
+    """
+    align a list of XAFS data groups to a reference group
 
-    if not hasattr(reference, 'dmude'):
-        mu = getattr(reference, 'norm', getattr(reference, 'mu'))
-        en = getattr(reference, 'energy')
-        reference.dmude = gradient(mu)/gradient(en)
+    Arguments
+    ---------
+    groups      list of Larch groups for spectra to be aligned
+    reference   Larch group for reference spectrum
+    array       string of 'dmude', 'norm', or 'mu'  ['dmude']
+    emin        float, min energy relative to e0 of reference for alignment [-15]
+    emax        float, max energy relative to e0 of reference for alignment [+35]
+    refine      whether to refine shifts with a least-squares fit [True]
+    executor    None, 'threads', or 'processes' to refine groups of
+                spectra in parallel [None]
+    max_workers maximum number of workers for executor [cpu count]
 
-    xdat = group.energy[:]*1.0
-    xref = reference.energy[:]*1.0
-    ydat = group.dmude[:]*1.0
-    yref = reference.dmude[:]*1.0
-    if array == 'mu':
-        ydat = group.mu[:]*1.0
-        yref = reference.mu[:]*1.0
-    elif array == 'norm':
-        ydat = group.norm[:]*1.0
-        yref = reference.norm[:]*1.0
+    Returns
+    -------
+    array of energy shifts to add to each group.energy to match reference.
+    These values will also be written to group.eshift for each group.
 
-    xdat = remove_nans(xdat[:], interp=True)
-    ydat = remove_nans(ydat[:], interp=True)
-    xref = remove_nans(xref[:], interp=True)
-    yref = remove_nans(yref[:], interp=True)
+    Notes
+    -----
+      1.  Initial shifts for all groups are estimated together by
+          cross-correlation with the reference, using FFTs.
+      2.  With refine=True, each shift is then refined as with energy_align,
+          starting from the estimated shift.
 
-    i1 = index_of(xref, reference.e0-emin)
-    i2 = index_of(xref, reference.e0+emax)
+    See Also: energy_align, energy_align_merge
+    """
+    groups = list(groups)
+    for group in groups:
+        if not (hasattr(group, 'energy') and hasattr(group, 'mu')):
+            raise ValueError("group must have attributes 'energy' and 'mu'")
+
+    arrays = [_align_arrays(group, array=array) for group in groups]
+    xref, yref, i1, i2 = _align_ref_arrays(reference, array=array,
+                                           emin=emin, emax=emax)
+    eshifts = _align_xcorr(arrays, xref, yref, i1, i2)
+    if refine and len(groups) > 0:
+        def run_chunk(start, stop):
+            return _align_refine_chunk(arrays[start:stop], eshifts[start:stop],
+                                       xref, yref, i1, i2)
+        eshifts = run_chunks(run_chunk, len(groups), executor=executor,
+                             max_workers=max_workers,
+                             caller='energy_align_batch')
+    eshifts = np.asarray(eshifts, dtype=float)
+    for group, eshift in zip(groups, eshifts):
+        group.eshift = eshift
+    return eshifts
+
+def energy_align_merge(groups, reference=None, array='dmude', emin=-15,
+                       emax=35, xarray='energy', yarray='mu', kind='cubic',
+                       trim=True, refine=True, executor=None, max_workers=None):
+    """
+    align a list of XAFS data groups to a reference and merge them
 
-    def align_resid(params, xdat, ydat, xref, yref, i1, i2):
-        "fit residual"
-        newx = xdat + params['eshift'].value
-        scale = params['scale'].value
-        ytmp = interp(newx, ydat, xref, kind='cubic')
-        return (ytmp*scale - yref)[i1:i2]
+    Arguments
+    ---------
+    groups      list of Larch groups for spectra to be aligned and merged
+    reference   Larch group for reference spectrum [None -> 1st group]
+    array       string of 'dmude', 'norm', or 'mu' for alignment ['dmude']
+    emin        float, min energy relative to e0 of reference for alignment [-15]
+    emax        float, max energy relative to e0 of reference for alignment [+35]
+    xarray      name of x-array for merge ['energy']
+    yarray      name of y-array for merge ['mu']
+    kind        interpolation kind for merge ['cubic']
+    trim        whether to trim to the shortest energy range [True]
+    refine      whether to refine alignment shifts with a least-squares fit [True]
+    executor    None, 'threads', or 'processes' to refine shifts in parallel [None]
+    max_workers maximum number of workers for executor [cpu count]
 
-    params = Parameters()
-    params.add('eshift', value=0, min=-50, max=50)
-    params.add('scale', value=1, min=0, max=50)
+    Returns
+    -------
+    group with x-array and y-array containing merged data, the
+    standard deviation as <yarray>_std, and the energy shifts as eshifts.
 
-    try:
-        fit = Minimizer(align_resid, params,
-                        fcn_args=(xdat, ydat, xref, yref, i1, i2))
-        result = fit.leastsq()
-        eshift = result.params['eshift'].value
-    except:
-        eshift = 0
+    Notes
+    -----
+      1.  The shifts are found with energy_align_batch, and written to
+          group.eshift for each group.
+      2.  The merge uses the running mean and variance of merge_groups, so
+          that the interpolated arrays are never all held at once.
+      3.  If reference has no e0 value, it will be found with find_e0.
 
-    group.eshift = eshift
-    return eshift
+    See Also: energy_align_batch, merge_groups
+    """
+    from larch.io.mergegroups import merge_groups
+    groups = list(groups)
+    if reference is None:
+        reference = groups[0]
+    if getattr(reference, 'e0', None) is None:
+        find_e0(reference.energy, reference.mu, group=reference)
+    eshifts = energy_align_batch(groups, reference, array=array, emin=emin,
+                                 emax=emax, refine=refine, executor=executor,
+                                 max_workers=max_workers)
+    merged = merge_groups(groups, master=reference, xarray=xarray,
+                          yarray=yarray, kind=kind, trim=trim,
+                          xshifts=eshifts)
+    merged.eshifts = eshifts
+    return merged
@@ -1,5 +1,7 @@
+from functools import lru_cache
 import numpy as np
 from scipy.interpolate import CubicSpline
+from scipy.sparse import csr_matrix
 
 from larch import Group
 from larch.larchlib import Make_CallArgs, parse_group_args
@@ -108,6 +110,9 @@ def rebin_xafs(energy, mu=None, group=None, e0=None, pre1=None, pre2=-30,
          c) mean value ('boxcar')
          c) centroid ('centroid')
 
+     5 The assignment of input energies to bins is cached, and reused for
+       data on the same energy array. See also rebin_xafs_stack.
+
     """
     energy, mu, group = parse_group_args(energy, members=('energy', 'mu'),
                                          defaults=(mu,), group=group,
@@ -119,6 +124,39 @@ def rebin_xafs(energy, mu=None, group=None, e0=None, pre1=None, pre2=-30,
     if e0 is None:
         raise ValueError("need e0")
 
+    en = rebin_energy_grid(energy, e0, pre1=pre1, pre2=pre2,
+                           pre_step=pre_step, xanes_step=xanes_step,
+                           exafs1=exafs1, exafs2=exafs2,
+                           exafs_kstep=exafs_kstep)
+    out = _rebin_apply(energy, en, mu, method=method)
+
+    newname = group.__name__ + '_rebinned'
+    group.rebinned = Group(energy=en, mu=out['mu'],
+                           delta_mu=out['delta_mu'], e0=e0,
+                           __name__=newname)
+    return
+
+def rebin_energy_grid(energy, e0, pre1=None, pre2=-30, pre_step=2,
+                      xanes_step=None, exafs1=15, exafs2=None,
+                      exafs_kstep=0.05):
+    """energy array for a 'standard 3 region XAFS scan', as used by rebin_xafs
+
+    Arguments
+    ---------
+    energy       input energy array
+    e0           energy reference -- all energy values are relative to this
+    pre1         start of pre-edge region [1st energy point]
+    pre2         end of pre-edge region, start of XANES region [-30]
+    pre_step     energy step for pre-edge region [2]
+    xanes_step   energy step for XANES region [E0/25000, see rebin_xafs]
+    exafs1       end of XANES region, start of EXAFS region [15]
+    exafs2       end of EXAFS region [last energy point]
+    exafs_kstep  k-step for EXAFS region [0.05]
+
+    Returns
+    -------
+      new energy array
+    """
     emin = min(energy) - e0
     emax = max(energy) - e0
 
@@ -167,50 +205,155 @@ def rebin_xafs(energy, mu=None, group=None, e0=None, pre1=None, pre2=-30,
         if isk:
             reg = ktoe(reg)
         en.extend(e0 + reg[:-1])
+    return np.array(en)
+
+def rebin_xafs_stack(energy, mu, e0, pre1=None, pre2=-30, pre_step=2,
+                     xanes_step=None, exafs1=15, exafs2=None,
+                     exafs_kstep=0.05, method='boxcar', mu_err=None):
+    """rebin many mu(E) spectra measured on the same energy array
+    to a 'standard 3 region XAFS scan'
+
+    Arguments
+    ---------
+    energy       input energy array, shape (npts,)
+    mu           input mu array, shape (npts,) or (nspectra, npts)
+    e0           energy reference -- all energy values are relative to this
+    pre1         start of pre-edge region [1st energy point]
+    pre2         end of pre-edge region, start of XANES region [-30]
+    pre_step     energy step for pre-edge region [2]
+    xanes_step   energy step for XANES region [E0/25000, see rebin_xafs]
+    exafs1       end of XANES region, start of EXAFS region [15]
+    exafs2       end of EXAFS region [last energy point]
+    exafs_kstep  k-step for EXAFS region [0.05]
+    method       one of 'spline, 'boxcar', 'centroid' ['boxcar']
+    mu_err       uncertainties in mu, with the shape of mu [None]
+
+    Returns
+    -------
+      group with attributes
+        energy  new energy array
+        mu      mu for energy array, shape (nbins,) or (nspectra, nbins)
+        delta_mu  standard deviation of mu within each bin
+        mu_err  propagated uncertainty in mu, if mu_err is given
+        e0      e0
+
+    Notes
+    ------
+     1 The results are the same as for rebin_xafs for each spectrum.
+     2 The assignment of input energies to bins is cached for each pair of
+       input and output energy arrays, so repeated scans on the same energy
+       array reuse it.  Use rebin_cache_clear() to clear this cache.
+    """
+    energy = np.asarray(energy, dtype='float64')
+    en = rebin_energy_grid(energy, e0, pre1=pre1, pre2=pre2,
+                           pre_step=pre_step, xanes_step=xanes_step,
+                           exafs1=exafs1, exafs2=exafs2,
+                           exafs_kstep=exafs_kstep)
+    out = _rebin_apply(energy, en, mu, method=method, mu_err=mu_err)
+    return Group(energy=en, e0=e0, **out)
+
+def rebin_cache_clear():
+    "clear cache of rebinning operators"
+    _rebin_operator.cache_clear()
+
+def _rebin_apply(energy, en, mu, method='boxcar', mu_err=None):
+    """apply cached rebinning of energy onto en to mu, with shape (npts,)
+    or (nspectra, npts), returning dict with mu, delta_mu, and mu_err"""
+    energy = np.asarray(energy, dtype='float64')
+    en = np.asarray(en, dtype='float64')
+    method = method.lower()[:3]
+    if method not in ('box', 'spl'):
+        method = 'cen'
+    wmat, sindex, soffsets, scounts = _rebin_operator(energy.tobytes(),
+                                                      en.tobytes(), method)
+    mu = np.asarray(mu, dtype='float64')
+    mu_out = (wmat @ mu.T).T
+
+    # standard deviation of mu in each bin segment
+    delta_mu = np.full(mu.shape[:-1] + (len(en),), np.nan)
+    valid = scounts > 0
+    if len(sindex) > 0:
+        vals = mu[..., sindex]
+        means = np.add.reduceat(vals, soffsets, axis=-1)/scounts[valid]
+        dev = vals - np.repeat(means, scounts[valid], axis=-1)
+        delta_mu[..., valid] = np.sqrt(np.add.reduceat(dev*dev, soffsets,
+                                                       axis=-1)/scounts[valid])
+    out = {'mu': mu_out, 'delta_mu': delta_mu}
+    if mu_err is not None:
+        mu_err = np.asarray(mu_err, dtype='float64')
+        out['mu_err'] = np.sqrt((wmat.multiply(wmat) @ (mu_err*mu_err).T).T)
+    return out
+
+@lru_cache(maxsize=32)
+def _rebin_operator(ebytes, enbytes, method):
+    """cached rebinning operator for energy array onto new energy array en,
+    both given as bytes.
+
+    Returns
+    -------
+     wmat     sparse matrix (nbins, npts), so that mu_new = wmat @ mu
+     sindex   indices into energy for the bins with data, in order
+     soffsets offsets into sindex for each of these bins
+     scounts  number of points in each bin
+
+    The rebinned data is found by determining which segments of the input
+    energy correspond to each bin in the new energy array, as described in
+    rebin_xafs.  All methods are linear in mu, so that each bin is a row of
+    weights in wmat.
+    """
+    energy = np.frombuffer(ebytes, dtype='float64')
+    en = np.frombuffer(enbytes, dtype='float64')
+    npts, nbins = len(energy), len(en)
 
     # find the segment boundaries of the old energy array
-    bounds = [index_of(energy, e) for e in en]
-    mu_out = []
-    err_out = []
-
-    j0 = 0
-    for i in range(len(en)):
-        if i == len(en) - 1:
-            j1 = len(energy) - 1
-        else:
-            j1 = int((bounds[i] + bounds[i+1] + 1)/2.0)
-        if i == 0 and j0 == 0:
-            j0 = index_of(energy, en[0]-5)
-        # if not enough points in segment, do interpolation
-        # print(i, en[i], j0, j1,  len(energy[j0:j1]))
+    if np.all(np.diff(energy) >= 0):
+        bounds = np.searchsorted(energy, en, side='right') - 1
+        bounds = np.maximum(bounds, 0)
+    else:
+        bounds = np.array([index_of(energy, e) for e in en])
+    stops = np.zeros(nbins, dtype=int)
+    stops[:-1] = ((bounds[:-1] + bounds[1:] + 1)/2.0).astype(int)
+    stops[-1] = npts - 1
+    starts = np.zeros(nbins, dtype=int)
+    starts[1:] = stops[:-1]
+    starts[0] = index_of(energy, en[0]-5)
+
+    rows, cols, weights = [], [], []
+    sstarts = starts.copy()
+    for i in range(nbins):
+        j0, j1 = starts[i], stops[i]
         if (j1 - j0) < 3:
+            # if not enough points in segment, do interpolation
             jx = j1 + 1
             if (jx - j0) < 3:
                 jx += 1
-
-            val = interp1d(energy[j0:jx], mu[j0:jx], en[i])
-            err = mu[j0:jx].std()
-            if np.isnan(val):
+            wts = interp1d(energy[j0:jx], np.identity(len(energy[j0:jx])),
+                           en[i], axis=0)
+            if np.any(np.isnan(wts)):
                 j0 = max(0, j0-1)
-                jx = min(len(energy), jx+1)
-                val = interp1d(energy[j0:jx], mu[j0:jx], en[i])
-                err = mu[j0:jx].std()
+                jx = min(npts, jx+1)
+                wts = interp1d(energy[j0:jx], np.identity(len(energy[j0:jx])),
+                               en[i], axis=0)
+            sstarts[i] = j0
+            jsl = slice(j0, jx)
         else:
-            if method.startswith('box'):
-                val =  mu[j0:j1].mean()
-            elif method.startswith('spl'):
-                val = CubicSpline(energy[j0:j1], mu[j0:j1])(en[i])
+            jsl = slice(j0, j1)
+            x = energy[jsl]
+            if method == 'box':
+                wts = np.ones(len(x))/len(x)
+            elif method == 'spl':
+                wts = CubicSpline(x, np.identity(len(x)))(en[i])
             else:
-                val = (mu[j0:j1]*energy[j0:j1]).mean()/energy[j0:j1].mean()
-        mu_out.append(val)
-        if j0 == j1:
-            err_out.append(np.nan)
-        else:
-            err_out.append(mu[j0:j1].std())
-        j0 = j1
-
-    newname = group.__name__ + '_rebinned'
-    group.rebinned = Group(energy=np.array(en), mu=np.array(mu_out),
-                           delta_mu=np.array(err_out), e0=e0,
-                           __name__=newname)
-    return
+                wts = x/(len(x)*x.mean())
+        cols.append(np.arange(npts)[jsl])
+        rows.append(np.full(len(cols[-1]), i))
+        weights.append(wts)
+    wmat = csr_matrix((np.concatenate(weights),
+                       (np.concatenate(rows), np.concatenate(cols))),
+                      shape=(nbins, npts))
+
+    scounts = np.maximum(stops - sstarts, 0)
+    sindex = np.concatenate([np.arange(j0, j0+n) for j0, n
+                             in zip(sstarts, scounts)] + [np.zeros(0, dtype=int)])
+    soffsets = np.cumsum(np.concatenate(([0], scounts[scounts > 0])))[:-1]
+    return wmat, sindex, soffsets, scounts
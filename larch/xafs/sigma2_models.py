@@ -2,6 +2,7 @@
 # models for debye-waller factors for xafs
 
 import ctypes
+from functools import lru_cache
 import numpy as np
 from larch.larchlib import get_dll
 
@@ -135,26 +136,87 @@ def sigma2_correldebye(natoms, tk, theta, rnorm, x, y, z, atwt):
 
    Returns:
       sig2_cordby  double, calculated sigma2
-    """
-    global FEFF6LIB
-    if FEFF6LIB is None:
-        FEFF6LIB = get_dll('feff6')
-        FEFF6LIB.sigma2_debye.restype = ctypes.c_double
 
+   Notes:
+     1. results are cached by path geometry, tk, theta, and rnorm, so that
+        paths with the same geometry (as in multiple data sets) and
+        repeated evaluations with the same temperatures (as for most
+        steps of a fit) are calculated only once.
+        Use sigma2_cache_clear() to clear this cache.
+     2. the Feff6 library is used if available, otherwise the
+        calculation is done with sigma2_correldebye_np().
+    """
+    natoms = int(natoms)
+    geom = tuple(float(val[i]) for val in (x, y, z, atwt)
+                 for i in range(natoms))
+    return _sigma2_correldebye_cached(natoms, float(tk), float(theta),
+                                      float(rnorm), geom)
+
+@lru_cache(maxsize=8192)
+def _sigma2_correldebye_cached(natoms, tk, theta, rnorm, geom):
+    "cached sigma2_correldebye, with geom = (*x, *y, *z, *atwt)"
+    x, y, z, atwt = np.array(geom).reshape(4, natoms)
+    lib = _get_feff6lib()
+    if lib is None:
+        return sigma2_correldebye_np(natoms, tk, theta, rnorm, x, y, z, atwt)
+
+    c_double_p = ctypes.POINTER(ctypes.c_double)
     na = ctypes.pointer(ctypes.c_int(natoms))
     t  = ctypes.pointer(ctypes.c_double(tk))
     th = ctypes.pointer(ctypes.c_double(theta))
     rs = ctypes.pointer(ctypes.c_double(rnorm))
+    arrays = [np.ascontiguousarray(arr, dtype=np.float64)
+              for arr in (x, y, z, atwt)]
+    ax, ay, az, am = [arr.ctypes.data_as(c_double_p) for arr in arrays]
+    return lib.sigma2_debye(na, t, th, rs, ax, ay, az, am)
 
-    ax = (natoms*ctypes.c_double)()
-    ay = (natoms*ctypes.c_double)()
-    az = (natoms*ctypes.c_double)()
-    am = (natoms*ctypes.c_double)()
-    for i in range(natoms):
-        ax[i], ay[i], az[i], am[i] = float(x[i]), float(y[i]), float(z[i]), float(atwt[i])
-
-    return FEFF6LIB.sigma2_debye(na, t, th, rs, ax, ay, az, am)
-
+def _get_feff6lib():
+    "load Feff6 library for sigma2_debye, or return None if not available"
+    global FEFF6LIB
+    if FEFF6LIB is None:
+        try:
+            FEFF6LIB = get_dll('feff6')
+            FEFF6LIB.sigma2_debye.restype = ctypes.c_double
+        except (OSError, AttributeError, TypeError):
+            FEFF6LIB = False
+    return FEFF6LIB if FEFF6LIB else None
+
+def sigma2_cache_clear():
+    "clear cache of correlated Debye sigma2 values"
+    _sigma2_correldebye_cached.cache_clear()
+
+def sigma2_correldebye_np(natoms, tk, theta, rnorm, x, y, z, atwt):
+    """calculate the XAFS debye-waller factor for a path with the
+    correlated Debye model, as sigma2_correldebye_py(), but with all atom
+    pairs and correlation integrals evaluated together with numpy.
+
+    Arguments are as for sigma2_correldebye_py().
+    """
+    pos = np.array([x, y, z], dtype=float).T[:natoms]
+    atwt = np.asarray(atwt, dtype=float)[:natoms]
+    i0, j0 = np.triu_indices(natoms)
+    i1, j1 = (i0 + 1) % natoms, (j0 + 1) % natoms
+
+    def dist(a, b):
+        return np.sqrt(((pos[a] - pos[b])**2).sum(axis=1))
+
+    bond_i = pos[i0] - pos[i1]
+    bond_j = pos[j0] - pos[j1]
+    ridotj = (bond_i*bond_j).sum(axis=1)
+
+    # correlations for the 4 pairs of atoms for each pair of bonds,
+    # with one integral for each distinct distance and mass product
+    pairs = [(i0, j0), (i1, j1), (i0, j1), (i1, j0)]
+    rij = np.concatenate([dist(a, b) for a, b in pairs])
+    mass = np.concatenate([atwt[a]*atwt[b] for a, b in pairs])
+    uniq, inverse = np.unique(np.array([rij, mass]), axis=1,
+                              return_inverse=True)
+    corr = corrfn_np(uniq[0], theta, tk, uniq[1], rnorm)[inverse.ravel()]
+    ci0j0, ci1j1, ci0j1, ci1j0 = corr.reshape(4, len(i0))
+
+    sig2ij = ridotj*(ci0j0 + ci1j1 - ci0j1 - ci1j0)/(dist(i0, i1)*dist(j0, j1))
+    sig2ij[i0 == j0] /= 2.0
+    return sig2ij.sum()/2.0
 
 def sigma2_correldebye_py(natoms, tk, theta, rnorm, x, y, z, atwt):
     """calculate the XAFS debye-waller factor for a path based
@@ -338,6 +400,51 @@ def debint(rx, tx):
         bo = result
     return result
 
+def corrfn_np(rij, theta, tk, mass, rs):
+    """corrfn() for an array of distances rij and an array of products
+    of atomic masses am1*am2"""
+    conh = 72.7630804732553
+    conr = 4.5693349700844
+    rx = conr * np.asarray(rij, dtype=float) / rs
+    return conh * debint_np(rx, theta/tk) / (theta*np.sqrt(mass))
+
+def debfun_np(w, rx, tx):
+    """debfun() for arrays of w and rx, which must broadcast together"""
+    wmin = 1.e-20
+    argmax = 50.0
+    w, rx = np.broadcast_arrays(np.asarray(w, dtype=float),
+                                np.asarray(rx, dtype=float))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = np.where(rx > 0, np.sin(w*rx)/rx, w)
+        emwt = np.exp(-np.minimum(w*tx, argmax))
+        result = result * (1 + emwt) / (1 - emwt)
+    return np.where(w > wmin, result, 2.0/tx)
+
+def debint_np(rx, tx):
+    """debint() for an array of rx values: the Romberg integrations for
+    all rx are refined together, and each stops when it has converged,
+    as for debint()."""
+    MAXITER = 12
+    tol = 1.e-9
+    rx = np.atleast_1d(np.asarray(rx, dtype=float))
+    bo = bn = (debfun_np(0.0, rx, tx) + debfun_np(1.0, rx, tx))/2.0
+    result = np.zeros(len(rx))
+    todo = np.arange(len(rx))
+    itn, step = 1, 1.0
+    for iter in range(MAXITER):
+        step = step / 2.
+        wvals = step*(2*np.arange(itn) + 1)
+        fsum = debfun_np(wvals[None, :], rx[todo][:, None], tx).sum(axis=1)
+        itn = 2*itn
+        bnp1 = step * fsum + (bn / 2.0)
+        result[todo] = (4 * bnp1 - bn) / 3.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            done = abs((result[todo] - bo)/result[todo]) < tol
+        todo, bn, bo = todo[~done], bnp1[~done], result[todo][~done]
+        if len(todo) == 0:
+            break
+    return result
+
 
 ####################################################
 ## sigma2_eins and sigma2_debye are defined here to
@@ -2,6 +2,7 @@
 """
   XAFS Fourier transforms
 """
+from functools import lru_cache
 import numpy as np
 from numpy import (pi, arange, zeros, ones, sin, cos,
                    exp, log, sqrt, where, interp, linspace)
@@ -70,7 +71,23 @@ def ftwindow(x, xmin=None, xmax=None, dx=1, dx2=None,
         sine                 sine function window
         kaiser               Kaiser-Bessel function-derived window
 
+    Windows are cached for repeated x arrays and window parameters.
+    Use ftwindow_cache_clear() to clear this cache.
     """
+    def asfloat(val):
+        return None if val is None else float(val)
+    x = np.asarray(x, dtype='float64')
+    return _ftwindow(x.tobytes(), asfloat(xmin), asfloat(xmax), asfloat(dx),
+                     asfloat(dx2), window).copy()
+
+def ftwindow_cache_clear():
+    "clear cache of FT windows"
+    _ftwindow.cache_clear()
+
+@lru_cache(maxsize=128)
+def _ftwindow(xbytes, xmin, xmax, dx, dx2, window):
+    "cached calculation of ftwindow(), with x given as bytes"
+    x = np.frombuffer(xbytes, dtype='float64')
     if window is None:
         window = FT_WINDOWS_SHORT[0]
     nam = window.strip().lower()[:3]
@@ -144,6 +161,7 @@ def ftwindow(x, xmin=None, xmax=None, dx=1, dx2=None,
     elif nam == 'gau':
         cen  = (x4+x1)/2
         fwin =  exp(-(((x - cen)**2)/(2*dx1*dx1)))
+    fwin.flags.writeable = False
     return fwin
 
 
@@ -161,7 +179,7 @@ def xftr(r, chir=None, group=None, rmin=0, rmax=20, with_phase=False,
     Parameters:
     ------------
       r:        1-d array of distance, or group.
-      chir:     1-d array of chi(R)
+      chir:     1-d array of chi(R), or 2-d array (nspectra, len(r))
       group:    output Group
       qmax_out: highest *k* for output data (30 Ang^-1)
       rweight:  exponent for weighting spectra by r^rweight (0)
@@ -190,6 +208,9 @@ def xftr(r, chir=None, group=None, rmin=0, rmax=20, with_phase=False,
         chiq_pha           phase of chi(k) if with_phase=True
                            (a noticable performance hit)
 
+    For 2-d chir, all spectra are transformed together, and the chiq
+    arrays are 2-d, with one row per spectrum.
+
     Supports First Argument Group convention (with group member names 'r' and 'chir')
     """
     if 'rweight' in kws:
@@ -202,10 +223,11 @@ def xftr(r, chir=None, group=None, rmin=0, rmax=20, with_phase=False,
     kstep = pi/(rstep*nfft)
     scale = 1.0
 
-    cchir = zeros(nfft, dtype='complex128')
+    nchir = chir.shape[-1]
+    cchir = zeros(chir.shape[:-1] + (nfft,), dtype='complex128')
     r_    = rstep * arange(nfft, dtype='float64')
 
-    cchir[0:len(chir)] = chir
+    cchir[..., 0:nchir] = chir
     if chir.dtype == np.dtype('complex128'):
         scale = 0.5
 
@@ -218,13 +240,13 @@ def xftr(r, chir=None, group=None, rmin=0, rmax=20, with_phase=False,
     group = set_xafsGroup(group, _larch=_larch)
     group.q = q
     mag = sqrt(out.real**2 + out.imag**2)
-    group.rwin =  win[:len(chir)]
-    group.chiq     =  out[:nkpts]
-    group.chiq_mag =  mag[:nkpts]
-    group.chiq_re  =  out.real[:nkpts]
-    group.chiq_im  =  out.imag[:nkpts]
+    group.rwin =  win[:nchir]
+    group.chiq     =  out[..., :nkpts]
+    group.chiq_mag =  mag[..., :nkpts]
+    group.chiq_re  =  out.real[..., :nkpts]
+    group.chiq_im  =  out.imag[..., :nkpts]
     if with_phase:
-        group.chiq_pha =  complex_phase(out[:nkpts])
+        group.chiq_pha =  complex_phase(out[..., :nkpts])
 
 
 
@@ -239,7 +261,7 @@ def xftf(k, chi=None, group=None, kmin=0, kmax=20, kweight=None,
     Parameters:
     -----------
       k:        1-d array of photo-electron wavenumber in Ang^-1 or group
-      chi:      1-d array of chi
+      chi:      1-d array of chi, or 2-d array (nspectra, len(k))
       group:    output Group
       rmax_out: highest R for output data (10 Ang)
       kweight:  exponent for weighting spectra by k**kweight [2]
@@ -268,6 +290,9 @@ def xftf(k, chi=None, group=None, kmin=0, kmax=20, kweight=None,
         chir_pha           phase of chi(R) if with_phase=True
                            (a noticable performance hit)
 
+    For 2-d chi, all spectra are transformed together, and the chir
+    arrays are 2-d, with one row per spectrum.
+
     Supports First Argument Group convention (with group member names 'k' and 'chi')
     """
     # allow kweight keyword == kw
@@ -295,14 +320,14 @@ def xftf(k, chi=None, group=None, kmin=0, kmax=20, kweight=None,
     group = set_xafsGroup(group, _larch=_larch)
     r   = rstep * arange(irmax)
     mag = sqrt(out.real**2 + out.imag**2)
-    group.kwin =  win[:len(chi)]
+    group.kwin =  win[:chi.shape[-1]]
     group.r    =  r[:irmax]
-    group.chir =  out[:irmax]
-    group.chir_mag =  mag[:irmax]
-    group.chir_re  =  out.real[:irmax]
-    group.chir_im  =  out.imag[:irmax]
+    group.chir =  out[..., :irmax]
+    group.chir_mag =  mag[..., :irmax]
+    group.chir_re  =  out.real[..., :irmax]
+    group.chir_im  =  out.imag[..., :irmax]
     if with_phase:
-        group.chir_pha =  complex_phase(out[:irmax])
+        group.chir_pha =  complex_phase(out[..., :irmax])
 
 
 
@@ -314,15 +339,24 @@ def xftf_prep(k, chi, kmin=0, kmax=20, kweight=2, dk=1, dk2=None,
 
     Returns weighted chi, window function which can easily be multiplied
     and used in xftf_fast.
+
+    chi can be a 2-d array (nspectra, len(k)), in which case the weighted
+    chi will be 2-d, with one row per spectrum.
     """
     if dk2 is None: dk2 = dk
     kweight = int(kweight)
     npts = int(1.01 + max(k)/kstep)
     k_max = max(max(k), kmax+dk2)
     k_   = kstep * np.arange(int(1.01+k_max/kstep), dtype='float64')
-    chi_ = interp(k_, k, chi)
+    if np.ndim(chi) > 1:
+        # linear interpolation of all spectra, as with interp()
+        i0 = np.clip(np.searchsorted(k, k_, side='right') - 1, 0, len(k)-2)
+        frac = np.clip((k_ - k[i0])/(k[i0+1] - k[i0]), 0, 1)
+        chi_ = chi[..., i0]*(1-frac) + chi[..., i0+1]*frac
+    else:
+        chi_ = interp(k_, k, chi)
     win  = ftwindow(k_, xmin=kmin, xmax=kmax, dx=dk, dx2=dk2, window=window)
-    return ((chi_[:npts] *k_[:npts]**kweight), win[:npts])
+    return ((chi_[..., :npts] *k_[:npts]**kweight), win[:npts])
 
 
 def xftf_fast(chi, nfft=2048, kstep=0.05, _larch=None, **kws):
@@ -337,18 +371,19 @@ def xftf_fast(chi, nfft=2048, kstep=0.05, _larch=None, **kws):
 
     Parameters:
     ------------
-      chi:      1-d array of chi to be transformed
+      chi:      1-d array of chi to be transformed, or 2-d array
+                (nspectra, nk) of spectra to transform together.
       nfft:     value to use for N_fft (2048).
       kstep:    value to use for delta_k (0.05).
 
     Returns:
     --------
-      complex 1-d array chi(R)
+      complex 1-d array chi(R), or 2-d array (nspectra, nfft/2)
 
     """
-    cchi = zeros(nfft, dtype='complex128')
-    cchi[0:len(chi)] = chi
-    return (kstep / sqrtpi) * fft(cchi)[:int(nfft/2)]
+    cchi = zeros(np.shape(chi)[:-1] + (nfft,), dtype='complex128')
+    cchi[..., 0:np.shape(chi)[-1]] = chi
+    return (kstep / sqrtpi) * fft(cchi, axis=-1)[..., :int(nfft/2)]
 
 def xftr_fast(chir, nfft=2048, kstep=0.05, _larch=None, **kws):
     """
@@ -361,16 +396,17 @@ def xftr_fast(chir, nfft=2048, kstep=0.05, _larch=None, **kws):
 
     Parameters:
     -------------
-      chir:     1-d array of chi(R) to be transformed
+      chir:     1-d array of chi(R) to be transformed, or 2-d array
+                (nspectra, nr) of spectra to transform together.
       nfft:     value to use for N_fft (2048).
       kstep:    value to use for delta_k (0.05).
 
     Returns:
     ----------
-      complex 1-d array for chi(q).
+      complex 1-d array for chi(q), or 2-d array (nspectra, nfft/2)
 
     This is useful for repeated FTs, as inside loops.
     """
-    cchi = zeros(nfft, dtype='complex128')
-    cchi[0:len(chir)] = chir
-    return  (4*sqrtpi/kstep) * ifft(cchi)[:int(nfft/2)]
+    cchi = zeros(np.shape(chir)[:-1] + (nfft,), dtype='complex128')
+    cchi[..., 0:np.shape(chir)[-1]] = chir
+    return  (4*sqrtpi/kstep) * ifft(cchi, axis=-1)[..., :int(nfft/2)]
@@ -0,0 +1,476 @@
+#!/usr/bin/env python
+"""
+  XAS processing pipeline: pre-edge subtraction and normalization,
+  background removal, and forward XAFS Fourier transform for a stream
+  of spectra, writing only selected outputs to a sink.
+"""
+import os
+import csv
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing as mp
+import numpy as np
+import h5py
+from pyshortcuts import fix_filename
+
+from larch import Group
+from larch.math.lincombo_fitting import iter_stack_chunks
+from .pre_edge import pre_edge
+from .autobk import _autobk_batch_run
+from .xafsft import xftf
+
+STEPS = ('pre_edge', 'autobk', 'xftf')
+
+STEP_OUTPUTS = {None: ('energy', 'mu'),
+                'pre_edge': ('e0', 'edge_step', 'norm', 'flat', 'dmude',
+                             'pre_edge', 'post_edge'),
+                'autobk': ('ek0', 'k', 'chi', 'bkg', 'chie'),
+                'xftf': ('r', 'kwin', 'chir_mag', 'chir_re', 'chir_im',
+                         'chir_pha')}
+
+# x-array for each array output, kept with the output
+OUTPUT_XARRAY = {'mu': 'energy', 'norm': 'energy', 'flat': 'energy',
+                 'dmude': 'energy', 'pre_edge': 'energy',
+                 'post_edge': 'energy', 'bkg': 'energy', 'chie': 'energy',
+                 'chi': 'k', 'kwin': 'k', 'chir_mag': 'r', 'chir_re': 'r',
+                 'chir_im': 'r', 'chir_pha': 'r'}
+
+AUTOBK_SETUP_KWS = ('rbkg', 'nknots', 'kmin', 'kmax', 'kweight', 'dk', 'win',
+                    'k_std', 'chi_std', 'nfft', 'kstep', 'interp')
+AUTOBK_RUN_KWS = ('ek0', 'edge_step', 'pre_edge_kws', 'nclamp', 'clamp_lo',
+                  'clamp_hi', 'calc_uncertainties', 'err_sigma')
+
+# precomputed autobk setups, kept per thread (and so per worker process)
+_LOCAL = threading.local()
+
+def iter_xas_source(filename, xarray='energy', yarray='mu', scans=None):
+    """iterate over scans in a file read with larch.io.open_xas_source,
+    as for XASPipeline
+
+    Arguments
+    ---------
+      filename   name of Spec or NeXus/HDF5 file
+      xarray     label of energy array ['energy']
+      yarray     label of mu array, or function taking a dict of
+                 {label: array} and returning mu ['mu']
+      scans      list of scan names [None, for all scans, sorted]
+
+    Yields
+    ------
+      tuples of (name, energy, mu)
+    """
+    from larch.io import open_xas_source
+    source = open_xas_source(filename)
+    if scans is None:
+        scans = source.get_sorted_scan_names()
+    for scan_name in scans:
+        scan = source.get_scan(scan_name)
+        if scan is None:
+            continue
+        arrays = dict(zip(scan.labels, scan.data))
+        if callable(yarray):
+            mu = yarray(arrays)
+        else:
+            mu = arrays[yarray]
+        yield (f'{filename}:{scan.name}', np.asarray(arrays[xarray]),
+               np.asarray(mu))
+
+def _iter_spectra(source, chunk_size=256):
+    """iterate over (name, energy, mu) for the items of a source, which
+    can be groups, (energy, mu) or (name, energy, mu).  mu can also be an
+    array or HDF5 dataset with shape (..., npts) for spectra sharing the
+    energy array."""
+    count = 0
+    for item in source:
+        if isinstance(item, Group) or hasattr(item, 'energy'):
+            name = getattr(item, 'filename', getattr(item, '__name__', None))
+            energy, mu = item.energy, item.mu
+        elif len(item) == 2:
+            name, (energy, mu) = None, item
+        else:
+            name, energy, mu = item
+        energy = np.asarray(energy, dtype='float64').squeeze()
+        if not hasattr(mu, 'shape'):
+            mu = np.asarray(mu, dtype='float64')
+        if len(mu.shape) > 1 and mu.shape[-1] == len(energy):
+            shape = tuple(mu.shape[:-1])
+            if np.prod(shape) == 1:
+                mu = np.asarray(mu, dtype='float64').reshape(-1)
+            else:
+                base = count if name is None else name
+                index = 0
+                for chunk in iter_stack_chunks(mu, chunk_size=chunk_size):
+                    for spectrum in chunk:
+                        label = np.unravel_index(index, shape)
+                        label = '_'.join(['%d' % i for i in label])
+                        yield (f'{base}_{label}', energy, spectrum)
+                        index += 1
+                count += 1
+                continue
+        if name is None:
+            name = '%d' % count
+        count += 1
+        yield (name, energy, np.asarray(mu, dtype='float64').squeeze())
+
+def _pipeline_pre_edge(groups, pre_edge_kws):
+    """run pre_edge on groups, together for groups sharing an energy array"""
+    energy = groups[0].energy
+    if len(groups) > 1 and all(len(g.energy) == len(energy) and
+                               np.all(g.energy == energy) for g in groups):
+        stack = Group(energy=energy, mu=np.array([g.mu for g in groups]))
+        pre_edge(stack, **pre_edge_kws)
+        for i, grp in enumerate(groups):
+            for attr in STEP_OUTPUTS['pre_edge']:
+                val = getattr(stack, attr, None)
+                if val is not None:
+                    setattr(grp, attr, val[i])
+    else:
+        for grp in groups:
+            pre_edge(grp, **pre_edge_kws)
+
+def _pipeline_xftf(groups, xftf_kws):
+    """run xftf on groups with chi, together"""
+    groups = [g for g in groups if hasattr(g, 'chi')]
+    if len(groups) == 0:
+        return
+    nk = max(len(g.k) for g in groups)
+    k = [g.k for g in groups if len(g.k) == nk][0]
+    chi = np.zeros((len(groups), nk))
+    for i, grp in enumerate(groups):
+        chi[i, :len(grp.chi)] = grp.chi
+    out = Group()
+    xftf(k, chi, group=out, **xftf_kws)
+    for i, grp in enumerate(groups):
+        grp.r = out.r
+        grp.kwin = out.kwin[:len(grp.k)]
+        for attr in ('chir_mag', 'chir_re', 'chir_im', 'chir_pha'):
+            if hasattr(out, attr):
+                setattr(grp, attr, getattr(out, attr)[i])
+
+def _pipeline_chunk(config, items):
+    """run pipeline steps on a list of (name, energy, mu), returning a list
+    of (name, dict of requested outputs)"""
+    steps = config['steps']
+    groups = [Group(energy=energy, mu=mu) for name, energy, mu in items]
+    if 'pre_edge' in steps:
+        _pipeline_pre_edge(groups, config['pre_edge_kws'])
+    if 'autobk' in steps:
+        setups = getattr(_LOCAL, 'setups', None)
+        if setups is None:
+            setups = _LOCAL.setups = {}
+        autobk_kws = config['autobk_kws']
+        setup_kws = {k: v for k, v in autobk_kws.items()
+                     if k in AUTOBK_SETUP_KWS}
+        run_kws = {k: v for k, v in autobk_kws.items()
+                   if k in AUTOBK_RUN_KWS}
+        results = _autobk_batch_run(groups, setup_kws,
+                                    warm_start=config['warm_start'],
+                                    setups=setups, **run_kws)
+        for grp, result in zip(groups, results):
+            if result is not None:
+                for attr in STEP_OUTPUTS['autobk']:
+                    setattr(grp, attr, result[attr])
+    if 'xftf' in steps:
+        _pipeline_xftf(groups, config['xftf_kws'])
+
+    out = []
+    for (name, energy, mu), grp in zip(items, groups):
+        out.append((name, {attr: getattr(grp, attr)
+                           for attr in config['outputs']
+                           if hasattr(grp, attr)}))
+    return out
+
+
+class XASPipeline:
+    """
+    Pipeline for processing many XAS spectra: pre-edge subtraction and
+    normalization (pre_edge), background removal (autobk), and forward
+    Fourier transform (xftf), keeping only the requested outputs.
+
+    Arguments
+    ---------
+      steps        steps to run, in order ['pre_edge', 'autobk', 'xftf']
+      outputs      names of outputs to keep [('norm', 'chi', 'chir_mag')]
+      pre_edge_kws dict of arguments for pre_edge() [None]
+      autobk_kws   dict of arguments for autobk() [None]
+      xftf_kws     dict of arguments for xftf() [None]
+      warm_start   whether to start each autobk fit from the result for the
+                   previous spectrum in the same chunk [True]
+      chunk_size   number of spectra to process together [32]
+      executor     None, 'threads', or 'processes' to process chunks of
+                   spectra concurrently [None]
+      max_workers  maximum number of workers for executor [cpu count]
+
+    Example
+    -------
+      >>> pipe = XASPipeline(outputs=('e0', 'edge_step', 'chi', 'chir_mag'),
+      ...                    autobk_kws=dict(rbkg=1.0, kweight=2, ek0=8980),
+      ...                    xftf_kws=dict(kmin=2, kmax=14, dk=4, kweight=2))
+      >>> pipe.run(iter_xas_source('scans.h5', yarray='mu_trans'),
+      ...          sink='processed.h5')
+
+    Notes
+    -----
+      1. The source is any iterable of groups with 'energy' and 'mu',
+         tuples of (energy, mu), or tuples of (name, energy, mu).  mu can
+         also be an array or HDF5 dataset of shape (..., npts) for many
+         spectra sharing the energy array, which is read in chunks.
+         See also iter_xas_source().
+      2. Spectra are read and processed one chunk at a time.  Within a
+         chunk, pre_edge() is run on all spectra together if they share an
+         energy array, and all chi(k) are Fourier transformed together.
+      3. The autobk fits use the analytic derivatives of autobk_batch().
+         The k grids, FT windows and spline derivatives are kept between
+         chunks and reused for spectra with the same energy array and
+         ek0: giving ek0 in autobk_kws ensures this.
+      4. Available outputs are 'energy', 'mu', the pre_edge outputs 'e0',
+         'edge_step', 'norm', 'flat', 'dmude', 'pre_edge', 'post_edge', the
+         autobk outputs 'ek0', 'k', 'chi', 'bkg', 'chie', and the xftf
+         outputs 'r', 'kwin', 'chir_mag', 'chir_re', 'chir_im', and
+         'chir_pha' (with with_phase=True in xftf_kws).  The x-array
+         ('energy', 'k', or 'r') for each requested array output is
+         always included in the outputs.
+    """
+    def __init__(self, steps=STEPS, outputs=('norm', 'chi', 'chir_mag'),
+                 pre_edge_kws=None, autobk_kws=None, xftf_kws=None,
+                 warm_start=True, chunk_size=32, executor=None,
+                 max_workers=None):
+        steps = tuple(steps)
+        for step in steps:
+            if step not in STEPS:
+                raise ValueError(f"unknown XASPipeline step '{step}'")
+        if 'xftf' in steps and 'autobk' not in steps:
+            raise ValueError("XASPipeline step 'xftf' needs step 'autobk'")
+        available = list(STEP_OUTPUTS[None])
+        for step in steps:
+            available.extend(STEP_OUTPUTS[step])
+        outputs = tuple(outputs)
+        for name in outputs:
+            if name not in available:
+                raise ValueError(f"XASPipeline output '{name}' not available "
+                                 f"from steps {steps}")
+        autobk_kws = {} if autobk_kws is None else dict(autobk_kws)
+        if 'kw' in autobk_kws:
+            autobk_kws['kweight'] = autobk_kws.pop('kw')
+        for name in autobk_kws:
+            if name not in AUTOBK_SETUP_KWS + AUTOBK_RUN_KWS:
+                raise ValueError(f"unknown autobk argument '{name}'")
+        if executor is not None:
+            executor = executor.lower()
+            if not (executor.startswith('thread') or
+                    executor.startswith('proc')):
+                raise ValueError("executor must be 'threads' or 'processes'")
+
+        # add the x-arrays for array outputs
+        for name in list(outputs):
+            xname = OUTPUT_XARRAY.get(name, None)
+            if xname is not None and xname not in outputs:
+                outputs = outputs + (xname,)
+
+        self.steps = steps
+        self.outputs = outputs
+        self.pre_edge_kws = {} if pre_edge_kws is None else dict(pre_edge_kws)
+        self.autobk_kws = autobk_kws
+        self.xftf_kws = {} if xftf_kws is None else dict(xftf_kws)
+        self.warm_start = warm_start
+        self.chunk_size = max(1, int(chunk_size))
+        self.executor = executor
+        self.max_workers = max_workers
+
+    def __repr__(self):
+        return f"<XASPipeline steps={self.steps}, outputs={self.outputs}>"
+
+    def _config(self):
+        return dict(steps=self.steps, outputs=self.outputs,
+                    pre_edge_kws=self.pre_edge_kws,
+                    autobk_kws=self.autobk_kws, xftf_kws=self.xftf_kws,
+                    warm_start=self.warm_start)
+
+    def _chunks(self, source):
+        chunk = []
+        for item in _iter_spectra(source):
+            chunk.append(item)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if len(chunk) > 0:
+            yield chunk
+
+    def process(self, source):
+        """process spectra from source, yielding (name, outputs) in order,
+        with outputs a dict of the requested output values"""
+        config = self._config()
+        if self.executor is None:
+            for chunk in self._chunks(source):
+                yield from _pipeline_chunk(config, chunk)
+            return
+
+        max_workers = self.max_workers
+        if max_workers is None:
+            max_workers = mp.cpu_count()
+        max_workers = max(1, max_workers)
+        if self.executor.startswith('proc'):
+            pool = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            pool = ThreadPoolExecutor(max_workers=max_workers)
+        # keep a bounded number of chunks in flight, so that the source is
+        # not read far ahead of the output
+        pending = deque()
+        try:
+            for chunk in self._chunks(source):
+                pending.append(pool.submit(_pipeline_chunk, config, chunk))
+                if len(pending) >= 2*max_workers:
+                    yield from pending.popleft().result()
+            while len(pending) > 0:
+                yield from pending.popleft().result()
+        finally:
+            for fut in pending:
+                fut.cancel()
+            pool.shutdown()
+
+    def run(self, source, sink=None):
+        """process spectra from source, writing outputs to sink
+
+        Arguments
+        ---------
+          source   iterable of spectra (see XASPipeline Notes)
+          sink     where to write outputs, one of
+                     None:  return list of (name, outputs)
+                     name of an HDF5 file ('.h5', '.hdf5', '.nxs'), for XASHDF5Sink
+                     name of a CSV file ('.csv'), or folder, for XASCSVSink
+                     object with a write(name, outputs) method
+
+        Returns
+        -------
+          list of (name, outputs) for sink=None, otherwise the number of
+          spectra written.
+        """
+        if sink is None:
+            return list(self.process(source))
+        close = False
+        if isinstance(sink, (str, os.PathLike)):
+            sink = str(sink)
+            if os.path.splitext(sink)[1].lower() in ('.h5', '.hdf5', '.nxs'):
+                sink = XASHDF5Sink(sink)
+            else:
+                sink = XASCSVSink(sink)
+            close = True
+        count = 0
+        try:
+            for name, outputs in self.process(source):
+                sink.write(name, outputs)
+                count += 1
+        finally:
+            if close:
+                sink.close()
+        return count
+
+
+class XASHDF5Sink:
+    """write XASPipeline outputs to an HDF5 file, with one HDF5 group per
+    spectrum, holding array outputs as datasets and scalar outputs as
+    attributes.
+
+    Arguments
+    ---------
+      filename   name of HDF5 file
+      group      name of HDF5 group for all spectra ['xas_pipeline']
+      mode       h5py file mode ['a']
+      compression  h5py compression for datasets ['gzip']
+    """
+    def __init__(self, filename, group='xas_pipeline', mode='a',
+                 compression='gzip'):
+        self.filename = filename
+        self.compression = compression
+        self.h5file = h5py.File(filename, mode)
+        self.root = self.h5file.require_group(group)
+        self.count = len(self.root)
+
+    def write(self, name, outputs):
+        "write outputs for one spectrum"
+        grp = self.root.create_group('spectrum_%06d' % self.count)
+        grp.attrs['name'] = str(name)
+        for attr, val in outputs.items():
+            if np.ndim(val) == 0:
+                grp.attrs[attr] = val
+            else:
+                grp.create_dataset(attr, data=val,
+                                   compression=self.compression)
+        self.count += 1
+
+    def close(self):
+        "close HDF5 file"
+        if self.h5file is not None:
+            self.h5file.close()
+            self.h5file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class XASCSVSink:
+    """write XASPipeline outputs to CSV files
+
+    Arguments
+    ---------
+      filename   name of CSV file for scalar outputs, one row per spectrum.
+                 Array outputs are written to a folder of the same name
+                 (without '.csv'), with one file per spectrum and x-array
+                 ('energy', 'k', or 'r'), with the x-array in the first
+                 column.
+    """
+    def __init__(self, filename):
+        if not filename.lower().endswith('.csv'):
+            filename = os.path.join(filename, 'summary.csv')
+        self.filename = filename
+        self.folder = os.path.splitext(filename)[0]
+        os.makedirs(self.folder, exist_ok=True)
+        self.fh = open(filename, 'w', newline='')
+        self.writer = None
+        self.count = 0
+
+    def write(self, name, outputs):
+        "write outputs for one spectrum"
+        scalars = {'name': name}
+        arrays = {}
+        for attr, val in outputs.items():
+            if np.ndim(val) == 0:
+                scalars[attr] = val
+            elif attr in OUTPUT_XARRAY:
+                xname = OUTPUT_XARRAY[attr]
+                if xname not in outputs:
+                    raise ValueError(f"XASCSVSink: output '{attr}' needs "
+                                     f"x-array '{xname}'")
+                arrays.setdefault(xname, {xname: outputs[xname]})[attr] = val
+        for xname, val in outputs.items():
+            # x-arrays written on their own only if nothing uses them
+            if np.ndim(val) > 0 and xname not in OUTPUT_XARRAY:
+                arrays.setdefault(xname, {xname: val})
+        if self.writer is None:
+            self.writer = csv.DictWriter(self.fh, fieldnames=list(scalars),
+                                         extrasaction='ignore')
+            self.writer.writeheader()
+        self.writer.writerow(scalars)
+
+        prefix = fix_filename('%06d_%s' % (self.count, name))
+        for xname, cols in arrays.items():
+            fname = os.path.join(self.folder, f'{prefix}_{xname}.csv')
+            np.savetxt(fname, np.array(list(cols.values())).T,
+                       delimiter=',', header=','.join(cols), comments='')
+        self.count += 1
+
+    def close(self):
+        "close summary CSV file"
+        if self.fh is not None:
+            self.fh.close()
+            self.fh = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
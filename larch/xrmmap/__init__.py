@@ -4,6 +4,8 @@ from .xrm_mapfile import (read_xrmmap, process_mapfolder,
                           GSEXRM_MapFile, DEFAULT_XRAY_ENERGY)
 
 from .gsexrm_utils import GSEXRM_FileStatus
+from .h5layout import (map_chunksize, map_compression, rechunk_mapfile,
+                       benchmark_map_layouts, MAP_LAYOUTS, MAP_COMPRESSIONS)
 
 _larch_builtins = {'_io': {'read_xrmmap': read_xrmmap,
                            'process_mapfolder': process_mapfolder}}
@@ -21,11 +21,14 @@ def toggle_winfile(folder, fname='_tmp.lock', sleep_time=0.05):
     """
     if os.name == 'nt':
         tmpfile = Path(folder, fname)
-        if tmpfile.exists():
-            tmpfile.unlink()
-        else:
-            with open(tmpfile, 'w') as fh:
-                fh.write('_tmp\n')
+        try:
+            if tmpfile.exists():
+                tmpfile.unlink()
+            else:
+                with open(tmpfile, 'w') as fh:
+                    fh.write('_tmp\n')
+        except OSError:  # may be toggled by another reader of the folder
+            pass
         time.sleep(sleep_time)
 
 def fix_xrd1d_filename(xrd_file):
@@ -203,6 +206,9 @@ class GSEXRM_MapRow:
         self.sisfile = sisfile
         self.xrdfile = xrdfile
         self.counts  = None
+        self.has_xrf = has_xrf
+        self.has_xrd1d = has_xrd1d
+        self.has_xrd2d = has_xrd2d
 
         self.xrd2d     = None
         self.xrdq      = None
@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+"""
+Chunk layout and compression presets for the MCA counts arrays
+of XRM Map HDF5 files, with an offline rechunker and a benchmark
+to compare presets on a real map file.
+
+The counts arrays are (NROWS, NPTS, NCHAN), and are read in three
+main ways:
+   per-pixel spectra      counts[iy, ix, :]
+   ROI maps               counts[:, :, c1:c2].sum(axis=2)
+   area spectra           counts[y1:y2, x1:x2, :].sum(axis=(0, 1))
+while they are written one row at a time. No single chunk shape
+is best for all of these, so a few presets are provided:
+
+  'default'   (4, 256, 512), as used by earlier versions.
+  'row'       one row of full spectra, with the number of pixels
+              capped so that a chunk is at most 1 MB, for example
+              (1, 64, 4096) for 4096 channels of 4-byte counts:
+              fastest to write, and good for per-pixel spectra.
+  'roi'       wide spatial tiles over a narrow range of channels:
+              fastest for ROI maps, slowest to write.
+  'area'      square spatial tiles of full spectra: best for
+              spectra summed over rectangles and areas.
+
+Compression can be 'gzip', 'lzf', None, or (using hdf5plugin)
+'blosc' (blosc-lz4 with byte-shuffle) or 'lz4'. Files using the
+hdf5plugin filters can only be read with hdf5plugin installed.
+"""
+import os
+import time
+import h5py
+import numpy as np
+from pathlib import Path
+from tempfile import mkdtemp
+
+try:
+    import hdf5plugin
+    HAS_HDF5PLUGIN = True
+except ImportError:
+    HAS_HDF5PLUGIN = False
+
+MAP_LAYOUTS = ('default', 'row', 'roi', 'area')
+MAP_COMPRESSIONS = ('gzip', 'lzf', 'blosc', 'lz4', None)
+PLUGIN_COMPRESSIONS = ('blosc', 'lz4')
+
+CHUNK_NBYTES = 1024*1024
+ROI_CHUNK_NCHAN = 32
+ROI_CHUNK_NROWS = 16
+COPY_NBYTES = 64*1024*1024
+
+def map_chunksize(layout, npts, nchan, itemsize=4, nbytes=CHUNK_NBYTES):
+    """chunk shape for a (NROWS, npts, nchan) counts array
+
+    Arguments
+    ---------
+      layout    name of layout preset, one of MAP_LAYOUTS [None -> 'default']
+      npts      number of pixels per row
+      nchan     number of MCA channels
+      itemsize  size of data type in bytes [4]
+      nbytes    target size of a chunk in bytes [1 MB]
+
+    Returns
+    -------
+      tuple of 3 ints for the chunk shape
+
+    Notes
+    -----
+      For the 'row' layout, nbytes is a maximum: a chunk holds at most
+      nbytes/(nchan*itemsize) pixels, and so is only a whole row of the
+      map for npts below that.
+    """
+    if layout is None:
+        layout = 'default'
+    layout = layout.lower()
+    if layout not in MAP_LAYOUTS:
+        raise ValueError("unknown map layout '%s': use one of %s" %
+                         (layout, ', '.join(MAP_LAYOUTS)))
+    if layout == 'default':
+        return (4, min(256, npts), min(512, nchan))
+    elif layout == 'row':
+        # full spectra for as many pixels of a row as fit in nbytes
+        npix = nbytes // (nchan*itemsize)
+        return (1, max(1, min(npts, npix)), nchan)
+    elif layout == 'roi':
+        nch = min(nchan, ROI_CHUNK_NCHAN)
+        npix = min(npts, 256)
+        nrow = min(ROI_CHUNK_NROWS, nbytes // (npix*nch*itemsize))
+        return (max(1, nrow), npix, nch)
+    # area
+    nside = max(1, int(np.sqrt(nbytes/(nchan*itemsize))))
+    return (nside, min(npts, nside), nchan)
+
+def map_compression(compression='gzip', compression_opts=None):
+    """keyword arguments for h5py create_dataset() for a compression preset
+
+    Arguments
+    ---------
+      compression       name of compression, one of MAP_COMPRESSIONS ['gzip']
+      compression_opts  compression level [None -> filter default]
+
+    Returns
+    -------
+      dict of 'compression' and 'compression_opts'
+    """
+    if compression in (None, 'none'):
+        return {}
+    compression = compression.lower()
+    if compression not in MAP_COMPRESSIONS:
+        raise ValueError("unknown map compression '%s': use one of %s" %
+                         (compression, ', '.join(MAP_COMPRESSIONS[:-1])))
+    if compression in PLUGIN_COMPRESSIONS:
+        if not HAS_HDF5PLUGIN:
+            raise ValueError("compression '%s' needs hdf5plugin" % compression)
+        if compression == 'lz4':
+            return dict(hdf5plugin.LZ4())
+        clevel = 5 if compression_opts is None else compression_opts
+        return dict(hdf5plugin.Blosc(cname='lz4', clevel=clevel,
+                                     shuffle=hdf5plugin.Blosc.SHUFFLE))
+    out = {'compression': compression}
+    if compression == 'gzip' and compression_opts is not None:
+        out['compression_opts'] = compression_opts
+    return out
+
+def map_compression_label(compression='gzip', compression_opts=None):
+    "short description of compression preset, as for the 'Compression' attribute"
+    if compression in (None, 'none'):
+        return 'none'
+    label = compression.lower()
+    if label in ('gzip', 'blosc') and compression_opts is not None:
+        label = '%s-%s' % (label, compression_opts)
+    return label
+
+def _is_mca_group(group):
+    dtype = group.attrs.get('type', '')
+    if isinstance(dtype, bytes):
+        dtype = dtype.decode('utf-8')
+    return 'mca' in dtype.lower()
+
+def _copy_attrs(src, dest):
+    for key, val in src.attrs.items():
+        dest.attrs[key] = val
+
+def _copy_rechunked(dset, group, name, chunks, compress_args):
+    "copy a counts array to a new dataset with new chunks and compression"
+    nrows, npts, nchan = dset.shape
+    out = group.create_dataset(name, dset.shape, dset.dtype, chunks=chunks,
+                               maxshape=(None, npts, nchan), **compress_args)
+    _copy_attrs(dset, out)
+    rowsize = npts*nchan*dset.dtype.itemsize
+    step = chunks[0]*max(1, COPY_NBYTES // (chunks[0]*rowsize))
+    for i in range(0, nrows, step):
+        out[i:i+step] = dset[i:i+step]
+    return out
+
+def rechunk_mapfile(filename, output=None, layout='roi', compression='gzip',
+                    compression_opts=None, nbytes=CHUNK_NBYTES, verbose=False):
+    """rewrite the MCA counts arrays of an XRM Map file with a new chunk
+    layout and compression, copying all other data unchanged.
+
+    Arguments
+    ---------
+      filename          name of XRM Map HDF5 file
+      output            name of output file [None -> replace `filename`]
+      layout            chunk layout preset, one of MAP_LAYOUTS ['roi']
+      compression       compression preset, one of MAP_COMPRESSIONS ['gzip']
+      compression_opts  compression level [None]
+      nbytes            target chunk size in bytes [1 MB]
+      verbose           whether to print progress [False]
+
+    Returns
+    -------
+      name of the rechunked file
+
+    Notes
+    -----
+      This is meant to be run offline, on a map file that is not open
+      for writing, typically after the map has been fully processed.
+      With `output=None`, the new file is written next to `filename`
+      and replaces it only once it is complete.
+    """
+    src = Path(filename).absolute()
+    if output is None:
+        dest = src.with_name('%s_rechunk.tmp' % src.name)
+    else:
+        dest = Path(output).absolute()
+    if dest == src:
+        raise ValueError("rechunk_mapfile: output must differ from input file")
+
+    compress_args = map_compression(compression, compression_opts)
+    label = map_compression_label(compression, compression_opts)
+
+    def copy_group(gin, gout, is_mca=False):
+        _copy_attrs(gin, gout)
+        if 'Compression' in gin.attrs:
+            gout.attrs['Compression'] = label
+            gout.attrs['Chunk_Layout'] = layout
+        for name, obj in gin.items():
+            if isinstance(obj, h5py.Group):
+                copy_group(obj, gout.create_group(name), _is_mca_group(obj))
+            elif is_mca and name == 'counts' and obj.ndim == 3:
+                chunks = map_chunksize(layout, obj.shape[1], obj.shape[2],
+                                       itemsize=obj.dtype.itemsize,
+                                       nbytes=nbytes)
+                t0 = time.time()
+                _copy_rechunked(obj, gout, name, chunks, compress_args)
+                if verbose:
+                    print("rechunked %s %s -> %s (%.2f sec)" %
+                          (obj.name, obj.chunks, chunks, time.time()-t0))
+            else:
+                gin.copy(obj, gout, name=name)
+
+    try:
+        with h5py.File(src, 'r') as fin, h5py.File(dest, 'w') as fout:
+            copy_group(fin, fout)
+    except:
+        if dest.exists():
+            dest.unlink()
+        raise
+    if output is None:
+        os.replace(dest, src)
+        dest = src
+    return dest.as_posix()
+
+def _find_counts(h5file, det=None):
+    "find a detector counts array in an XRM Map file"
+    root = None
+    for rname in ('xrmmap', 'xrfmap'):
+        if rname in h5file:
+            root = h5file[rname]
+    if root is None:
+        raise ValueError("%s is not an XRM Map file" % h5file.filename)
+    if det is None:
+        for dname in ('mcasum', 'detsum', 'mca1', 'det1'):
+            if dname in root and 'counts' in root[dname]:
+                det = dname
+                break
+    if det is None or det not in root or 'counts' not in root[det]:
+        raise ValueError("no counts for detector '%s' in %s" % (det, h5file.filename))
+    return root[det]['counts']
+
+def benchmark_map_layouts(filename, det=None, layouts=MAP_LAYOUTS,
+                          compressions=('gzip', 'lzf', 'blosc'), nrows=None,
+                          npixels=50, roi_nchan=None, workdir=None,
+                          verbose=True):
+    """benchmark chunk layout and compression presets using the counts
+    array of a real XRM Map file.
+
+    For each combination of layout and compression, the counts are
+    written row-by-row to a temporary file, then read back as
+    per-pixel spectra, as a ROI map, and as the spectrum summed over
+    a rectangle covering the center of the map.
+
+    Arguments
+    ---------
+      filename      name of XRM Map HDF5 file
+      det           detector name [None -> first of mcasum, detsum, mca1, det1]
+      layouts       layout presets to test [all of MAP_LAYOUTS]
+      compressions  compression presets to test [('gzip', 'lzf', 'blosc')]
+      nrows         number of rows of the map to use [None -> all]
+      npixels       number of random pixel spectra to read [50]
+      roi_nchan     number of channels for ROI map [None -> nchan/32]
+      workdir       folder for temporary files [None -> system temp folder]
+      verbose       whether to print a table of results [True]
+
+    Returns
+    -------
+      list of dicts with keys 'layout', 'compression', 'chunks', 'size'
+      (file size in MB), and times in seconds for 'write', 'pixel',
+      'roi', and 'area'.
+
+    Notes
+    -----
+      Read times are for a freshly opened file, but the operating system
+      may still be caching the file, so that these mostly measure the
+      cost of decompression and chunk overhead, not disk reads.
+    """
+    with h5py.File(filename, 'r') as fin:
+        counts = _find_counts(fin, det=det)
+        if nrows is None:
+            nrows = counts.shape[0]
+        data = counts[:nrows]
+    nrows, npts, nchan = data.shape
+
+    rng = np.random.default_rng(0)
+    pix_iy = rng.integers(0, nrows, npixels)
+    pix_ix = rng.integers(0, npts, npixels)
+    if roi_nchan is None:
+        roi_nchan = max(1, nchan//32)
+    cmax = int(np.argmax(data.sum(axis=(0, 1))))
+    c1 = max(0, min(nchan-roi_nchan, cmax - roi_nchan//2))
+    c2 = c1 + roi_nchan
+    y1, y2 = nrows//4, max(nrows//4+1, (3*nrows)//4)
+    x1, x2 = npts//4, max(npts//4+1, (3*npts)//4)
+
+    tmpdir = Path(mkdtemp(prefix='xrmmap_bench', dir=workdir))
+    results = []
+    try:
+        for compression in compressions:
+            compress_args = map_compression(compression)
+            for layout in layouts:
+                chunks = map_chunksize(layout, npts, nchan,
+                                       itemsize=data.dtype.itemsize)
+                fname = Path(tmpdir, 'bench_%s_%s.h5' % (layout, compression))
+                t0 = time.time()
+                with h5py.File(fname, 'w') as fout:
+                    dset = fout.create_dataset('counts', (nrows, npts, nchan),
+                                               data.dtype, chunks=chunks,
+                                               maxshape=(None, npts, nchan),
+                                               **compress_args)
+                    for irow in range(nrows):
+                        dset[irow] = data[irow]
+                        fout.flush()
+                twrite = time.time() - t0
+                out = {'layout': layout,
+                       'compression': map_compression_label(compression),
+                       'chunks': chunks, 'write': twrite,
+                       'size': os.stat(fname).st_size/(1024*1024)}
+
+                with h5py.File(fname, 'r') as fin:
+                    dset = fin['counts']
+                    t0 = time.time()
+                    for iy, ix in zip(pix_iy, pix_ix):
+                        dset[iy, ix, :]
+                    out['pixel'] = time.time() - t0
+                    t0 = time.time()
+                    dset[:, :, c1:c2].sum(axis=2)
+                    out['roi'] = time.time() - t0
+                    t0 = time.time()
+                    dset[y1:y2, x1:x2, :].sum(axis=(0, 1))
+                    out['area'] = time.time() - t0
+                fname.unlink()
+                results.append(out)
+    finally:
+        for fname in tmpdir.glob('*'):
+            fname.unlink()
+        tmpdir.rmdir()
+
+    if verbose:
+        print("map (%d, %d, %d), %d pixel spectra, ROI channels [%d:%d]" %
+              (nrows, npts, nchan, npixels, c1, c2))
+        print("%-8s %-10s %-18s %9s %9s %9s %9s %9s" %
+              ('layout', 'compress', 'chunks', 'size(MB)', 'write(s)',
+               'pixel(s)', 'roi(s)', 'area(s)'))
+        for r in results:
+            print("%-8s %-10s %-18s %9.2f %9.3f %9.3f %9.3f %9.3f" %
+                  (r['layout'], r['compression'], repr(r['chunks']), r['size'],
+                   r['write'], r['pixel'], r['roi'], r['area']))
+    return results
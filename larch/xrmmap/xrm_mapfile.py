@@ -9,7 +9,9 @@ import scipy.stats as stats
 from scipy.interpolate import interp1d
 import json
 import multiprocessing as mp
-from functools import partial
+from collections import deque
+from concurrent.futures import (ThreadPoolExecutor, ProcessPoolExecutor,
+                                Future, wait, FIRST_COMPLETED)
 
 from pyshortcuts import fix_varname, fix_filename, bytes2str, debugtimer
 
@@ -30,6 +32,8 @@ from .asciifiles import (readASCII, readMasterFile, readROIFile,
 
 from .gsexrm_utils import (GSEXRM_MCADetector, GSEXRM_Area, GSEXRM_Exception,
                            GSEXRM_MapRow, GSEXRM_FileStatus, toggle_winfile)
+from .h5layout import (map_chunksize, map_compression, map_compression_label,
+                       PLUGIN_COMPRESSIONS)
 
 
 DEFAULT_XRAY_ENERGY = 39987.0  # probably means x-ray energy was not found in meta data
@@ -43,6 +47,9 @@ EXTRA_DETGROUPS =  ('scalars', 'work', 'xrd1d', 'xrd2d')
 NOT_OWNER = "Not Owner of HDF5 file %s"
 READ_ONLY = "HDF5 file %s is open read-only"
 QSTEPS = 2048
+CUMSUM_NAME = 'counts_cumsum'
+CUMSUM_BINSIZE = 1
+CUMSUM_NBYTES = 64*1024*1024
 
 H5ATTRS = {'Type': 'XRM 2D Map',
            'Version': '2.1.0',
@@ -56,7 +63,8 @@ H5ATTRS = {'Type': 'XRM 2D Map',
            'Dimension': 2,
            'Process_Machine': '',
            'Process_ID': 0,
-           'Compression': ''}
+           'Compression': '',
+           'Chunk_Layout': ''}
 
 def h5str(obj):
     '''strings stored in an HDF5 from Python3 use bytes, encoded with utf-8'''
@@ -113,6 +121,10 @@ def test_h5group(group, folder=None):
     return status, vers
 
 
+def _read_maprow(kws):
+    "read a row of raw map data, as in a worker for GSEXRM_MapFile.process()"
+    return GSEXRM_MapRow(**kws)
+
 def create_xrmmap(h5root, root=None, dimension=2, folder='', start_time=None):
     '''creates a skeleton '/xrmmap' group in an open HDF5 file
 
@@ -198,6 +210,104 @@ def remove_zigzag(map, zigzag=0):
             tmp[i, zigzag:]  = map[i, :-zigzag]
     return tmp
 
+def mca_cumsum(counts, dtype=None):
+    """cumulative sum of MCA counts over channels (the last axis), with
+    a leading 0, so that the sum over channels [c1:c2] for all spectra
+    is csum[..., c2] - csum[..., c1].  The default dtype is uint64 for
+    unsigned integer counts, so that sums are exact, and float64 otherwise."""
+    if dtype is None:
+        dtype = np.uint64 if np.dtype(counts.dtype).kind == 'u' else np.float64
+    shape = counts.shape[:-1] + (counts.shape[-1]+1,)
+    csum = np.zeros(shape, dtype=dtype)
+    np.cumsum(counts, axis=-1, dtype=dtype, out=csum[..., 1:])
+    return csum
+
+def cumsum_edges(nchan, binsize=CUMSUM_BINSIZE):
+    "channels at which cumulative sums are stored: every binsize channels and nchan"
+    return np.append(np.arange(0, nchan, binsize), nchan)
+
+def cumsum_dtype(counts_dtype):
+    """data type for stored cumulative sums of counts: unsigned integer counts
+    use uint32, wrapping on overflow, which still gives exact differences for
+    any range with fewer than 2**32 counts"""
+    counts_dtype = np.dtype(counts_dtype)
+    if counts_dtype.kind == 'u' and counts_dtype.itemsize <= 4:
+        return np.dtype(np.uint32)
+    return np.dtype(np.float64)
+
+def cumsum_at_edges(counts, edges, dtype, csum=None):
+    """cumulative sums over channels of counts at channel edges, as stored.
+    csum, if given, is mca_cumsum(counts), which is then not recomputed"""
+    dtype = np.dtype(dtype)
+    if csum is None:
+        csum = mca_cumsum(counts, dtype=np.uint64 if dtype.kind == 'u' else None)
+    return csum[..., edges].astype(dtype, copy=False)
+
+def update_cumsum(group, irow, counts, csum=None):
+    """update the channel cumulative sums of a detector group, if present,
+    for a newly added row of counts, or of its cumulative sum csum from
+    mca_cumsum().  Rows past the last valid row are skipped, and left for
+    GSEXRM_MapFile.build_mca_cumsum()"""
+    if CUMSUM_NAME not in group:
+        return
+    dset = group[CUMSUM_NAME]
+    nvalid = int(dset.attrs['nrows'])
+    if irow > nvalid:
+        return
+    if irow >= dset.shape[0]:
+        dset.resize((irow+1,) + dset.shape[1:])
+    if csum is None:
+        npts, nchan = counts.shape
+    else:
+        npts, nchan = csum.shape[0], csum.shape[1]-1
+    edges = cumsum_edges(group['counts'].shape[2], int(dset.attrs['binsize']))
+    dset[irow, :npts, :] = cumsum_at_edges(counts, np.minimum(edges, nchan),
+                                           dset.dtype, csum=csum)
+    dset.attrs['nrows'] = max(nvalid, irow+1)
+
+def resize_cumsum(group, nrow):
+    "resize the channel cumulative sums of a detector group, if present"
+    if CUMSUM_NAME in group:
+        dset = group[CUMSUM_NAME]
+        dset.resize((nrow,) + dset.shape[1:])
+        dset.attrs['nrows'] = min(nrow, int(dset.attrs['nrows']))
+
+def calc_roi_sums(counts, dtfactor, limits, csum=None):
+    """raw and deadtime-corrected ROI sums for all ROIs and MCAs at once
+
+    Arguments
+    ---------
+      counts    MCA counts, shape (nmca, ..., nchan), as for one row (nmca, npts, nchan)
+      dtfactor  deadtime correction factors, shape (nmca, ...)
+      limits    ROI channel limits [c1, c2), shape (nroi, nmca, 2)
+      csum      mca_cumsum(counts), if already computed [None]
+
+    Returns
+    -------
+      raw, cor: ROI sums, each with shape (nroi, nmca, ...)
+
+    Notes
+    -----
+    Without csum, the cumulative sums are found only at the ROI edge
+    channels, from the sums between successive edges.
+    """
+    nchan = (csum.shape[-1] - 1) if csum is not None else counts.shape[-1]
+    limits = np.clip(np.asarray(limits, dtype=int), 0, nchan)
+    lo, hi = limits[..., 0], np.maximum(limits[..., 0], limits[..., 1])
+    if csum is None:
+        edges = np.unique(np.concatenate(([0], lo.ravel(), hi.ravel())))
+        edges = edges[edges < nchan]
+        dtype = np.uint64 if np.dtype(counts.dtype).kind == 'u' else np.float64
+        csum = np.zeros(counts.shape[:-1] + (len(edges)+1,), dtype=dtype)
+        np.cumsum(np.add.reduceat(counts, edges, axis=-1, dtype=dtype),
+                  axis=-1, out=csum[..., 1:])
+        edges = np.append(edges, nchan)
+        lo, hi = np.searchsorted(edges, lo), np.searchsorted(edges, hi)
+    csum = np.moveaxis(csum, -1, 1)
+    imca = np.arange(csum.shape[0])[None, :]
+    raw = (csum[imca, hi] - csum[imca, lo]).astype(np.float64)
+    return raw, raw*np.asarray(dtfactor)[None]
+
 
 class GSEXRM_MapFile(object):
     '''
@@ -239,7 +349,7 @@ class GSEXRM_MapFile(object):
 
     def __init__(self, filename=None, folder=None, create_empty=False,
                  hotcols=False, zigzag=0, dtcorrect=True, root=None,
-                 chunksize=None, xrdcal=None, xrd2dmask=None, xrd2dbkgd=None,
+                 chunksize=None, layout=None, xrdcal=None, xrd2dmask=None, xrd2dbkgd=None,
                  xrd1dbkgd=None, azwdgs=0, qstps=QSTEPS, flip=True,
                  bkgdscale=1., has_xrf=True, has_xrd1d=False, has_xrd2d=False,
                  compression=COMPRESSION, compression_opts=COMPRESSION_OPTS,
@@ -249,6 +359,7 @@ class GSEXRM_MapFile(object):
         self.folder        = folder
         self.root          = root
         self.chunksize     = chunksize
+        self.layout        = layout
         # whether to remove first and last columns from data
         self.hotcols       = hotcols
         # whether to shift rows to fix zig-zag
@@ -275,9 +386,13 @@ class GSEXRM_MapFile(object):
         self.detector_list = None
         self.mca_energies = None
         self.calib = None
-        self.compress_args = {'compression': compression}
-        if compression != 'lzf':
-            self.compress_args['compression_opts'] = compression_opts
+        self.compress_args = map_compression(compression, compression_opts)
+        self.compress_label = map_compression_label(compression, compression_opts)
+        # MCA counts arrays use the selected compression, but the hdf5plugin
+        # filters are not safe for the small string and scalar datasets
+        self.counts_compress_args = self.compress_args
+        if compression in PLUGIN_COMPRESSIONS:
+            self.compress_args = map_compression(COMPRESSION, COMPRESSION_OPTS)
 
         self.incident_energy = None
         self.has_xrf       = has_xrf
@@ -700,10 +815,7 @@ class GSEXRM_MapFile(object):
         self.add_data(group['environ'], 'address', strlist(env_addr))
         self.add_data(group['environ'], 'value',   strlist(env_val))
 
-        cmprstr = '%s' % self.compress_args['compression']
-        if self.compress_args['compression'] != 'lzf':
-            cmprstr = '%s-%s' % (cmprstr,self.compress_args['compression_opts'])
-        self.xrmmap.attrs['Compression'] = cmprstr
+        self.xrmmap.attrs['Compression'] = self.compress_label
 
         self.h5root.flush()
 
@@ -733,21 +845,34 @@ class GSEXRM_MapFile(object):
         self.last_row = -1
         self.add_map_config(self.mapconf)
 
+        nrows_expected = len(self.rowdata)
+        if self.nrows_expected is not None:
+            nrows_expected = max(nrows_expected, self.nrows_expected)
         self.process_row(0, flush=True, callback=None,
-                         nrows_expected=len(self.rowdata))
+                         nrows_expected=nrows_expected)
 
         self.status = GSEXRM_FileStatus.hasdata
 
     def process_row(self, irow, flush=False, complete=False, offset=None,
                     nrows_expected=None, callback=None):
         row = self.read_rowdata(irow, offset=offset)
+        self.store_row(irow, row, flush=flush, complete=complete,
+                       nrows_expected=nrows_expected, callback=callback)
+
+    def store_row(self, irow, row, flush=False, complete=False,
+                  nrows_expected=None, callback=None):
+        """add a GSEXRM_MapRow, as read with read_rowdata(), to the file.
+        Rows must be added in order."""
         if irow == 0:
+            # the map has XRF and XRD data if its first row does
+            self.has_xrf = row.has_xrf
+            self.has_xrd1d, self.has_xrd2d = row.has_xrd1d, row.has_xrd2d
             nmca, nchan = 0, 2048
             if row.counts is not None:
                 nmca, xnpts, nchan = row.counts.shape
             xrd2d_shape = None
             if row.xrd2d is not None:
-                xrd2d_shape = rows.xrd2d.shape
+                xrd2d_shape = row.xrd2d.shape
             self.build_schema(row.npts, nmca=nmca, nchan=nchan,
                               scaler_names=row.scaler_names,
                               scaler_addrs=row.scaler_addrs,
@@ -768,8 +893,58 @@ class GSEXRM_MapFile(object):
 
 
     def process(self, maxrow=None, force=False, callback=None, offset=None,
-                force_no_dtc=False, all_mcas=None):
-        "look for more data from raw folder, process if needed"
+                force_no_dtc=False, all_mcas=None, executor=None,
+                max_workers=None, queue_depth=None):
+        """look for more data from raw folder, process if needed
+
+        Arguments
+        ---------
+          maxrow        maximum number of rows to process [None, for all]
+          force         whether to re-read master file and process [False]
+          callback      function called with progress information [None]
+          offset        offset of pixels in rows [None]
+          force_no_dtc  whether to ignore deadtime data [False]
+          all_mcas      whether to save all MCA spectra [None, use current]
+          executor      None, 'threads', or 'processes' to read rows with a
+                        pool of workers [None, read each row in turn]
+          max_workers   maximum number of workers for executor [cpu count]
+          queue_depth   maximum number of rows read ahead of the row being
+                        written [2*max_workers]
+
+        Notes
+        -----
+          With executor, rows are read from the raw data files (XRF, XRD,
+          scalers, positions) by workers, ahead of the row being written.
+          A single writer adds rows to the HDF5 file in order, so that reading
+          and writing overlap.
+        """
+        rows = self.rows_to_process(maxrow=maxrow, force=force,
+                                    callback=callback,
+                                    force_no_dtc=force_no_dtc,
+                                    all_mcas=all_mcas)
+        if rows is not None:
+            irow, nrows = rows
+            if executor is None or nrows - irow < 2:
+                while irow < nrows:
+                    flush = irow < 2 or (irow % 64 == 0)
+                    complete = irow >= nrows-1
+                    self.process_row(irow, flush=flush, offset=offset,
+                                     complete=complete, callback=callback)
+                    irow  = irow + 1
+            else:
+                self._process_rows_pooled(irow, nrows, offset=offset,
+                                          callback=callback,
+                                          executor=executor,
+                                          max_workers=max_workers,
+                                          queue_depth=queue_depth)
+            if callable(callback):
+                callback(filename=self.filename, status='complete')
+
+    def rows_to_process(self, maxrow=None, force=False, callback=None,
+                        force_no_dtc=False, all_mcas=None):
+        """prepare to process more data from the raw folder, initializing
+        the map file if needed, and return (first_row, nrows) for the rows to
+        process, or None if there is no new data.  See process()."""
         self.force_no_dtc = force_no_dtc
         if all_mcas is not None:
             self.all_mcas = all_mcas
@@ -791,52 +966,116 @@ class GSEXRM_MapFile(object):
             nrows = min(nrows, maxrow)
 
         if force or self.folder_has_newdata():
-            irow = self.last_row + 1
-            while irow < nrows:
-                flush = irow < 2 or (irow % 64 == 0)
-                complete = irow >= nrows-1
-                self.process_row(irow, flush=flush, offset=offset,
-                                 complete=complete, callback=callback)
-                irow  = irow + 1
-            if callable(callback):
-                callback(filename=self.filename, status='complete')
+            return self.last_row + 1, nrows
+        return None
 
+    def _process_rows_pooled(self, irow, nrows, offset=None, callback=None,
+                             executor='threads', max_workers=None,
+                             queue_depth=None):
+        """process rows irow to nrows-1, reading rows with a pool of workers
+        and writing them in order"""
+        executor = executor.lower()
+        if executor.startswith('thread'):
+            pool_class = ThreadPoolExecutor
+        elif executor.startswith('proc'):
+            pool_class = ProcessPoolExecutor
+        else:
+            raise ValueError("executor must be 'threads' or 'processes'")
+        if max_workers is None:
+            max_workers = mp.cpu_count()
+        max_workers = max(1, max_workers)
+        if queue_depth is None:
+            queue_depth = 2*max_workers
+        queue_depth = max(1, queue_depth)
+
+        pending = deque()
+        nextrow = irow
+        with pool_class(max_workers=max_workers) as pool:
+            try:
+                while irow < nrows:
+                    # keep up to queue_depth rows being read ahead
+                    while nextrow < nrows and len(pending) < queue_depth:
+                        kws = self.maprow_args(nextrow, offset=offset)
+                        if kws is None:
+                            nrows = nextrow
+                            break
+                        pending.append(pool.submit(_read_maprow, kws))
+                        nextrow += 1
+                    if len(pending) == 0:
+                        break
+                    row = pending.popleft().result()
+                    flush = irow < 2 or (irow % 64 == 0)
+                    complete = irow >= nrows-1
+                    self.store_row(irow, row, flush=flush, complete=complete,
+                                   callback=callback)
+                    irow  = irow + 1
+            finally:
+                for fut in pending:
+                    fut.cancel()
 
     def set_roidata(self, row_start=0, row_end=None):
+        """recompute the ROI maps in 'roimap/<det>/<roi>' for all ROIs
+        and MCA detectors, for rows row_start to row_end [last row].
+
+        The counts for each detector are read once per chunk of rows, and
+        all ROIs are summed from their cumulative sum over channels.
+        """
         if row_end is None:
             row_end = self.last_row
+        nrows = row_end + 1
 
-        # print("Process ROIs for rows %d to %d " % (row_start+1, row_end+1))
-        rows = slice(row_start, row_end+1)
         roigrp = self.xrmmap['roimap']
         conf = self.xrmmap['config']
         roi_names = [h5str(s) for s in conf['rois/name']]
         roi_limits = conf['rois/limits'][()]
-        # print("roi names ", roi_names, roi_limits)
-
-        for roiname, lims in zip(roi_names, roi_limits):
-            # dt = debugtimer()
-            roi_slice = lims[0]
-            # dt.add('get slice')
-            sumraw = roigrp['mcasum'][roiname]['raw'][rows,]
-            sumcor = roigrp['mcasum'][roiname]['cor'][rows,]
-            # dt.add('get sum cor')
-
-            for detname in self.mca_dets:
-                mcaraw = self.xrmmap[detname]['counts'][rows,:,roi_slice].sum(axis=2)
-                # dt.add(" mcaraw %s " % detname)
-                mcacor = mcaraw*self.xrmmap[detname]['dtfactor'][rows,:]
-                # dt.add(" mcacor %s " % detname)
-                roigrp[detname][roiname]['raw'][rows,] = mcaraw
-                roigrp[detname][roiname]['cor'][rows,] = mcacor
-                # dt.add(" set roigrps for %s " % detname)
-                sumraw += mcaraw
-                sumcor += mcacor
-                # dt.add(" sum  %s " % detname)
-            #dt.show()
-
-            roigrp['mcasum'][roiname]['raw'][rows,] = sumraw
-            roigrp['mcasum'][roiname]['cor'][rows,] = sumcor
+        if len(roi_names) < 1 or nrows <= row_start:
+            return
+
+        mca_dets = []
+        for gname in sorted(self.xrmmap.keys()):
+            g = self.xrmmap[gname]
+            if bytes2str(g.attrs.get('type', '')).startswith('mca detect'):
+                mca_dets.append(gname)
+        # without separate MCAs, the ROIs are summed from mcasum
+        sum_only = len(mca_dets) == 0
+        if sum_only:
+            mca_dets = ['mcasum']
+
+        roi_dsets = {}
+        for detname in mca_dets + ['mcasum']:
+            for roiname in roi_names:
+                if roiname not in roigrp[detname]:
+                    continue
+                for aname in ('raw', 'cor'):
+                    dset = roigrp[detname][roiname][aname]
+                    if dset.shape[0] < nrows:
+                        dset.resize((nrows, dset.shape[1]))
+                    roi_dsets[(detname, roiname, aname)] = dset
+
+        def save(detname, rows, raw, cor):
+            for iroi, roiname in enumerate(roi_names):
+                if (detname, roiname, 'raw') in roi_dsets:
+                    npts = min(raw.shape[-1], roi_dsets[(detname, roiname, 'raw')].shape[1])
+                    roi_dsets[(detname, roiname, 'raw')][rows, :npts] = raw[iroi, :, :npts]
+                    roi_dsets[(detname, roiname, 'cor')][rows, :npts] = cor[iroi, :, :npts]
+
+        counts = self.xrmmap[mca_dets[0]]['counts']
+        step = counts.chunks[0] if counts.chunks is not None else 1
+        for r0 in range(row_start, nrows, step):
+            rows = slice(r0, min(r0+step, nrows))
+            sumraw = sumcor = 0.0
+            for imca, detname in enumerate(mca_dets):
+                dgrp = self.xrmmap[detname]
+                lims = roi_limits[:, min(imca, roi_limits.shape[1]-1)]
+                raw, cor = calc_roi_sums(dgrp['counts'][rows][None],
+                                         dgrp['dtfactor'][rows][None],
+                                         lims[:, None, :])
+                raw, cor = raw[:, 0], cor[:, 0]
+                if not sum_only:
+                    save(detname, rows, raw, cor)
+                sumraw = sumraw + raw
+                sumcor = sumcor + cor
+            save('mcasum', rows, sumraw, sumcor)
         self.h5root.flush()
 
     def calc_pixeltime(self):
@@ -860,6 +1099,19 @@ class GSEXRM_MapFile(object):
         '''read a row worth of raw data from the Map Folder
         returns arrays of data
         '''
+        kws = self.maprow_args(irow, offset=offset, auto_reverse=auto_reverse)
+        if kws is None:
+            return
+        return GSEXRM_MapRow(**kws)
+
+    def maprow_args(self, irow, offset=None, auto_reverse=True):
+        '''keyword arguments for GSEXRM_MapRow to read a row of raw data
+        from the Map Folder, or None if the row is not available.
+        This updates the map file, so must be called in row order.
+        Whether the row has XRF and XRD data is set for the row itself,
+        without changing the map file, as rows may be read ahead of the
+        rows being written.
+        '''
         if self.dimension is None or irow > len(self.rowdata):
             self.read_master()
 
@@ -897,18 +1149,16 @@ class GSEXRM_MapFile(object):
             yval, xrff, sisf, xpsf, etime = self.rowdata[irow]
             xrdf = '_unused_'
 
+        has_xrf = self.has_xrf and '_unused_' not in xrff
+        has_xrd1d, has_xrd2d = self.has_xrd1d, self.has_xrd2d
         if '_unused_' in xrdf:
-            self.has_xrd1d = False
-            self.has_xrd2d = False
+            has_xrd1d = has_xrd2d = False
 
         # eiger XRD maps with 1D data
         if (xrdf.startswith('eig') and xrdf.endswith('.h5') or
             xrdf.startswith('pexrd')):
-            self.has_xrd2d = False
-            self.has_xrd1d = True
-
-        if '_unused_' in xrff:
-            self.has_xrf = False
+            has_xrd2d = False
+            has_xrd1d = True
 
         ioffset = 0
         if scan_version > 1.35:
@@ -917,21 +1167,20 @@ class GSEXRM_MapFile(object):
             reverse = False
         if offset is not None:
             ioffset = offset
-        self.has_xrf = self.has_xrf and xrff != '_unused_'
-        return GSEXRM_MapRow(yval, xrff, xrdf, xpsf, sisf, self.folder,
-                             irow=irow, nrows_expected=self.nrows_expected,
-                             ixaddr=0, dimension=self.dimension,
-                             npts=self.npts,
-                             auto_reverse=auto_reverse,
-                             ioffset=ioffset,
-                             force_no_dtc=self.force_no_dtc,
-                             masterfile=self.masterfile, flip=self.flip,
-                             xrdcal=self.xrdcalfile,
-                             xrd2dmask=self.mask_xrd2d,
-                             xrd2dbkgd=self.bkgd_xrd2d, wdg=self.azwdgs,
-                             steps=self.qstps, has_xrf=self.has_xrf,
-                             has_xrd2d=self.has_xrd2d,
-                             has_xrd1d=self.has_xrd1d)
+        return dict(yvalue=yval, xrffile=xrff, xrdfile=xrdf, xpsfile=xpsf,
+                    sisfile=sisf, folder=self.folder,
+                    irow=irow, nrows_expected=self.nrows_expected,
+                    ixaddr=0, dimension=self.dimension,
+                    npts=self.npts,
+                    auto_reverse=auto_reverse,
+                    ioffset=ioffset,
+                    force_no_dtc=self.force_no_dtc,
+                    masterfile=self.masterfile, flip=self.flip,
+                    xrdcal=self.xrdcalfile,
+                    xrd2dmask=self.mask_xrd2d,
+                    xrd2dbkgd=self.bkgd_xrd2d, wdg=self.azwdgs,
+                    steps=self.qstps, has_xrf=has_xrf,
+                    has_xrd2d=has_xrd2d, has_xrd1d=has_xrd1d)
 
 
     def add_rowdata(self, row, callback=None, flush=True):
@@ -946,10 +1195,15 @@ class GSEXRM_MapFile(object):
         if hasattr(callback, '__call__'):
             callback(row=(thisrow+1), maxrow=len(self.rowdata), filename=self.filename)
 
+        # each row says whether it has XRF and XRD data, and may have been
+        # read before earlier rows were added
+        has_xrf = self.has_xrf and row.has_xrf
+        has_xrd1d = self.has_xrd1d and row.has_xrd1d
+        has_xrd2d = self.has_xrd2d and row.has_xrd2d
         pform = 'Add row %4i, yval=%s' % (thisrow+1, row.yvalue)
-        if self.has_xrf:
+        if has_xrf:
             pform = '%s, xrffile=%s' % (pform, row.xrffile)
-        if self.has_xrd2d or self.has_xrd1d:
+        if has_xrd2d or has_xrd1d:
             pform = '%s, xrdfile=%s' % (pform, row.xrdfile)
         print(pform)
 
@@ -976,7 +1230,7 @@ class GSEXRM_MapFile(object):
             for ai, aname in enumerate(row.scaler_names):
                 sclrgrp[aname][thisrow,  :npts] = row.sisdata[:npts].transpose()[ai]
             dt.add(" add scaler group")
-            if self.has_xrf:
+            if has_xrf:
                 npts = min([len(p) for p in row.posvals])
                 pos    = self.xrmmap['positions/pos']
                 rowpos = np.array([p[:npts] for p in row.posvals])
@@ -1016,11 +1270,19 @@ class GSEXRM_MapFile(object):
                 _nr, npts, nchan = self.xrmmap['mcasum']['counts'].shape
 
                 npts = min(npts, xnpts, self.npts)
+                # channel cumulative sums of the row, only if stored for
+                # any detector, then also used for ROI sums
+                row_csum = None
+                if self.all_mcas and any(CUMSUM_NAME in self.xrmmap[gname]
+                                         for gname in mca_dets):
+                    row_csum = mca_cumsum(row.counts[:, :npts, :])
                 dt.add(" map xrf 3")
                 if self.all_mcas:
                     for idet, gname in enumerate(mca_dets):
                         grp = self.xrmmap[gname]
                         grp['counts'][thisrow, :npts, :] = row.counts[idet, :npts, :]
+                        if row_csum is not None:
+                            update_cumsum(grp, thisrow, None, csum=row_csum[idet])
                         grp['dtfactor'][thisrow,  :npts] = row.dtfactor[idet, :npts]
                         grp['realtime'][thisrow,  :npts] = row.realtime[idet, :npts]
                         grp['livetime'][thisrow,  :npts] = row.livetime[idet, :npts]
@@ -1047,6 +1309,7 @@ class GSEXRM_MapFile(object):
                 ensum  = sumgrp['energy']
                 if self.mca_energies is None:
                     sumgrp['counts'][thisrow, :npts, :nchan] = row.total[:npts, :nchan]
+                    update_cumsum(sumgrp, thisrow, row.total[:npts, :nchan])
                 else:
                     sumx = row.counts[0, :npts, :nchan]*0.0
                     for i in range(self.nmca):
@@ -1054,6 +1317,7 @@ class GSEXRM_MapFile(object):
                         sumx += interp1d(en, row.counts[i], kind='linear', fill_value=0,
                                          copy=False, bounds_error=False)(ensum)
                     sumgrp['counts'][thisrow, :npts, :nchan] = sumx
+                    update_cumsum(sumgrp, thisrow, sumx)
 
                 dt.add(" map xrf 4b: set counts")
                 sumgrp['realtime'][thisrow,  :npts] = realtime
@@ -1084,15 +1348,16 @@ class GSEXRM_MapFile(object):
                                        lims[iroi, i, 1]) for i in range(nmca)]
                             self.roi_slices.append(x)
 
-                    for slices in self.roi_slices:
-                        iraw = [row.counts[i, :npts, slices[i]].sum(axis=1)
-                                for i in range(nmca)]
-                        icor = [row.counts[i, :npts, slices[i]].sum(axis=1)*row.dtfactor[i, :npts]
-                                for i in range(nmca)]
-                        detraw.extend(iraw)
-                        detcor.extend(icor)
-                        sumraw.append(np.array(iraw).sum(axis=0))
-                        sumcor.append(np.array(icor).sum(axis=0))
+                    lims = np.array([[(s.start, s.stop) for s in slices]
+                                     for slices in self.roi_slices], dtype=int)
+                    lims = lims.reshape((len(self.roi_slices), nmca, 2))
+                    iraw, icor = calc_roi_sums(row.counts[:, :npts, :],
+                                               row.dtfactor[:, :npts], lims,
+                                               csum=row_csum)
+                    detraw.extend(iraw.reshape((-1, npts)))
+                    detcor.extend(icor.reshape((-1, npts)))
+                    sumraw.extend(iraw.sum(axis=1))
+                    sumcor.extend(icor.sum(axis=1))
                     dt.add(" map xrf 5a: got simple  ROIS")
                     det_raw[thisrow, :npts, :] = np.array(detraw).transpose()
                     det_cor[thisrow, :npts, :] = np.array(detcor).transpose()
@@ -1103,21 +1368,24 @@ class GSEXRM_MapFile(object):
                 else: # version 2.0
                     roigrp = self.xrmmap['roimap']
                     en  = self.xrmmap['mcasum']['energy'][:]
-                    for roiname in roigrp['mcasum'].keys():
+                    roi_names = list(roigrp['mcasum'].keys())
+                    lims = []
+                    for roiname in roi_names:
                         en_lim = roigrp['mcasum'][roiname]['limits'][:]
-                        roi_slice = slice(np.abs(en-en_lim[0]).argmin(),
-                                          np.abs(en-en_lim[1]).argmin())
-                        sumraw = roigrp['mcasum'][roiname]['raw'][thisrow,]
-                        sumcor = roigrp['mcasum'][roiname]['cor'][thisrow,]
-                        for detname in mca_dets:
-                            mcaraw = self.xrmmap[detname]['counts'][thisrow,][:,roi_slice].sum(axis=1)
-                            mcacor = mcaraw*self.xrmmap[detname]['dtfactor'][thisrow,]
-                            roigrp[detname][roiname]['raw'][thisrow,] = mcaraw
-                            roigrp[detname][roiname]['cor'][thisrow,] = mcacor
-                            sumraw += mcaraw
-                            sumcor += mcacor
-                        roigrp['mcasum'][roiname]['raw'][thisrow,] = sumraw
-                        roigrp['mcasum'][roiname]['cor'][thisrow,] = sumcor
+                        lims.append([np.abs(en-en_lim[0]).argmin(),
+                                     np.abs(en-en_lim[1]).argmin()])
+                    ndet = len(mca_dets)
+                    if ndet > 0 and len(roi_names) > 0:
+                        lims = np.array(lims, dtype=int)[:, None, :].repeat(ndet, axis=1)
+                        iraw, icor = calc_roi_sums(row.counts[:ndet, :npts, :],
+                                                   row.dtfactor[:ndet, :npts], lims,
+                                                   csum=None if row_csum is None else row_csum[:ndet])
+                        for iroi, roiname in enumerate(roi_names):
+                            for idet, detname in enumerate(mca_dets):
+                                roigrp[detname][roiname]['raw'][thisrow, :npts] = iraw[iroi, idet]
+                                roigrp[detname][roiname]['cor'][thisrow, :npts] = icor[iroi, idet]
+                            roigrp['mcasum'][roiname]['raw'][thisrow, :npts] = iraw[iroi].sum(axis=0)
+                            roigrp['mcasum'][roiname]['cor'][thisrow, :npts] = icor[iroi].sum(axis=0)
                 dt.add(" map xrf 6")
         else:  # version 1.0.1
             print("version1?")
@@ -1194,7 +1462,7 @@ class GSEXRM_MapFile(object):
 #                 sum_raw[thisrow, :npts, :] = np.array(sumraw).transpose()
 #                 sum_cor[thisrow, :npts, :] = np.array(sumcor).transpose()
 
-        if self.has_xrd1d and row.xrdq is not None:
+        if has_xrd1d and row.xrdq is not None:
             if thisrow < 2:
                 if len(row.xrdq.shape) == 1:
                     self.xrmmap['xrd1d/q'][:] = row.xrdq
@@ -1223,7 +1491,7 @@ class GSEXRM_MapFile(object):
                     wdggrp['counts'][thisrow,] = row.xrd1d_wdg[:,:,iwdg]
 
 
-        if self.has_xrd2d and row.xrd2d is not None:
+        if has_xrd2d and row.xrd2d is not None:
             self.xrmmap['xrd2d/counts'][thisrow,] = row.xrd2d
         # dt.add("xrd done")
         self.last_row = thisrow
@@ -1262,13 +1530,12 @@ class GSEXRM_MapFile(object):
             self.npts = npts
 
         if self.chunksize is None:
-            self.chunksize = (1, min(2048, npts), nchan)
-            self.chunksize = (128, 128, 256)
-            self.chunksize = (4, min(256, npts), 512)
+            self.chunksize = map_chunksize(self.layout, npts, nchan)
+        self.xrmmap.attrs['Chunk_Layout'] = 'default' if self.layout is None else self.layout
 
+        NSTART = NINIT*2
         if nrows_expected is not None:
             NSTART = max(NINIT, nrows_expected)
-        NSTART = NINIT*2
 
         # positions
         pos = xrmmap['positions']
@@ -1338,7 +1605,7 @@ class GSEXRM_MapFile(object):
                                          'cal_quad': quad[i]})
                     dgrp.create_dataset('counts', (NSTART, npts, nchan), np.uint32,
                                         chunks=self.chunksize,
-                                        maxshape=(None, npts, nchan), **self.compress_args)
+                                        maxshape=(None, npts, nchan), **self.counts_compress_args)
 
                     for name, dtype in (('realtime',  np.int64),
                                         ('livetime',  np.int64),
@@ -1379,7 +1646,7 @@ class GSEXRM_MapFile(object):
                                  'cal_quad': quad[0]})
             dgrp.create_dataset('counts', (NSTART, npts, nchan), np.float64,
                                 chunks=self.chunksize,
-                                maxshape=(None, npts, nchan), **self.compress_args)
+                                maxshape=(None, npts, nchan), **self.counts_compress_args)
 
             for name, dtype in (('realtime',  np.int64),
                                 ('livetime',  np.int64),
@@ -1475,7 +1742,7 @@ class GSEXRM_MapFile(object):
 
                 dgrp.create_dataset('counts', (NSTART, npts, nchan), np.uint32,
                                     chunks=self.chunksize,
-                                    maxshape=(None, npts, nchan), **self.compress_args)
+                                    maxshape=(None, npts, nchan), **self.counts_compress_args)
                 for name, dtype in (('realtime', np.int64),
                                     ('livetime', np.int64),
                                     ('dtfactor', np.float32),
@@ -1497,7 +1764,7 @@ class GSEXRM_MapFile(object):
             self.add_data(dgrp, 'roi_limits',  roi_limits[: ,0, :])
             dgrp.create_dataset('counts', (NSTART, npts, nchan), np.uint32,
                                 chunks=self.chunksize,
-                                maxshape=(None, npts, nchan), **self.compress_args)
+                                maxshape=(None, npts, nchan), **self.counts_compress_args)
             # roi map data
             scan = xrmmap['roimap']
             det_addr = [i.strip() for i in scaler_addrs]
@@ -1828,12 +2095,14 @@ class GSEXRM_MapFile(object):
                     elif type_attr.startswith('mca'):
                         oldnrow, npts, nchan = g['counts'].shape
                         g['counts'].resize((nrow, npts, nchan))
+                        resize_cumsum(g, nrow)
                         for aname in ('livetime', 'realtime',
                                       'inpcounts', 'outcounts', 'dtfactor'):
                             g[aname].resize((nrow, npts))
                     elif type_attr.startswith('virtual mca'):
                         oldnrow, npts, nchan = g['counts'].shape
                         g['counts'].resize((nrow, npts, nchan))
+                        resize_cumsum(g, nrow)
                         for aname in ('livetime', 'realtime',
                                       'inpcounts', 'outcounts', 'dtfactor'):
                             if aname in g:
@@ -1888,12 +2157,14 @@ class GSEXRM_MapFile(object):
             oldnrow, npts, nchan = realmca_groups[0]['counts'].shape
             for g in realmca_groups:
                 g['counts'].resize((nrow, npts, nchan))
+                resize_cumsum(g, nrow)
                 for aname in ('livetime', 'realtime',
                               'inpcounts', 'outcounts', 'dtfactor'):
                     g[aname].resize((nrow, npts))
 
             for g in virtmca_groups:
                 g['counts'].resize((nrow, npts, nchan))
+                resize_cumsum(g, nrow)
 
             g = self.xrmmap['positions/pos']
             old, npts, nx = g.shape
@@ -3101,7 +3372,7 @@ class GSEXRM_MapFile(object):
                 en  = mapdat['energy'][:]
                 emin = (np.abs(en-Erange[0])).argmin()
                 emax = (np.abs(en-Erange[1])).argmin()+1
-            raw = mapdat['counts'][:, :, emin:emax].sum(axis=2)
+            raw = self._mca_erange_map(mapdat, emin, emax)
             cor = raw * mapdat['dtfactor']
             self.save_roi(roiname, det, raw, cor, Erange, 'energy', unit)
         self.get_roi_list('mcasum', force=True)
@@ -3294,12 +3565,164 @@ class GSEXRM_MapFile(object):
 
 
     def get_mca_erange(self, det=None, dtcorrect=None,
-                       emin=None, emax=None, by_energy=True):
-        '''extract map for an ROI set here, by energy range:
+                       emin=None, emax=None, by_energy=True, use_cumsum=True):
+        '''extract map of counts summed over an energy range
+
+        Parameters
+        ---------
+        det        :  str or int or None      detector name [None -> sum]
+        dtcorrect  :  optional, bool [None]   dead-time correct data
+        emin       :  float or None           low end of range [None -> first channel]
+        emax       :  float or None           high end of range [None -> last channel]
+        by_energy  :  bool [True]             whether emin, emax are energies in keV,
+                                              or channel numbers
+        use_cumsum :  bool [True]             whether to use channel cumulative sums
+
+        Returns
+        -------
+        ndarray (NY, NX) of counts summed over the range, with emax included
 
-        not implemented
+        Notes
+        -----
+        if the channel cumulative sums have been built (see build_mca_cumsum),
+        the map is made from 2 reads of these sums and a subtraction, plus
+        reads of fewer than `binsize` channels of counts at each end of the
+        range, instead of reading all channels of the range.
         '''
-        pass
+        if dtcorrect is None:
+            dtcorrect = self.dtcorrect
+        dgrp = self.get_detgroup(det)
+        nchan = dgrp['counts'].shape[2]
+        if by_energy:
+            en = dgrp['energy'][()]
+            c1 = 0 if emin is None else int(np.abs(en-emin).argmin())
+            c2 = nchan if emax is None else int(np.abs(en-emax).argmin())+1
+        else:
+            c1 = 0 if emin is None else int(emin)
+            c2 = nchan if emax is None else int(emax)+1
+        out = self._mca_erange_map(dgrp, c1, c2, use_cumsum=use_cumsum)
+        if dtcorrect and 'dtfactor' in dgrp:
+            out = out*dgrp['dtfactor'][()]
+        return out
+
+    def _mca_erange_map(self, dgrp, c1, c2, use_cumsum=True):
+        "map of counts summed over channels [c1:c2] for a detector group"
+        counts = dgrp['counts']
+        nrows, npts, nchan = counts.shape
+        c1 = max(0, min(int(c1), nchan))
+        c2 = max(c1, min(int(c2), nchan))
+        dset = dgrp.get(CUMSUM_NAME, None) if use_cumsum else None
+        if (dset is not None and int(dset.attrs['nrows']) < nrows and
+            self.write_access and self.check_hostid()):
+            self.build_mca_cumsum(det=dgrp, binsize=int(dset.attrs['binsize']))
+            dset = dgrp[CUMSUM_NAME]
+        if dset is None:
+            return counts[:, :, c1:c2].sum(axis=2, dtype=np.float64)
+
+        # sum[c1:c2] = csum[k2] - csum[k1] + counts[e2:c2] - counts[e1:c1]
+        nvalid = min(nrows, int(dset.attrs['nrows']))
+        binsize = int(dset.attrs['binsize'])
+        k1, k2 = c1//binsize, c2//binsize
+        e1, e2 = min(k1*binsize, nchan), min(k2*binsize, nchan)
+        out = np.zeros((nrows, npts), dtype=np.float64)
+        if k2 > k1:
+            diff = dset[:nvalid, :, k2]
+            if k1 > 0:   # for uint32 sums, this difference wraps as needed
+                diff = diff - dset[:nvalid, :, k1]
+            out[:nvalid] = diff
+        if c2 > e2:
+            out[:nvalid] += counts[:nvalid, :, e2:c2].sum(axis=2)
+        if c1 > e1:
+            out[:nvalid] -= counts[:nvalid, :, e1:c1].sum(axis=2)
+        if nvalid < nrows:   # out-of-date sums in a read-only file
+            out[nvalid:] = counts[nvalid:, :, c1:c2].sum(axis=2)
+        return out
+
+    def build_mca_cumsum(self, det=None, binsize=CUMSUM_BINSIZE, rebuild=False):
+        '''build or bring up to date the cumulative sums of MCA counts over
+        channels, stored as '<det>/counts_cumsum', so that maps for any
+        energy range can be made quickly with get_mca_erange().
+
+        Parameters
+        ---------
+        det      :  str, int, h5py Group or None   detector [None -> all MCA detectors]
+        binsize  :  int [1]          number of channels between stored sums
+        rebuild  :  bool [False]     whether to discard existing sums and rebuild
+
+        Notes
+        -----
+        1. with binsize=1, any range needs only 2 reads of the sums, and the
+           sums take about the same space as the counts.  With larger binsize,
+           the sums take 1/binsize of that space, but ranges that do not start
+           and end on a multiple of binsize also need reads of the counts.
+        2. once built, the sums are updated as rows are added to the map.
+           Rows added without updating the sums (as by older versions) are
+           detected with the 'nrows' attribute, and added here.
+        3. use invalidate_mca_cumsum() after changing counts in any other way.
+        '''
+        if not self.check_hostid():
+            raise GSEXRM_Exception(NOT_OWNER % self.filename)
+        if not self.write_access:
+            raise GSEXRM_Exception(READ_ONLY % self.filename)
+
+        for dgrp in self._cumsum_detgroups(det):
+            counts = dgrp['counts']
+            nrows, npts, nchan = counts.shape
+            edges = cumsum_edges(nchan, binsize)
+            nedges = len(edges)
+            dset = dgrp.get(CUMSUM_NAME, None)
+            if dset is not None and (rebuild or
+                                     int(dset.attrs.get('binsize', 0)) != binsize or
+                                     dset.shape[1:] != (npts, nedges)):
+                del dgrp[CUMSUM_NAME]
+                dset = None
+            if dset is None:
+                dtype = cumsum_dtype(counts.dtype)
+                chunks = map_chunksize('roi', npts, nedges, itemsize=dtype.itemsize)
+                dset = dgrp.create_dataset(CUMSUM_NAME, (nrows, npts, nedges),
+                                           dtype, maxshape=(None, npts, nedges),
+                                           chunks=chunks, shuffle=True,
+                                           **self.compress_args)
+                dset.attrs['binsize'] = binsize
+                dset.attrs['nrows'] = 0
+            elif dset.shape[0] < nrows:
+                dset.resize((nrows, npts, nedges))
+
+            # read counts in whole chunks of rows, limiting memory use
+            step = max(1, CUMSUM_NBYTES // (8*npts*(nchan+1)))
+            if counts.chunks is not None:
+                step = counts.chunks[0]*max(1, step//counts.chunks[0])
+            for r0 in range(int(dset.attrs['nrows']), nrows, step):
+                rows = slice(r0, min(r0+step, nrows))
+                dset[rows] = cumsum_at_edges(counts[rows], edges, dset.dtype)
+                dset.attrs['nrows'] = rows.stop
+        self.h5root.flush()
+
+    def invalidate_mca_cumsum(self, det=None):
+        '''remove the channel cumulative sums for a detector [None -> all],
+        as needed if the counts are changed other than by adding rows'''
+        if not self.check_hostid():
+            raise GSEXRM_Exception(NOT_OWNER % self.filename)
+        if not self.write_access:
+            raise GSEXRM_Exception(READ_ONLY % self.filename)
+        for dgrp in self._cumsum_detgroups(det):
+            if CUMSUM_NAME in dgrp:
+                del dgrp[CUMSUM_NAME]
+        self.h5root.flush()
+
+    def _cumsum_detgroups(self, det=None):
+        "detector groups with MCA counts, for channel cumulative sums"
+        if isinstance(det, h5py.Group):
+            return [det]
+        if det is not None:
+            return [self.get_detgroup(det)]
+        out = []
+        for grp in self.xrmmap.values():
+            if (isinstance(grp, h5py.Group) and
+                'mca' in bytes2str(grp.attrs.get('type', '')) and
+                'counts' in grp and grp['counts'].ndim == 3):
+                out.append(grp)
+        return out
 
     def get_rgbmap(self, rroi, groi, broi, det=None, rdet=None, gdet=None, bdet=None,
                    hotcols=None, dtcorrect=None, scale_each=True, scales=None):
@@ -3439,9 +3862,205 @@ def process_mapfolder(path, take_ownership=False, **kws):
         finally:
             g.close()
 
-def process_mapfolders(folders, ncpus=None, take_ownership=False, **kws):
+class _SerialExecutor:
+    """executor that runs each call when it is submitted, so that
+    process_mapfolders(ncpus=0) reports progress as with a pool"""
+    def submit(self, fcn, *args, **kws):
+        fut = Future()
+        try:
+            fut.set_result(fcn(*args, **kws))
+        except Exception as exc:
+            fut.set_exception(exc)
+        return fut
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+class _MapFolderJob:
+    """row-level processing of one map folder for process_mapfolders():
+    rows are read by a pool of workers, and written in order"""
+    def __init__(self, folder, take_ownership=False, **kws):
+        self.folder = Path(folder).as_posix()
+        self.mapfile = None
+        self.pending = deque()
+        self.irow = self.nextrow = self.nrows = self.first_row = 0
+        self.start_time = time.time()
+        self.status = {'status': 'running', 'filename': None, 'nrows': 0,
+                       'rows_done': 0, 'rows_failed': 0, 'retries': 0,
+                       'bytes_read': 0, 'rows_per_sec': 0.0,
+                       'bytes_per_sec': 0.0, 'eta': None, 'error': None}
+        if not (Path(folder).is_dir() and isGSEXRM_MapFolder(folder)):
+            self.fail('not a map folder')
+            return
+        print( '\n build map for: %s' % folder)
+        try:
+            self.mapfile = GSEXRM_MapFile(folder=folder, **kws)
+            self.status['filename'] = self.mapfile.filename
+            if take_ownership:
+                self.mapfile.take_ownership()
+            if not self.mapfile.check_ownership():
+                self.fail('not owner')
+                return
+            rows = self.mapfile.rows_to_process()
+        except Exception:
+            self.fail(repr(sys.exc_info()[1]))
+            return
+        if rows is not None:
+            self.irow, self.nrows = rows
+            self.nextrow = self.irow
+        self.first_row = self.irow
+        self.start_time = time.time()
+        self.status['nrows'] = self.nrows
+        self.status['rows_done'] = self.irow
+
+    def fail(self, error):
+        "mark folder as failed"
+        self.status['status'] = 'failed'
+        self.status['error'] = error
+        print( 'Could not convert %s: %s' % (self.folder, error))
+        self.close()
+
+    def close(self):
+        for entry in self.pending:
+            entry['future'].cancel()
+        self.pending.clear()
+        if self.mapfile is not None:
+            try:
+                self.mapfile.close()
+            except Exception:
+                pass
+            self.mapfile = None
+
+    def can_read(self):
+        return self.status['status'] == 'running' and self.nextrow < self.nrows
+
+    def is_done(self):
+        return (self.status['status'] == 'running' and
+                self.irow >= self.nrows and len(self.pending) == 0)
+
+    def submit(self, pool):
+        "submit the next row to be read, returning whether one was submitted"
+        try:
+            kws = self.mapfile.maprow_args(self.nextrow)
+        except Exception:
+            self.fail(repr(sys.exc_info()[1]))
+            return False
+        if kws is None:
+            self.nrows = self.status['nrows'] = self.nextrow
+            return False
+        nbytes = 0
+        for key in ('xrffile', 'xrdfile', 'xpsfile', 'sisfile'):
+            fname = Path(self.folder, kws[key])
+            if fname.is_file():
+                nbytes += fname.stat().st_size
+        self.pending.append({'irow': self.nextrow, 'kws': kws, 'attempts': 1,
+                             'nbytes': nbytes,
+                             'future': pool.submit(_read_maprow, kws)})
+        self.nextrow += 1
+        return True
+
+    def store_rows(self, pool, retries=2):
+        "write completed rows, in order, retrying rows that failed to read"
+        while (self.status['status'] == 'running' and len(self.pending) > 0
+               and self.pending[0]['future'].done()):
+            entry = self.pending[0]
+            try:
+                row = entry['future'].result()
+            except Exception:
+                row = None
+            if row is None or not row.read_ok:
+                if entry['attempts'] <= retries:
+                    entry['attempts'] += 1
+                    self.status['retries'] += 1
+                    entry['future'] = pool.submit(_read_maprow, entry['kws'])
+                    return
+                self.status['rows_failed'] += 1
+                if entry['irow'] == 0:
+                    # the file layout is built from the first row
+                    self.fail('first row unreadable')
+                    return
+            self.pending.popleft()
+            irow = entry['irow']
+            try:
+                if row is not None:
+                    flush = irow < 2 or (irow % 64 == 0)
+                    complete = irow >= self.nrows-1
+                    self.mapfile.store_row(irow, row, flush=flush,
+                                           complete=complete)
+            except Exception:
+                self.fail(repr(sys.exc_info()[1]))
+                return
+            self.irow = irow + 1
+            self.status['rows_done'] = self.irow
+            self.status['bytes_read'] += entry['nbytes']
+
+    def update_rates(self, now=None):
+        "update rows/sec, bytes/sec, and estimated time to finish"
+        if now is None:
+            now = time.time()
+        elapsed = max(now - self.start_time, 1.e-6)
+        rows_per_sec = (self.irow - self.first_row)/elapsed
+        self.status['rows_per_sec'] = rows_per_sec
+        self.status['bytes_per_sec'] = self.status['bytes_read']/elapsed
+        if rows_per_sec > 0:
+            self.status['eta'] = (self.nrows - self.irow)/rows_per_sec
+
+    def finish(self, error=None):
+        "finish writing map file"
+        if error is not None:
+            self.fail(error)
+            return
+        try:
+            mfile = self.mapfile
+            mfile.resize_arrays(mfile.last_row+1, force_shrink=True)
+            mfile.h5root.flush()
+        except Exception:
+            self.fail(repr(sys.exc_info()[1]))
+            return
+        self.update_rates()
+        self.status['status'] = 'complete'
+        self.status['eta'] = 0
+        self.close()
+
+def process_mapfolders(folders, ncpus=None, take_ownership=False,
+                       callback=None, status_file=None, retries=2,
+                       queue_depth=None, executor='processes',
+                       status_interval=1.0, **kws):
     """process a list of map folders
     with optional keywords passed to GSEXRM_MapFile
+
+    Arguments
+    ---------
+      folders          list of map folders
+      ncpus            number of workers for reading rows [cpu count - 1].
+                       With ncpus=0, rows are read in the calling process,
+                       and folders are processed one at a time.
+      take_ownership   whether to take ownership of map files [False]
+      callback         function called with progress, a dict with keys of
+                       folder names and values of dicts of status [None]
+      status_file      name of JSON file to write with progress [None]
+      retries          number of times to retry reading a failed row [2]
+      queue_depth      maximum number of rows being read at once [2*ncpus]
+      executor         'processes' or 'threads' for reading rows ['processes']
+      status_interval  minimum time in seconds between progress reports [1.0]
+
+    Returns
+    -------
+      dict of final status for each folder.
+
+    Notes
+    -----
+      1. Rows from all folders are read by one pool of workers, so that a
+         single large map is also converted in parallel. Each map file has
+         a single writer that adds rows in order, and writing completed rows
+         takes priority over reading more rows.
+      2. The status for each folder has 'status' ('running', 'complete', or
+         'failed'), 'nrows', 'rows_done', 'rows_failed', 'retries',
+         'bytes_read', 'rows_per_sec', 'bytes_per_sec', 'eta' (seconds),
+         and 'error'.
+      3. A row that fails to be read is retried up to `retries` times. If it
+         still fails, it is skipped (as with GSEXRM_MapFile.process) and
+         counted in 'rows_failed', and the rest of the folder is processed.
     """
     try:
         kws['xrdcal'] = kws.pop('poni')
@@ -3449,11 +4068,74 @@ def process_mapfolders(folders, ncpus=None, take_ownership=False, **kws):
         pass
     if ncpus is None:
         ncpus = max(1, mp.cpu_count()-1)
+    executor = executor.lower()
     if ncpus == 0:
-        for path in folders:
-            process_mapfolder(path, **kws)
+        pool = _SerialExecutor()
+        queue_depth = 1
+    elif executor.startswith('thread'):
+        pool = ThreadPoolExecutor(max_workers=ncpus)
+    elif executor.startswith('proc'):
+        methods = mp.get_all_start_methods()
+        method = 'forkserver' if 'forkserver' in methods else 'spawn'
+        pool = ProcessPoolExecutor(max_workers=ncpus,
+                                   mp_context=mp.get_context(method))
     else:
-        pool = mp.Pool(ncpus)
-        kws['take_ownership'] = take_ownership
-        myfunc = partial(process_mapfolder, **kws)
-        pool.map(myfunc, folders)
+        raise ValueError("executor must be 'threads' or 'processes'")
+    if queue_depth is None:
+        queue_depth = 2*ncpus
+    queue_depth = max(1, queue_depth)
+
+    progress = {}
+    jobs = []
+    for path in folders:
+        job = _MapFolderJob(path, take_ownership=take_ownership, **kws)
+        progress[job.folder] = job.status
+        if job.status['status'] == 'running':
+            jobs.append(job)
+
+    last_report = [0]
+    def report(force=False):
+        now = time.time()
+        if not force and now < last_report[0] + status_interval:
+            return
+        last_report[0] = now
+        for job in jobs:
+            job.update_rates(now)
+        if status_file is not None:
+            tmpfile = '%s.tmp' % status_file
+            with open(tmpfile, 'w') as fh:
+                json.dump({'time': isotime(), 'folders': progress}, fh,
+                          indent=1, default=str)
+            os.replace(tmpfile, status_file)
+        if callable(callback):
+            callback(progress)
+
+    try:
+        report(force=True)
+        while len(jobs) > 0:
+            # writing completed rows in order takes priority over reading
+            for job in jobs:
+                job.store_rows(pool, retries)
+            # fill the queue of rows being read, favoring folders with fewest
+            ninflight = sum(len(job.pending) for job in jobs)
+            while ninflight < queue_depth:
+                readable = [job for job in jobs if job.can_read()]
+                if len(readable) == 0:
+                    break
+                job = min(readable, key=lambda j: len(j.pending))
+                if job.submit(pool):
+                    ninflight += 1
+            finished = [job for job in jobs if job.is_done()]
+            for job in finished:
+                job.finish()
+            jobs = [job for job in jobs if job.status['status'] == 'running']
+            report(force=len(finished) > 0)
+            futures = [entry['future'] for job in jobs for entry in job.pending]
+            if len(futures) > 0:
+                wait(futures, timeout=status_interval, return_when=FIRST_COMPLETED)
+    finally:
+        for job in jobs:
+            job.finish(error='interrupted')
+        pool.shutdown(cancel_futures=True)
+        report(force=True)
+    return progress
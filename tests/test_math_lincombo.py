@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+""" Tests of linear combination fitting """
+import numpy as np
+
+from larch import Group
+from larch.math import lincombo_fit, lincombo_fitall, lincombo_fit_stack
+from larch.math import lincombo_fitting
+from larch.math.lincombo_fitting import (_lincombo_qp, _lincombo_qp_stack,
+                                         lincombo_solve)
+
+energy = np.linspace(7100, 7200, 401)
+
+def make_standard(i):
+    cen = 7120 + 3*i
+    norm = (0.5 + np.arctan((energy-cen)/2)/np.pi +
+            (0.3+0.1*i)*np.exp(-(energy-cen-5-i)**2/(8+i)))
+    return Group(energy=energy, norm=norm, filename=f'std{i}')
+
+def make_data(noise=0.003, seed=1):
+    comps = [make_standard(i) for i in range(8)]
+    rng = np.random.default_rng(seed)
+    norm = (0.5*comps[2].norm + 0.3*comps[5].norm + 0.2*comps[6].norm +
+            noise*rng.normal(size=len(energy)))
+    return Group(energy=energy, norm=norm), comps
+
+def test_lincombo_fitall_matches_lincombo_fit():
+    group, comps = make_data()
+    for sum_to_one in (True, False):
+        results = lincombo_fitall(group, comps, max_ncomps=3,
+                                  minvals=[0]*len(comps), maxvals=[1]*len(comps),
+                                  sum_to_one=sum_to_one)
+        assert list(results[0].weights) == ['std2', 'std5', 'std6']
+        for res in results[:4]:
+            names = list(res.weights)
+            fit = lincombo_fit(group, [c for c in comps if c.filename in names],
+                               weights=[1.0/len(names)]*len(names),
+                               minvals=[0]*len(names), maxvals=[1]*len(names),
+                               sum_to_one=sum_to_one)
+            assert abs(res.chisqr - fit.chisqr) < 1.e-6*fit.chisqr
+            for name in names:
+                assert abs(res.weights[name] - fit.weights[name]) < 1.e-5
+                assert abs(res.params[name].stderr - fit.params[name].stderr) < 1.e-3*fit.params[name].stderr
+
+def test_lincombo_fitall_bounds():
+    group, comps = make_data()
+    ncomps = len(comps)
+    results = lincombo_fitall(group, comps, max_ncomps=3, minvals=[0.1]*ncomps,
+                              maxvals=[0.45]*ncomps, sum_to_one=True)
+    threads = lincombo_fitall(group, comps, max_ncomps=3, minvals=[0.1]*ncomps,
+                              maxvals=[0.45]*ncomps, sum_to_one=True,
+                              executor='threads', max_workers=3)
+    for res, res2 in zip(results, threads):
+        wts = np.array(list(res.weights.values()))
+        assert abs(wts.sum() - 1) < 1.e-10
+        assert np.all(wts > 0.1 - 1.e-10) and np.all(wts < 0.45 + 1.e-10)
+        assert res.weights == res2.weights
+    redchi = [res.redchi for res in results]
+    assert redchi == sorted(redchi)
+
+def test_lincombo_qp_release():
+    # the first weight is held at its upper bound, then must be released
+    amat = np.array([[1, -2, -1], [-2, 2, 0], [-1, 1, 2]], dtype=float)
+    ydat = np.array([-3, 0, -1], dtype=float)
+    gram, bvec = amat.T @ amat, amat.T @ ydat
+    lb, ub = np.zeros(3), np.ones(3)
+    wts, converged = _lincombo_qp(gram, bvec, lb, ub, sum_to_one=False)
+    assert converged
+    assert np.allclose(wts, [5/6, 1, 0])
+    wts, converged = _lincombo_qp(gram, bvec, lb, ub, sum_to_one=False,
+                                  maxiter=5)
+    assert not converged
+    assert np.allclose(wts, [1, 1, 0])
+    out = lincombo_solve(gram, bvec, [(0, 1, 2)], lb, ub, sum_to_one=False)
+    assert np.allclose(out[0], [5/6, 1, 0])
+
+def test_lincombo_fitall_not_converged(monkeypatch):
+    group, comps = make_data()
+    ncomps = len(comps)
+    kws = dict(max_ncomps=3, minvals=[0.1]*ncomps, maxvals=[0.45]*ncomps)
+    results = lincombo_fitall(group, comps, **kws)
+    # without convergence, combinations are fit with lmfit
+    monkeypatch.setattr(lincombo_fitting, '_lincombo_qp',
+                        lambda gram, bvec, lb, ub, sum_to_one=True: (lb, False))
+    fits = lincombo_fitall(group, comps, **kws)
+    for res, fit in zip(results[:3], fits):
+        assert list(res.weights) == list(fit.weights)
+        assert fit.result.method != 'linear least-squares'
+        assert abs(res.chisqr - fit.chisqr) < 1.e-5*fit.chisqr
+
+def test_lincombo_fit_stack():
+    comps = [make_standard(i) for i in (1, 3, 5, 7)]
+    amat = np.array([c.norm for c in comps])
+    rng = np.random.default_rng(2)
+    wts = rng.dirichlet([1, 1, 1, 1], size=(5, 6))*1.2 - 0.05
+    data = wts @ amat + 0.01*rng.normal(size=(5, 6, len(energy)))
+    out = lincombo_fit_stack(data, energy, comps, minvals=[0]*4, maxvals=[1]*4,
+                             xmin=7110, xmax=7190, chunk_size=12)
+    assert out.chisqr.shape == (5, 6)
+    assert np.allclose(out.total, 1.0)
+    for iy, ix in ((0, 0), (2, 3), (4, 5)):
+        group = Group(energy=energy, norm=data[iy, ix])
+        fit = lincombo_fit(group, comps, minvals=[0]*4, maxvals=[1]*4,
+                           weights=[0.25]*4, xmin=7110, xmax=7190)
+        assert abs(out.chisqr[iy, ix] - fit.chisqr) < 1.e-3*fit.chisqr
+        for comp in comps:
+            label = comp.filename
+            assert out.weights[label][iy, ix] > -1.e-10
+            assert abs(out.weights[label][iy, ix] - fit.weights[label]) < 1.e-3
+
+def make_stack_data(shape=(5, 6), seed=2):
+    comps = [make_standard(i) for i in (1, 3, 5, 7)]
+    amat = np.array([c.norm for c in comps])
+    rng = np.random.default_rng(seed)
+    wts = rng.dirichlet([1, 1, 1, 1], size=shape)*1.2 - 0.05
+    data = wts @ amat + 0.01*rng.normal(size=shape + (len(energy),))
+    return data, comps
+
+def test_lincombo_fit_stack_not_converged(monkeypatch):
+    data, comps = make_stack_data()
+    kws = dict(minvals=[0]*4, maxvals=[1]*4, xmin=7110, xmax=7190)
+    ref = lincombo_fit_stack(data, energy, comps, **kws)
+    assert ref.converged.shape == (5, 6) and ref.converged.all()
+
+    amat = np.array([c.norm for c in comps]).T
+    gram = amat.T @ amat
+    bmat = data.reshape(-1, len(energy)) @ amat
+    lb, ub = np.zeros(4), np.ones(4)
+    wts, converged = _lincombo_qp_stack(gram, bmat, lb, ub, maxiter=1)
+    assert not converged.all()
+    wts, converged = _lincombo_qp_stack(gram, bmat, lb, ub)
+    assert converged.all()
+
+    # spectra not converged in the stack are solved one at a time
+    def stack_1iter(*args, **kws):
+        return _lincombo_qp_stack(*args, maxiter=1, **kws)
+    monkeypatch.setattr(lincombo_fitting, '_lincombo_qp_stack', stack_1iter)
+    out = lincombo_fit_stack(data, energy, comps, **kws)
+    assert out.converged.all()
+    for label in ref.weights:
+        assert np.allclose(out.weights[label], ref.weights[label], atol=1.e-8)
+
+    # and are NaN if that also fails
+    def qp_fail(gram, bvec, lb, ub, sum_to_one=True, maxiter=None):
+        return lb, False
+    monkeypatch.setattr(lincombo_fitting, '_lincombo_qp', qp_fail)
+    out = lincombo_fit_stack(data, energy, comps, **kws)
+    assert not out.converged.all()
+    for label in ref.weights:
+        wts = out.weights[label]
+        assert np.all(np.isnan(wts[~out.converged]))
+        assert np.allclose(wts[out.converged], ref.weights[label][out.converged])
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+""" Tests of PCA """
+import numpy as np
+
+from larch import Group
+from larch.math import pca_train, pca_fit, pca_train_incremental, pca_fit_stack
+
+energy = np.linspace(7100, 7200, 401)
+
+def make_spectra(nspec=120, seed=0):
+    amat = []
+    for i in (1, 3, 5, 7):
+        cen = 7120 + 3*i
+        amat.append(0.5 + np.arctan((energy-cen)/2)/np.pi +
+                    (0.3+0.1*i)*np.exp(-(energy-cen-5-i)**2/(8+i)))
+    rng = np.random.default_rng(seed)
+    wts = rng.dirichlet([1, 1, 1, 1], size=nspec)
+    return wts @ np.array(amat) + 0.005*rng.normal(size=(nspec, len(energy)))
+
+def test_pca_train_incremental():
+    spectra = make_spectra()
+    groups = [Group(energy=energy, norm=y, filename=f'g{i}')
+              for i, y in enumerate(spectra)]
+    model = pca_train(groups, xmin=7110, xmax=7190)
+    stack = pca_train_incremental(spectra.reshape(8, 15, -1), x=energy,
+                                  xmin=7110, xmax=7190, chunk_size=40)
+    assert stack.nspectra == len(groups)
+    assert stack.nsig == model.nsig
+    assert np.allclose(stack.mean, model.mean)
+    assert np.allclose(stack.eigenvalues[:10], model.eigenvalues[:10])
+    for i in range(4):
+        assert np.allclose(abs(stack.components[i]), abs(model.components[i]),
+                           atol=1.e-10)
+
+    streamed = pca_train_incremental(iter(groups), xmin=7110, xmax=7190,
+                                     chunk_size=50)
+    assert streamed.labels == model.labels
+    assert np.allclose(streamed.eigenvalues[:3], model.eigenvalues[:3], rtol=0.05)
+
+def test_pca_fit_stack():
+    spectra = make_spectra()
+    groups = [Group(energy=energy, norm=y) for y in spectra]
+    model = pca_train(groups, xmin=7110, xmax=7190)
+    for rescale in (False, True):
+        out = pca_fit_stack(spectra[:6].reshape(2, 3, -1), model, x=energy,
+                            ncomps=4, rescale=rescale)
+        assert out.weights.shape == (2, 3, 4)
+        for i in (0, 5):
+            pca_fit(groups[i], model, ncomps=4, rescale=rescale)
+            result = groups[i].pca_result
+            iy, ix = divmod(i, 3)
+            assert np.allclose(out.weights[iy, ix], result.weights, rtol=1.e-4)
+            assert abs(out.data_scale[iy, ix] - result.data_scale) < 1.e-5
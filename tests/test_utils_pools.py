@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+""" Tests of thread and process pool helpers """
+import multiprocessing as mp
+import pytest
+from larch import Group
+from larch.utils.pools import pool_kind, fork_pool, run_chunks, _CHUNK_STATE
+
+class FakeWriter:
+    def __init__(self):
+        self.lines = []
+    def write(self, text):
+        self.lines.append(text)
+
+def test_pool_kind(monkeypatch):
+    assert pool_kind('threads') == 'threads'
+    assert pool_kind('Thread') == 'threads'
+    assert pool_kind('processes') == 'processes'
+    with pytest.raises(ValueError):
+        pool_kind('bogus', 'caller')
+
+    # without 'fork', processes fall back to threads, with a warning
+    monkeypatch.setattr(mp, 'get_all_start_methods', lambda: ['spawn'])
+    _larch = Group(writer=FakeWriter())
+    assert pool_kind('processes', 'caller', _larch=_larch) == 'threads'
+    assert _larch.writer.lines[0].startswith('caller: process pool needs')
+
+def test_fork_pool():
+    with fork_pool(max_workers=2) as pool:
+        assert pool.submit(pow, 2, 10).result() == 1024
+
+def test_run_chunks():
+    items = [i*i for i in range(11)]
+    chunks = []
+    def func(start, stop):
+        chunks.append((start, stop))
+        return [(i, items[i]) for i in range(start, stop)]
+    expected = list(enumerate(items))
+    assert run_chunks(func, 11) == expected
+    assert chunks == [(0, 11)]
+    chunks.clear()
+    assert run_chunks(func, 11, executor='threads', max_workers=3) == expected
+    assert sorted(chunks) == [(0, 3), (3, 7), (7, 11)]
+    # the function is inherited by the forked workers, not pickled
+    assert run_chunks(func, 11, executor='processes', max_workers=4) == expected
+    assert len(_CHUNK_STATE) == 0
+    assert run_chunks(func, 0, executor='threads') == []
+    with pytest.raises(ValueError):
+        run_chunks(func, 11, executor='bogus')
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+""" Tests of Autobk """
+from pathlib import Path
+import numpy as np
+
+from larch import Group
+from larch.io import read_ascii
+from larch.xafs import autobk, autobk_batch, pre_edge
+from larch.xafs.autobk import interp_operator, _autobk_batch_run
+
+basedir = Path(__file__).parent.parent.resolve()
+datafile = Path(basedir, 'examples', 'xafsdata', 'cu_10k.xmu').as_posix()
+
+def make_series(nspectra=6, seed=1):
+    dat = read_ascii(datafile)
+    pre_edge(dat)
+    rng = np.random.default_rng(seed)
+    groups = []
+    for i in range(nspectra):
+        mu = dat.mu*(1 + 0.002*i) + 0.001*i + 0.0005*rng.normal(size=len(dat.mu))
+        groups.append(Group(energy=dat.energy.copy(), mu=mu))
+    return dat, groups
+
+def test_autobk_batch_matches_autobk():
+    dat, groups = make_series()
+    kws = dict(rbkg=1.0, kweight=2, ek0=dat.e0, edge_step=dat.edge_step,
+               clamp_lo=1)
+    singles = [Group(energy=g.energy, mu=g.mu) for g in groups]
+    for grp in singles:
+        autobk(grp, **kws)
+    autobk_batch(groups, **kws)
+    for grp, single in zip(groups, singles):
+        assert len(grp.chi) == len(single.chi)
+        assert abs(grp.chi - single.chi).max() < 0.05*abs(single.chi).max()
+        assert grp.autobk_details.chisqr <= 1.0001*single.autobk_details.chisqr
+
+def test_autobk_batch_executor():
+    dat, groups = make_series(4)
+    _, pgroups = make_series(4)
+    autobk_batch(groups, rbkg=1.0, kweight=2, calc_uncertainties=True)
+    autobk_batch(pgroups, rbkg=1.0, kweight=2, calc_uncertainties=True,
+                 executor='processes', max_workers=2)
+    for grp, pgrp in zip(groups, pgroups):
+        assert hasattr(pgrp, 'e0') and hasattr(pgrp, 'delta_chi')
+        assert abs(grp.e0 - pgrp.e0) < 1.e-8
+        assert abs(grp.chi - pgrp.chi).max() < 1.e-3*abs(grp.chi).max()
+
+def test_autobk_batch_setups():
+    dat, groups = make_series(4)
+    i0 = np.searchsorted(dat.energy, dat.e0)
+    e1, e2 = dat.energy[i0], dat.energy[i0+1]
+    # different ek0 between the same two energy points share one setup
+    for i, grp in enumerate(groups):
+        grp.ek0 = e1 + (0.1 + 0.2*i)*(e2 - e1)
+    setups = {}
+    setup_kws = dict(rbkg=1.0, kweight=2)
+    out = _autobk_batch_run(groups, setup_kws, edge_step=dat.edge_step,
+                            setups=setups)
+    assert len(setups) == 1
+    assert all(res['ek0'] == e1 for res in out)
+    # a given ek0 is used as is
+    ek0 = e1 + 0.5*(e2 - e1)
+    out = _autobk_batch_run(groups, setup_kws, ek0=ek0,
+                            edge_step=dat.edge_step, setups=setups)
+    assert len(setups) == 2
+    assert all(res['ek0'] == ek0 for res in out)
+
+def test_interp_operator():
+    x = np.sort(np.random.default_rng(3).uniform(-1, 16, 400))
+    xout = np.arange(0, 16.5, 0.05)
+    y = np.sin(2*x) + 0.1*x
+    assert np.allclose(interp_operator(x, xout) @ y, np.interp(xout, x, y),
+                       rtol=1.e-12, atol=1.e-12)
+
+def test_autobk_linear_interp():
+    spline = read_ascii(datafile)
+    linear = read_ascii(datafile)
+    autobk(spline, rbkg=1.0, kweight=2)
+    autobk(linear, rbkg=1.0, kweight=2, interp='linear',
+           calc_uncertainties=True)
+    assert linear.autobk_details.interp == 'linear'
+    assert len(linear.delta_chi) == len(linear.chi)
+    assert abs(linear.chi - spline.chi).max() < 0.1*abs(spline.chi).max()
+
+    _, groups = make_series(2)
+    autobk_batch(groups, rbkg=1.0, kweight=2, interp='linear')
+    assert abs(groups[0].chi - spline.chi).max() < 0.1*abs(spline.chi).max()
+
+def test_autobk_linear_interp_roundtrip():
+    from larch.utils.jsonutils import encode4js, decode4js
+    from larch.xafs.autobk import autobk_delta_chi
+    dat = read_ascii(datafile)
+    autobk(dat, rbkg=1.0, kweight=2, interp='linear', calc_uncertainties=True)
+    restored = decode4js(encode4js(dat))
+    assert not hasattr(restored.autobk_details, 'interp_op')
+    autobk_delta_chi(restored)
+    assert np.allclose(restored.delta_chi, dat.delta_chi)
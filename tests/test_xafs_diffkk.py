@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+""" Tests of diffKK """
+from pathlib import Path
+import numpy as np
+
+from larch.io import read_ascii
+from larch.xafs import diffkk
+from larch.xafs.diffkk import (kkmclf, kkmclr, kkmclr_sca, kkmclf_fft,
+                               kkmclr_fft, kkmclr_chunked)
+
+basedir = Path(__file__).parent.parent.resolve()
+datafile = Path(basedir, 'examples', 'xafsdata', 'cu_10k.xmu').as_posix()
+
+def test_kk_methods_agree():
+    e = np.linspace(8500, 9800, 400)
+    f = np.exp(-((e-8990)/20)**2) + 0.1*np.sin(e/25)
+    ref = kkmclr(e, f)
+    scale = abs(ref).max()
+    assert abs(kkmclr_sca(e, f) - ref).max() < 1.e-12*scale
+    assert abs(kkmclr_fft(e, f) - ref).max() < 1.e-10*scale
+    assert abs(kkmclr_chunked(e, f, chunk_size=1000) - ref).max() < 1.e-12*scale
+    fwd = kkmclf(e, f)
+    assert abs(kkmclf_fft(e, f) - fwd).max() < 1.e-10*abs(fwd).max()
+
+def test_diffkk_how():
+    data = read_ascii(datafile)
+    out = {}
+    for how in ('fft', 'chunked', 'vector'):
+        dkk = diffkk(data.energy, data.mu, z=29, edge='K',
+                     mback_kws={'e0': 8979, 'order': 4})
+        dkk.kk(how=how)
+        out[how] = dkk.fp
+    assert abs(out['fft'] - out['vector']).max() < 1.e-8
+    assert abs(out['chunked'] - out['vector']).max() < 1.e-8
+
+def test_kk_method_names():
+    from larch.xafs.diffkk import _get_kkmethod
+    assert _get_kkmethod(None) is kkmclr_fft
+    assert _get_kkmethod('FFT') is kkmclr_fft
+    assert _get_kkmethod('sca') is kkmclr_sca
+    assert _get_kkmethod('v') is kkmclr
+    for how in ('', 'bogus', 'scalarx'):
+        try:
+            _get_kkmethod(how)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f'expected ValueError for how={how!r}')
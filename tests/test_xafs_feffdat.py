@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+""" Tests of Feff Path calculations """
+from pathlib import Path
+import numpy as np
+import pytest
+from lmfit import Parameters
+
+from larch.xafs import feffpath, ff2chi
+from larch.xafs.feffdat import feff_cache_stats, set_feff_cache_size
+
+basedir = Path(__file__).parent.parent.resolve()
+feffdir = Path(basedir, 'examples', 'feffit', 'Feff_Cu')
+
+def make_paths(npaths=6):
+    paths = []
+    for i in range(1, npaths+1):
+        e0 = 'del_e0' if i % 3 else 'e0_b'
+        paths.append(feffpath(Path(feffdir, f'feff{i:04d}.dat').as_posix(),
+                              s02='amp', e0=e0, deltar='alpha*reff',
+                              sigma2=f'0.003 + 0.0005*{i}', third='c3',
+                              fourth='c4', ei='eimag'))
+    return paths
+
+def make_params():
+    pars = Parameters()
+    pars.add('amp', 0.9)
+    pars.add('del_e0', 2.5)
+    pars.add('e0_b', -1.0)
+    pars.add('alpha', 0.01)
+    pars.add('c3', 0.0002)
+    pars.add('c4', 0.00003)
+    pars.add('eimag', 0.5)
+    return pars
+
+def test_ff2chi_matches_single_paths():
+    paths = make_paths()
+    pars = make_params()
+    out = ff2chi(paths, params=pars)
+
+    total = np.zeros(len(out.k))
+    for path in make_paths():
+        path.create_path_params(params=pars)
+        path._calc_chi(k=out.k)
+        total += path.chi
+    assert np.allclose(out.chi, total, rtol=1.e-10, atol=1.e-12)
+
+    # per-path outputs written by the batched calculation
+    single = make_paths()[2]
+    single.create_path_params(params=pars)
+    single._calc_chi(k=out.k)
+    assert np.allclose(paths[2].chi, single.chi, rtol=1.e-10, atol=1.e-12)
+
+def test_ff2chi_unused_paths():
+    paths = make_paths(3)
+    pars = make_params()
+    paths[1].use = False
+    paths[2]._feffdat.__reff__ = 0.01
+    with pytest.warns(UserWarning, match='reff is too small'):
+        out = ff2chi(paths, params=pars)
+    for path in paths[1:]:
+        assert np.all(path.chi == 0) and np.all(path.chi_imag == 0)
+    # each unused path has its own output arrays
+    paths[1].chi += 1.0
+    assert np.all(paths[1].chi_imag == 0) and np.all(paths[2].chi == 0)
+    assert np.allclose(out.chi, paths[0].chi)
+
+def test_ff2chi_amplitude_change_reuses_lookup():
+    paths = make_paths(3)
+    pars = make_params()
+    feff_cache_stats(reset=True)
+    ff2chi(paths, params=pars)
+    stats = feff_cache_stats()
+    assert stats['misses'] == 3
+    assert stats['hits'] == 0
+    assert stats['entries'] == 3
+
+    pars['amp'].value = 0.5
+    pars['alpha'].value = 0.02
+    out = ff2chi(paths, params=pars)
+    stats = feff_cache_stats()
+    assert stats['hits'] == 3
+    assert stats['misses'] == 3
+
+    # paths 1 and 2 use del_e0, path 3 uses e0_b
+    pars['del_e0'].value = 3.0
+    ff2chi(paths, params=pars)
+    stats = feff_cache_stats()
+    assert stats['hits'] == 4
+    assert stats['misses'] == 5
+    assert len(out.chi) == len(out.k)
+
+def test_feff_cache_is_bounded():
+    paths = make_paths(2)
+    pars = make_params()
+    feff_cache_stats(reset=True)
+    ff2chi(paths, params=pars)
+    nbytes = feff_cache_stats()['nbytes']
+    set_feff_cache_size(nbytes)
+    try:
+        pars['del_e0'].value = 1.0
+        pars['e0_b'].value = 1.5
+        ff2chi(paths, params=pars)
+        stats = feff_cache_stats()
+        assert stats['nbytes'] <= nbytes
+        assert stats['evictions'] == 2
+    finally:
+        set_feff_cache_size(64*1024*1024)
+        feff_cache_stats(reset=True)
+
+def test_sigma2_correldebye():
+    from larch.xafs.sigma2_models import (sigma2_correldebye,
+                                          sigma2_correldebye_np,
+                                          sigma2_correldebye_py,
+                                          sigma2_cache_clear,
+                                          _sigma2_correldebye_cached)
+    sigma2_cache_clear()
+    for i in (1, 2, 5, 12):
+        path = feffpath(Path(feffdir, f'feff{i:04d}.dat').as_posix())
+        geom = path._feffdat.geom
+        atoms = [[float(atom[j]) for atom in geom] for j in (4, 5, 6, 3)]
+        for tk in (10.0, 300.0):
+            args = (len(geom), tk, 315.0, path._feffdat.rnorman, *atoms)
+            sig2 = sigma2_correldebye_py(*args)
+            assert abs(sigma2_correldebye_np(*args) - sig2) < 1.e-12
+            for _ in range(2):
+                assert abs(sigma2_correldebye(*args) - sig2) < 1.e-8
+    info = _sigma2_correldebye_cached.cache_info()
+    assert info.misses == 8 and info.hits == 8
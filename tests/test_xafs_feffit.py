@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+""" Tests of Feffit """
+from pathlib import Path
+import numpy as np
+from lmfit import Parameters
+
+from larch import Group
+from larch.fitting import param, param_group
+from larch.xafs import (feffpath, ff2chi, feffit_transform, feffit_dataset,
+                        feffit, feffit_conf_map)
+from larch.xafs.feffit import _feffit_resid, _feffit_jacobian
+
+basedir = Path(__file__).parent.parent.resolve()
+feffdir = Path(basedir, 'examples', 'feffit', 'Feff_Cu')
+
+def make_paths():
+    paths = []
+    for i in range(1, 4):
+        paths.append(feffpath(Path(feffdir, f'feff{i:04d}.dat').as_posix(),
+                              s02='amp', e0='del_e0', sigma2=f'sig2_{i}',
+                              deltar='alpha*reff', third='c3'))
+    return paths
+
+def make_data(noise=0.002, seed=2):
+    pars = Parameters()
+    for name, val in (('amp', 0.85), ('del_e0', 3.0), ('alpha', 0.005),
+                      ('c3', 0.0001), ('sig2_1', 0.0085), ('sig2_2', 0.012),
+                      ('sig2_3', 0.007)):
+        pars.add(name, val)
+    model = ff2chi(make_paths(), params=pars, kmax=18)
+    rng = np.random.default_rng(seed)
+    return Group(k=model.k, chi=model.chi + noise*rng.normal(size=len(model.k)))
+
+def make_pargroup():
+    return param_group(amp=param(1, vary=True), del_e0=param(1, vary=True),
+                       alpha=param(0, vary=True), c3=param(0, vary=True),
+                       sig2_1=param(0.005, vary=True, min=0),
+                       sig2_2=param(0.005, vary=True, min=0),
+                       sig2_3=param(0.005, vary=True, min=0))
+
+def make_dataset(fitspace='r', refine_bkg=False):
+    trans = feffit_transform(kmin=3, kmax=16, kw=[2, 3], dk=4, window='kaiser',
+                             rmin=1.4, rmax=3.5, fitspace=fitspace)
+    return feffit_dataset(data=make_data(), pathlist=make_paths(),
+                          transform=trans, refine_bkg=refine_bkg)
+
+def test_feffit_jacobian_matches_finite_differences():
+    for fitspace, refine_bkg in (('r', False), ('k', False), ('q', False),
+                                 ('r', True)):
+        dset = make_dataset(fitspace=fitspace, refine_bkg=refine_bkg)
+        out = feffit(make_pargroup(), dset)
+        params = out.params
+        var_names = [name for name, par in params.items() if par.vary]
+        jac = _feffit_jacobian(params, datasets=[dset])
+        assert jac.shape == (len(out.fit_details.residual), len(var_names))
+
+        for ivar, name in enumerate(var_names):
+            val = params[name].value
+            step = 1.e-6*max(abs(val), 0.01)
+            params[name].value = val + step
+            params.update_constraints()
+            rhi = _feffit_resid(params, datasets=[dset])
+            params[name].value = val - step
+            params.update_constraints()
+            rlo = _feffit_resid(params, datasets=[dset])
+            params[name].value = val
+            params.update_constraints()
+            numjac = (rhi - rlo)/(2*step)
+            scale = max(abs(numjac).max(), 1.e-8)
+            assert abs(numjac - jac[:, ivar]).max() < 1.e-4*scale, (fitspace, name)
+
+def test_feffit_analytic_jacobian():
+    out1 = feffit(make_pargroup(), make_dataset())
+    out2 = feffit(make_pargroup(), make_dataset(), analytic_jacobian=True)
+    assert out2.nfev < out1.nfev
+    assert abs(out2.chi_square - out1.chi_square) < 1.e-4*out1.chi_square
+    for name in out1.var_names:
+        par1, par2 = out1.params[name], out2.params[name]
+        assert abs(par1.value - par2.value) < 0.01*par1.stderr
+
+def test_feffit_multiple_datasets_executor():
+    def make_datasets():
+        return [make_dataset(), make_dataset(fitspace='k')]
+    out1 = feffit(make_pargroup(), make_datasets())
+    out2 = feffit(make_pargroup(), make_datasets(), executor='threads',
+                  max_workers=2)
+    assert out2.nfev == out1.nfev
+    assert abs(out2.chi_square - out1.chi_square) < 1.e-8*out1.chi_square
+    for name in out1.var_names:
+        assert abs(out1.params[name].value - out2.params[name].value) < 1.e-8
+
+def test_feffit_multiple_datasets_processes():
+    from larch.xafs.feffit import _WORKER_STATE
+    def make_datasets():
+        return [make_dataset(), make_dataset(fitspace='k')]
+    out1 = feffit(make_pargroup(), make_datasets())
+    out2 = feffit(make_pargroup(), make_datasets(), executor='processes',
+                  max_workers=2)
+    assert out1.nfev == 57
+    assert out2.nfev == out1.nfev
+    assert abs(out2.chi_square - out1.chi_square) < 1.e-8*out1.chi_square
+    for name in out1.var_names:
+        assert out1.params[name].value == out2.params[name].value
+    assert len(_WORKER_STATE) == 0
+
+def test_feffit_conf_map():
+    out = feffit(make_pargroup(), make_dataset())
+    amp = out.params['amp'].value
+    progress = []
+    def callback(xvals, yvals, sigma_map, ndone, ntotal):
+        progress.append(np.isfinite(sigma_map).sum())
+    x1, y1, smap1 = feffit_conf_map(out, 'amp', 'del_e0', nsamples=5,
+                                    callback=callback)
+    x2, y2, smap2 = feffit_conf_map(out, 'amp', 'del_e0', nsamples=5,
+                                    executor='processes', max_workers=2)
+    assert progress == [5, 10, 15, 20, 25]
+    assert out.params['amp'].value == amp and out.params['amp'].vary
+    assert smap1.shape == (5, 5) and smap1[2, 2] < 0.01
+    assert smap1[2, 0] > 2 and smap1[2, 4] > 2
+    assert np.allclose(x1, x2) and np.allclose(smap1, smap2, atol=1.e-4)
+
+def test_feffit_conf_executor_restores_state():
+    from larch.xafs.feffit import _CONF_STATE
+    out = feffit(make_pargroup(), make_dataset())
+    x1, y1, smap1 = feffit_conf_map(out, 'amp', 'del_e0', nsamples=3,
+                                    executor='threads')
+    assert smap1.shape == (3, 3) and np.isfinite(smap1).all()
+    try:
+        feffit_conf_map(out, 'amp', 'del_e0', nsamples=3, executor='bogus')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('expected ValueError for unknown executor')
+    assert out.params['amp'].vary and out.params['del_e0'].vary
+    assert len(_CONF_STATE) == 0
+
+def test_expr_names_cache():
+    from larch.xafs.feffit import _expr_names
+    _expr_names.cache_clear()
+    assert _expr_names('amp*2 + sqrt(del_e0)') == {'amp', 'sqrt', 'del_e0'}
+    out = feffit(make_pargroup(), make_dataset(), analytic_jacobian=True)
+    assert out.success
+    info = _expr_names.cache_info()
+    assert info.maxsize == 1024 and info.currsize > 1 and info.hits > 0
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+""" Tests of running Feff and the Feff run cache """
+import os
+import sys
+from pathlib import Path
+
+from larch.xafs import FeffRunner, FeffRunCache, feff_batch
+
+# stand-in for a Feff executable: writes outputs based on feff.inp
+FAKE_FEFF = f"""#!{sys.executable}
+import os
+text = open('feff.inp').read()
+with open('feff0001.dat', 'w') as fh:
+    fh.write('feff0001 ' + str(len(text)))
+with open('phase.pad', 'w') as fh:
+    fh.write('phases')
+with open('runs.txt', 'a') as fh:
+    fh.write(os.getcwd() + chr(10))
+print('done with fake feff')
+"""
+
+FEFFINP = """TITLE test
+* a comment
+POTENTIALS
+  0 29 Cu
+  1 29 Cu
+ATOMS
+  0.0 0.0 0.0 0 Cu
+  1.8 1.8 0.0 1 Cu
+END
+"""
+
+def make_exe(tmp_path):
+    exe = Path(tmp_path, 'fakefeff')
+    exe.write_text(FAKE_FEFF)
+    exe.chmod(0o755)
+    return exe.as_posix()
+
+def test_feffrunner_cache(tmp_path):
+    exe = make_exe(tmp_path)
+    cache = Path(tmp_path, 'cache')
+    folders = [Path(tmp_path, f'run{i}') for i in range(2)]
+    # same input, apart from comments and whitespace
+    inputs = [FEFFINP, FEFFINP.replace('  0 29', '0   29') + '* more\n']
+    for folder, text in zip(folders, inputs):
+        folder.mkdir()
+        Path(folder, 'feff.inp').write_text(text)
+    cwd = os.getcwd()
+    runs = []
+    for folder in folders:
+        runner = FeffRunner(folder=folder.as_posix(), verbose=False,
+                            use_cache=True, cache_folder=cache)
+        runner.run(exe=exe)
+        runs.append(runner)
+    assert os.getcwd() == cwd
+    assert [r.from_cache for r in runs] == [False, True]
+    assert runs[0].cache_key == runs[1].cache_key
+    assert Path(folders[1], 'feff0001.dat').read_text() == \
+        Path(folders[0], 'feff0001.dat').read_text()
+    # feff ran only once, in the first folder
+    assert Path(folders[1], 'runs.txt').read_text().strip() == folders[0].as_posix()
+    assert Path(folders[1], 'feff.inp').read_text() == inputs[1]
+
+def test_feff_batch(tmp_path):
+    exe = make_exe(tmp_path)
+    cache = Path(tmp_path, 'cache')
+    texts = [FEFFINP, FEFFINP.replace('1.8 1.8', '1.9 1.9')]
+    folders = [Path(tmp_path, f'site{i}').as_posix() for i in range(2)]
+    cwd = os.getcwd()
+    out = feff_batch(texts, folders=folders, exe=exe, cache_folder=cache,
+                     max_workers=2)
+    assert os.getcwd() == cwd
+    assert [o.error for o in out] == [None, None]
+    assert [o.from_cache for o in out] == [False, False]
+    assert out[0].cache_key != out[1].cache_key
+    for folder in folders:
+        assert Path(folder, 'feff0001.dat').is_file()
+        assert Path(folder, 'phase.pad').is_file()
+        # each job ran in its own temporary folder
+        assert Path(folder, 'runs.txt').read_text().strip() != folder
+
+    out = feff_batch(texts, folders=folders, exe=exe, cache_folder=cache,
+                     executor='processes')
+    assert [o.from_cache for o in out] == [True, True]
+
+def test_feffrunner_cache_exe(tmp_path):
+    exe = make_exe(tmp_path)
+    cache = FeffRunCache(Path(tmp_path, 'cache'))
+    key = cache.key(FEFFINP, exe=exe)
+    assert key == cache.key(FEFFINP + '* comment\n', exe=exe)
+    assert key != cache.key(FEFFINP, exe='fakefeff')
+    # same name, different executable file
+    other = Path(tmp_path, 'other')
+    other.mkdir()
+    exe2 = make_exe(other)
+    assert key != cache.key(FEFFINP, exe=exe2)
+    # updated executable
+    with open(exe, 'a') as fh:
+        fh.write('# version 2\n')
+    assert key != cache.key(FEFFINP, exe=exe)
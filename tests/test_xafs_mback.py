@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+""" Tests of MBACK normalization """
+from pathlib import Path
+import numpy as np
+
+from larch import Group
+from larch.io import read_ascii
+from larch.xafs import mback, mback_batch
+
+basedir = Path(__file__).parent.parent.resolve()
+datafile = Path(basedir, 'examples', 'xafsdata', 'cu_10k.xmu').as_posix()
+
+def make_groups(ngroups=6, seed=0):
+    dat = read_ascii(datafile)
+    rng = np.random.default_rng(seed)
+    return [Group(energy=dat.energy.copy(),
+                  mu=dat.mu*(1 + 0.05*i) + 0.01*i +
+                     0.002*rng.normal(size=len(dat.mu)))
+            for i in range(ngroups)]
+
+def test_mback_batch_matches_mback():
+    groups = make_groups()
+    singles = [Group(energy=g.energy, mu=g.mu) for g in groups]
+    for grp in singles:
+        mback(grp, z=29, edge='K', e0=8979, order=3)
+    mback_batch(groups, z=29, edge='K', e0=8979, order=3)
+    threaded = make_groups()
+    mback_batch(threaded, z=29, edge='K', e0=8979, order=3,
+                executor='threads', max_workers=2)
+    forked = make_groups()
+    mback_batch(forked, z=29, edge='K', e0=8979, order=3,
+                executor='processes', max_workers=2)
+    for single, grp, tgrp, pgrp in zip(singles, groups, threaded, forked):
+        assert abs(grp.e0 - single.e0) < 1.e-9
+        assert abs(grp.edge_step - single.edge_step) < 1.e-6*single.edge_step
+        assert np.allclose(grp.norm, single.norm, atol=1.e-6)
+        assert np.allclose(grp.f2, single.f2)
+        assert np.allclose(tgrp.norm, single.norm, atol=1.e-6)
+        assert np.allclose(pgrp.norm, tgrp.norm)
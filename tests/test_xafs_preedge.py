@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+""" Tests of pre-edge subtraction and normalization """
+from pathlib import Path
+import numpy as np
+
+from larch import Group
+from larch.io import read_ascii
+from larch.math import interp
+from larch.xafs import (pre_edge, preedge, preedge_stack, find_e0, energy_align,
+                        energy_align_batch, energy_align_merge)
+
+basedir = Path(__file__).parent.parent.resolve()
+datafile = Path(basedir, 'examples', 'xafsdata', 'cu_10k.xmu').as_posix()
+
+def make_stack(nspectra=8, seed=0):
+    dat = read_ascii(datafile)
+    rng = np.random.default_rng(seed)
+    mu = [dat.mu*(1+0.01*i) + 0.01*i + 0.002*rng.normal(size=len(dat.mu))
+          for i in range(nspectra)]
+    return dat.energy, np.array(mu)
+
+def test_preedge_stack_matches_preedge():
+    energy, mu = make_stack()
+    for kws in (dict(e0=8980.0), dict(e0=8980.0, nnorm=2, nvict=2),
+                dict(e0=8980.0, pre1=-150, pre2=-40, norm1=100, norm2=600),
+                dict(e0=8980.0, npre=0)):
+        out = preedge_stack(energy, mu, **kws)
+        for i, spectrum in enumerate(mu):
+            single = preedge(energy, spectrum, **kws)
+            assert abs(out['edge_step'][i] - single['edge_step']) < 1.e-9
+            for attr in ('norm', 'pre_edge', 'post_edge'):
+                assert np.allclose(out[attr][i], single[attr], atol=1.e-9)
+
+def test_pre_edge_stack_group():
+    energy, mu = make_stack(4)
+    grp = Group(energy=energy, mu=mu)
+    pre_edge(grp)
+    assert grp.norm.shape == mu.shape
+    assert grp.edge_step.shape == (4,)
+    for i in range(4):
+        assert abs(grp.e0[i] - find_e0(energy, mu[i])) < 1.0
+        single = Group(energy=energy, mu=mu[i])
+        pre_edge(single, e0=grp.e0[i])
+        assert np.allclose(grp.norm[i], single.norm, atol=1.e-9)
+        assert np.allclose(grp.flat[i], single.flat, atol=1.e-9)
+
+def test_energy_align_batch():
+    ref = read_ascii(datafile)
+    pre_edge(ref)
+    rng = np.random.default_rng(1)
+    shifts = np.array([-6.0, -1.5, 0.0, 0.8, 2.0, 7.0])
+    groups = []
+    for eshift in shifts:
+        mu = 1.1*interp(ref.energy, ref.mu, ref.energy + eshift, kind='cubic')
+        grp = Group(energy=ref.energy.copy(),
+                    mu=mu + 0.002*rng.normal(size=len(mu)))
+        pre_edge(grp)
+        groups.append(grp)
+    out = energy_align_batch(groups, ref)
+    assert abs(out - shifts).max() < 0.05
+    assert abs(groups[-1].eshift - out[-1]) < 1.e-12
+    for grp, eshift in zip(groups[1:4], out[1:4]):
+        assert abs(energy_align(grp, ref) - eshift) < 1.e-3
+    out2 = energy_align_batch(groups, ref, executor='threads', max_workers=2)
+    assert np.allclose(out, out2)
+    out3 = energy_align_batch(groups, ref, executor='processes', max_workers=4)
+    assert np.allclose(out, out3)
+
+    merged = energy_align_merge(groups, reference=ref)
+    assert np.allclose(merged.eshifts, out)
+    assert len(merged.energy) == len(merged.mu) == len(merged.mu_std)
+    assert merged.mu_std.max() < 0.05
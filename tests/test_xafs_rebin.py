@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+""" Tests of rebinning XAFS data """
+from pathlib import Path
+import numpy as np
+
+from larch import Group
+from larch.io import read_ascii
+from larch.xafs import pre_edge, rebin_xafs, rebin_xafs_stack
+
+basedir = Path(__file__).parent.parent.resolve()
+datafile = Path(basedir, 'examples', 'xafsdata', 'cu_10k.xmu').as_posix()
+
+def test_rebin_xafs_stack_matches_rebin_xafs():
+    dat = read_ascii(datafile)
+    pre_edge(dat)
+    rng = np.random.default_rng(0)
+    mu = np.array([dat.mu + 0.002*rng.normal(size=len(dat.mu))
+                   for i in range(5)])
+    mu_err = 0.002*np.ones_like(mu)
+    for method in ('boxcar', 'centroid', 'spline'):
+        out = rebin_xafs_stack(dat.energy, mu, dat.e0, method=method,
+                               mu_err=mu_err)
+        assert out.mu.shape == out.delta_mu.shape == out.mu_err.shape
+        assert out.mu.shape == (5, len(out.energy))
+        for i in range(5):
+            grp = Group(energy=dat.energy, mu=mu[i], e0=dat.e0)
+            rebin_xafs(grp, method=method)
+            assert np.allclose(grp.rebinned.energy, out.energy)
+            assert np.allclose(grp.rebinned.mu, out.mu[i], atol=1.e-12)
+            assert np.allclose(grp.rebinned.delta_mu, out.delta_mu[i],
+                               atol=1.e-12, equal_nan=True)
+        if method == 'boxcar':
+            # averaging over bins reduces the uncertainty
+            assert np.all(out.mu_err <= 0.002 + 1.e-12)
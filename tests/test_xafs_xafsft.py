@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+""" Tests of XAFS Fourier transforms """
+import numpy as np
+
+from larch import Group
+from larch.xafs import (xftf, xftr, xftf_fast, xftr_fast, ftwindow,
+                        cauchy_wavelet)
+
+def make_chis(nspectra=5, seed=0):
+    k = 0.05*np.arange(321)
+    rng = np.random.default_rng(seed)
+    chi = [np.sin(2*2.5*k + 0.1*i)*np.exp(-0.006*k*k) + 0.01*rng.normal(size=len(k))
+           for i in range(nspectra)]
+    return k, np.array(chi)
+
+def test_xftf_xftr_stack():
+    k, chis = make_chis()
+    stack = Group(k=k, chi=chis)
+    xftf(stack, kmin=2, kmax=14, dk=3, kweight=2, with_phase=True)
+    xftr(stack, rmin=1, rmax=3, with_phase=True)
+    assert stack.chir.shape == (len(chis), len(stack.r))
+    assert stack.kwin.shape == k.shape
+    for i, chi in enumerate(chis):
+        single = Group(k=k, chi=chi)
+        xftf(single, kmin=2, kmax=14, dk=3, kweight=2, with_phase=True)
+        xftr(single, rmin=1, rmax=3, with_phase=True)
+        for attr in ('chir', 'chir_mag', 'chir_pha', 'chiq', 'chiq_pha'):
+            assert np.allclose(getattr(stack, attr)[i], getattr(single, attr),
+                               rtol=1.e-12, atol=1.e-12)
+
+def test_xftf_fast_stack():
+    k, chis = make_chis()
+    chir = xftf_fast(chis, nfft=1024)
+    chiq = xftr_fast(chir, nfft=1024)
+    assert chir.shape == (len(chis), 512)
+    for i, chi in enumerate(chis):
+        assert np.allclose(chir[i], xftf_fast(chi, nfft=1024), atol=1.e-12)
+        assert np.allclose(chiq[i], xftr_fast(chir[i], nfft=1024), atol=1.e-12)
+
+def test_ftwindow_cache():
+    k = 0.05*np.arange(401)
+    win1 = ftwindow(k, xmin=2, xmax=15, dx=3, window='kaiser')
+    win1[:] = 0.0
+    win2 = ftwindow(k, xmin=2, xmax=15, dx=3, window='kaiser')
+    assert win2.max() > 0.99
+    assert win2.flags.writeable
+
+def test_cauchy_wavelet():
+    k, chis = make_chis(1)
+    grp = Group(k=k, chi=chis[0])
+    cauchy_wavelet(grp, kweight=2, rmax_out=6)
+
+    # direct, one R value at a time
+    kstep, nfft = 0.05, 2048
+    nrpts = len(grp.wcauchy_r)
+    xnew = np.zeros(nfft//2)
+    xnew[:len(k)] = chis[0]*k**2
+    tff = np.fft.fft(xnew, n=2*nfft)
+    omega = np.pi*np.arange(nfft)/(kstep*nfft)
+    cauchy_sum = np.log(2*np.pi) - np.log(1.0+np.arange(nrpts)).sum()
+    for i in (1, nrpts//3, nrpts-1):
+        aom = nrpts*omega/(2*grp.wcauchy_r[i])
+        aom[0] = 1.e-19
+        filt = np.exp(cauchy_sum + nrpts*np.log(aom) - aom)
+        row = np.fft.ifft(filt*tff[:nfft], 2*nfft)[:len(k)]
+        assert np.allclose(grp.wcauchy[i], row, rtol=1.e-10, atol=1.e-12)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+""" Tests of XASPipeline """
+from pathlib import Path
+import numpy as np
+import h5py
+
+from larch import Group
+from larch.io import read_ascii
+from larch.xafs import XASPipeline, pre_edge, autobk, xftf
+from larch.xafs.xaspipeline import XASCSVSink, iter_xas_source
+
+basedir = Path(__file__).parent.parent.resolve()
+datafile = Path(basedir, 'examples', 'xafsdata', 'cu_10k.xmu').as_posix()
+
+autobk_kws = dict(rbkg=1.0, kweight=2, ek0=8980.0)
+xftf_kws = dict(kmin=2, kmax=14, dk=4, kweight=2)
+
+def make_stack(nspectra=12, seed=0):
+    dat = read_ascii(datafile)
+    rng = np.random.default_rng(seed)
+    mu = [dat.mu*(1+0.01*i) + 0.001*rng.normal(size=len(dat.mu))
+          for i in range(nspectra)]
+    return dat.energy, np.array(mu)
+
+def test_xaspipeline_matches_steps():
+    energy, mu = make_stack()
+    pipe = XASPipeline(outputs=('e0', 'edge_step', 'chi', 'chir_mag'),
+                       autobk_kws=autobk_kws, xftf_kws=xftf_kws,
+                       chunk_size=5)
+    out = pipe.run([(energy, mu)])
+    assert len(out) == len(mu)
+    for i in (0, 7, 11):
+        name, result = out[i]
+        # x-arrays are included for array outputs
+        assert sorted(result) == ['chi', 'chir_mag', 'e0', 'edge_step', 'k', 'r']
+        grp = Group(energy=energy, mu=mu[i])
+        pre_edge(grp)
+        autobk(grp, **autobk_kws)
+        xftf(grp, **xftf_kws)
+        assert abs(result['e0'] - grp.e0) < 1.e-6
+        assert abs(result['edge_step'] - grp.edge_step) < 1.e-6
+        assert np.allclose(result['chi'], grp.chi, atol=1.e-5)
+        assert np.allclose(result['chir_mag'], grp.chir_mag, atol=1.e-5)
+
+def test_xaspipeline_hdf5_sink(tmp_path):
+    energy, mu = make_stack(6)
+    groups = [Group(energy=energy, mu=m, filename=f'scan{i}')
+              for i, m in enumerate(mu)]
+    pipe = XASPipeline(outputs=('edge_step', 'norm', 'chi'),
+                       autobk_kws=autobk_kws, chunk_size=4,
+                       executor='threads', max_workers=2)
+    fname = Path(tmp_path, 'out.h5').as_posix()
+    assert pipe.run(groups, sink=fname) == 6
+    expected = pipe.run(groups)
+    with h5py.File(fname, 'r') as h5file:
+        root = h5file['xas_pipeline']
+        assert len(root) == 6
+        grp = root['spectrum_000004']
+        assert grp.attrs['name'] == 'scan4'
+        assert sorted(grp.keys()) == ['chi', 'energy', 'k', 'norm']
+        assert np.allclose(grp['chi'][()], expected[4][1]['chi'])
+
+def test_xaspipeline_csv_sink(tmp_path):
+    energy, mu = make_stack(3)
+    pipe = XASPipeline(autobk_kws=autobk_kws, xftf_kws=xftf_kws)
+    assert pipe.outputs == ('norm', 'chi', 'chir_mag', 'energy', 'k', 'r')
+    expected = pipe.run([(energy, mu)])
+    fname = Path(tmp_path, 'out.csv').as_posix()
+    assert pipe.run([(energy, mu)], sink=fname) == 3
+    folder = Path(tmp_path, 'out')
+    assert sorted(p.name for p in folder.iterdir())[:3] == \
+        ['000000_0_0_energy.csv', '000000_0_0_k.csv', '000000_0_0_r.csv']
+    for xname, cols in (('energy', ['energy', 'norm']), ('k', ['k', 'chi']),
+                        ('r', ['r', 'chir_mag'])):
+        fname = Path(folder, f'000002_0_2_{xname}.csv')
+        assert fname.read_text().split('\n')[0] == ','.join(cols)
+        data = np.loadtxt(fname, delimiter=',', skiprows=1)
+        for i, col in enumerate(cols):
+            assert np.allclose(data[:, i], expected[2][1][col])
+    summary = Path(tmp_path, 'out.csv').read_text().split()
+    assert summary == ['name', '0_0', '0_1', '0_2']
+
+    # a folder for the sink, and scalar-only outputs
+    with XASCSVSink(Path(tmp_path, 'folder').as_posix()) as sink:
+        sink.write('a', {'e0': 8980.0, 'edge_step': 1.2})
+    text = Path(tmp_path, 'folder', 'summary.csv').read_text().split()
+    assert text == ['name,e0,edge_step', 'a,8980.0,1.2']
+
+def write_spec(fname, energy, mus):
+    with open(fname, 'w') as fh:
+        fh.write(f'#F {fname}\n')
+        for i, mu in enumerate(mus):
+            fh.write(f'\n#S {i+1} escan\n#N 3\n#L energy  i0  itrans\n')
+            for en, val in zip(energy, mu):
+                fh.write(f'{en:.4f} 1.0 {np.exp(-val):.10f}\n')
+
+def test_iter_xas_source(tmp_path):
+    energy, mu = make_stack(3)
+    fname = Path(tmp_path, 'scans.spec').as_posix()
+    write_spec(fname, energy, mu)
+    def mu_trans(arrays):
+        return -np.log(arrays['itrans']/arrays['i0'])
+    spectra = list(iter_xas_source(fname, yarray=mu_trans))
+    assert [s[0] for s in spectra] == [f'{fname}:{i}.1' for i in (1, 2, 3)]
+    for (name, en, mu_read), mu_in in zip(spectra, mu):
+        assert np.allclose(en, energy, atol=1.e-4)
+        assert np.allclose(mu_read, mu_in, atol=1.e-8)
+    spectra = list(iter_xas_source(fname, yarray='itrans', scans=['2.1']))
+    assert len(spectra) == 1 and np.allclose(spectra[0][2], np.exp(-mu[1]))
+
+    pipe = XASPipeline(steps=('pre_edge',), outputs=('e0', 'norm'))
+    out = pipe.run(iter_xas_source(fname, yarray=mu_trans))
+    assert [o[0] for o in out] == [f'{fname}:{i}.1' for i in (1, 2, 3)]
+    assert sorted(out[0][1]) == ['e0', 'energy', 'norm']
+
+def test_xaspipeline_processes():
+    energy, mu = make_stack(8)
+    kws = dict(outputs=('e0', 'chi', 'chir_mag'), autobk_kws=autobk_kws,
+               xftf_kws=xftf_kws, chunk_size=3)
+    serial = XASPipeline(**kws).run([(energy, mu)])
+    procs = XASPipeline(executor='processes', max_workers=2, **kws).run([(energy, mu)])
+    assert [o[0] for o in procs] == [o[0] for o in serial]
+    for (_, res1), (_, res2) in zip(serial, procs):
+        assert sorted(res1) == sorted(res2)
+        for attr in res1:
+            assert np.allclose(res1[attr], res2[attr])
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+""" Tests of chunk layouts, compression, and rechunking of XRM Map files """
+import h5py
+import numpy as np
+import pytest
+from larch.xrmmap.h5layout import (map_chunksize, map_compression,
+                                   map_compression_label, rechunk_mapfile,
+                                   MAP_LAYOUTS, CHUNK_NBYTES, HAS_HDF5PLUGIN)
+
+def test_map_chunksize():
+    assert map_chunksize(None, 1000, 4096) == (4, 256, 512)
+    assert map_chunksize('Default', 100, 256) == (4, 100, 256)
+    # 'row' chunks are full spectra, capped at 1 MB
+    assert map_chunksize('row', 1000, 4096) == (1, 64, 4096)
+    assert map_chunksize('row', 40, 4096) == (1, 40, 4096)
+    assert map_chunksize('row', 1000, 2048, itemsize=8) == (1, 64, 2048)
+    assert map_chunksize('roi', 1000, 4096) == (16, 256, 32)
+    assert map_chunksize('roi', 100, 16) == (16, 100, 16)
+    assert map_chunksize('area', 1000, 4096) == (8, 8, 4096)
+    for layout in MAP_LAYOUTS:
+        for npts, nchan in ((1000, 4096), (17, 2048), (1, 100000)):
+            chunks = map_chunksize(layout, npts, nchan)
+            assert len(chunks) == 3 and min(chunks) >= 1
+            assert chunks[1] <= npts and chunks[2] <= nchan
+            if layout != 'default' and nchan*4 <= CHUNK_NBYTES:
+                assert 4*np.prod(chunks) <= CHUNK_NBYTES
+    with pytest.raises(ValueError):
+        map_chunksize('columns', 100, 2048)
+
+def test_map_compression():
+    assert map_compression(None) == {}
+    assert map_compression('none') == {}
+    assert map_compression() == {'compression': 'gzip'}
+    assert map_compression('GZIP', 4) == {'compression': 'gzip',
+                                          'compression_opts': 4}
+    assert map_compression('lzf', 4) == {'compression': 'lzf'}
+    assert map_compression_label('gzip', 4) == 'gzip-4'
+    assert map_compression_label(None) == 'none'
+    with pytest.raises(ValueError):
+        map_compression('zstd')
+    if HAS_HDF5PLUGIN:
+        blosc = map_compression('blosc')
+        assert 'compression' in blosc and 'compression_opts' in blosc
+    else:
+        with pytest.raises(ValueError):
+            map_compression('blosc')
+
+def make_mapfile(fname, nrows=12, npts=30, nchan=256):
+    rng = np.random.default_rng(3)
+    counts = rng.poisson(5, (nrows, npts, nchan)).astype(np.uint32)
+    with h5py.File(fname, 'w') as fh:
+        root = fh.create_group('xrmmap')
+        root.attrs['Version'] = '2.1.0'
+        root.attrs['Compression'] = 'gzip-2'
+        det = root.create_group('mcasum')
+        det.attrs['type'] = 'virtual mca detector'
+        det.create_dataset('counts', data=counts, chunks=(4, npts, 64),
+                           maxshape=(None, npts, nchan), compression='gzip')
+        det['counts'].attrs['units'] = 'counts'
+        det.create_dataset('energy', data=np.linspace(0, 20, nchan))
+        xrd = root.create_group('xrd1d')
+        xrd.create_dataset('counts', data=np.ones((nrows, npts, 10)),
+                           chunks=(1, npts, 10))
+        root.create_group('config').create_dataset('names', data=[b'a', b'b'])
+    return counts
+
+def test_rechunk_mapfile(tmp_path):
+    fname = (tmp_path / 'map.h5').as_posix()
+    counts = make_mapfile(fname)
+
+    out = rechunk_mapfile(fname, output=(tmp_path / 'map_roi.h5').as_posix(),
+                          layout='roi', compression='lzf')
+    assert out == (tmp_path / 'map_roi.h5').as_posix()
+    with h5py.File(out, 'r') as fh:
+        root = fh['xrmmap']
+        dset = root['mcasum/counts']
+        assert dset.chunks == map_chunksize('roi', 30, 256)
+        assert dset.compression == 'lzf'
+        assert dset.maxshape == (None, 30, 256)
+        assert dset.attrs['units'] == 'counts'
+        assert np.array_equal(dset[()], counts)
+        assert root.attrs['Compression'] == 'lzf'
+        assert root.attrs['Chunk_Layout'] == 'roi'
+        assert root.attrs['Version'] == '2.1.0'
+        assert root['mcasum'].attrs['type'] == 'virtual mca detector'
+        # other datasets are copied unchanged
+        assert root['xrd1d/counts'].chunks == (1, 30, 10)
+        assert np.array_equal(root['xrd1d/counts'][()], np.ones((12, 30, 10)))
+        assert list(root['config/names'][()]) == [b'a', b'b']
+
+    # in place
+    assert rechunk_mapfile(fname, layout='row') == fname
+    assert not (tmp_path / 'map.h5_rechunk.tmp').exists()
+    with h5py.File(fname, 'r') as fh:
+        dset = fh['xrmmap/mcasum/counts']
+        assert dset.chunks == (1, 30, 256)
+        assert dset.compression == 'gzip'
+        assert np.array_equal(dset[()], counts)
+        assert fh['xrmmap'].attrs['Compression'] == 'gzip'
+
+    with pytest.raises(ValueError):
+        rechunk_mapfile(fname, output=fname)
+    with pytest.raises(ValueError):
+        rechunk_mapfile(fname, layout='bogus')
+    assert not (tmp_path / 'map.h5_rechunk.tmp').exists()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+""" Tests of reading XRF Map rows with a pool of workers, and writing in order """
+import json
+import time
+import larch.xrmmap.xrm_mapfile as xm
+from larch import Group
+
+class FakeRow:
+    """stands in for GSEXRM_MapRow: earlier rows take longer to read,
+    so that workers finish out of order"""
+    attempts = {}
+    def __init__(self, irow=0, folder='', nrows=10, bad_rows=(), flaky_rows=(),
+                 **kws):
+        key = (folder, irow)
+        self.attempts[key] = self.attempts.get(key, 0) + 1
+        time.sleep(0.002*(nrows-irow))
+        if irow in flaky_rows and self.attempts[key] < 2:
+            raise IOError('could not read row %d' % irow)
+        self.irow = irow
+        self.folder = folder
+        self.read_ok = irow not in bad_rows
+
+class FakeH5Root:
+    def flush(self):
+        pass
+
+class FakeMapFile(xm.GSEXRM_MapFile):
+    """map file with rows stored to a list instead of an HDF5 file"""
+    def __init__(self, folder='map', nrows=10, last_row=None, bad_rows=(),
+                 flaky_rows=(), **kws):
+        self.folder = folder
+        self.filename = '%s.h5' % folder
+        self.nrows = nrows
+        if last_row is None:
+            last_row = nrows
+        self.last_row_avail = last_row
+        self.bad_rows = bad_rows
+        self.flaky_rows = flaky_rows
+        self.h5root = FakeH5Root()
+        self.last_row = -1
+        self.stored = []
+
+    def check_ownership(self):
+        return True
+
+    def rows_to_process(self, **kws):
+        return 0, self.nrows
+
+    def maprow_args(self, irow, offset=None, auto_reverse=True):
+        if irow >= self.last_row_avail:
+            return None
+        return dict(irow=irow, folder=self.folder, nrows=self.nrows,
+                    bad_rows=self.bad_rows, flaky_rows=self.flaky_rows,
+                    xrffile='xrf', xrdfile='xrd', xpsfile='xps',
+                    sisfile='sis')
+
+    def store_row(self, irow, row, flush=False, complete=False, callback=None):
+        assert row.irow == irow
+        self.stored.append((irow, row.read_ok, complete))
+        if row.read_ok:
+            self.last_row = irow
+
+    def resize_arrays(self, nrow, force_shrink=True):
+        pass
+
+    def close(self):
+        STORED[self.folder] = self.stored
+
+STORED = {}
+
+def test_process_rows_pooled(monkeypatch):
+    monkeypatch.setattr(xm, 'GSEXRM_MapRow', FakeRow)
+    mfile = FakeMapFile(nrows=12)
+    mfile._process_rows_pooled(0, 12, executor='threads', max_workers=4)
+    assert [s[0] for s in mfile.stored] == list(range(12))
+    assert [s[2] for s in mfile.stored] == [False]*11 + [True]
+
+    # maprow_args() returning None ends the map early
+    mfile = FakeMapFile(nrows=12, last_row=7)
+    mfile._process_rows_pooled(0, 12, executor='threads', max_workers=4)
+    assert [s[0] for s in mfile.stored] == list(range(7))
+    assert mfile.stored[-1][2]
+
+def run_mapfolders(monkeypatch, tmp_path, ncpus):
+    monkeypatch.setattr(xm, 'GSEXRM_MapRow', FakeRow)
+    monkeypatch.setattr(xm, 'isGSEXRM_MapFolder', lambda folder: True)
+    opts = {'a': {'nrows': 16},
+            'b': {'nrows': 12, 'bad_rows': (5,), 'flaky_rows': (2, 9)},
+            'c': {'nrows': 12, 'last_row': 8},
+            'd': {'nrows': 12, 'bad_rows': (0,)}}
+    def mapfile(folder=None, **kws):
+        name = folder.replace('\\', '/').split('/')[-1]
+        return FakeMapFile(folder=folder, **opts[name])
+    monkeypatch.setattr(xm, 'GSEXRM_MapFile', mapfile)
+    folders = []
+    for name in opts:
+        (tmp_path / name).mkdir()
+        folders.append((tmp_path / name).as_posix())
+    (tmp_path / 'a' / 'xrf').write_text('0'*1000)
+    FakeRow.attempts.clear()
+    STORED.clear()
+
+    reports = []
+    status_file = tmp_path / 'status.json'
+    progress = xm.process_mapfolders(folders + [(tmp_path / 'none').as_posix()],
+                                     ncpus=ncpus, executor='threads',
+                                     retries=2, callback=reports.append,
+                                     status_file=status_file.as_posix(),
+                                     status_interval=0.01)
+    assert len(reports) > 1
+    status = json.loads(status_file.read_text())['folders']
+    fa, fb, fc, fd = folders
+    for folder in (fa, fb, fc):
+        assert status[folder]['status'] == 'complete'
+        stored = STORED[folder]
+        assert [s[0] for s in stored] == list(range(len(stored)))
+
+    assert progress[fa]['rows_done'] == 16
+    assert progress[fa]['bytes_read'] == 16000
+    # flaky rows are retried, bad rows are retried then counted as failed
+    assert progress[fb]['rows_done'] == 12
+    assert progress[fb]['rows_failed'] == 1
+    assert progress[fb]['retries'] == 4
+    assert [s[1] for s in STORED[fb]].count(False) == 1
+    assert FakeRow.attempts[(fb, 5)] == 3
+    assert FakeRow.attempts[(fb, 9)] == 2
+    # maprow_args() returning None shortens the map
+    assert progress[fc]['nrows'] == 8
+    assert progress[fc]['rows_done'] == 8
+    assert len(STORED[fc]) == 8
+    assert progress[(tmp_path / 'none').as_posix()]['status'] == 'failed'
+    # a folder whose first row cannot be read fails, with nothing stored
+    assert status[fd]['status'] == 'failed'
+    assert status[fd]['error'] == 'first row unreadable'
+    assert FakeRow.attempts[(fd, 0)] == 3
+    assert STORED[fd] == []
+
+def test_process_mapfolders_threads(monkeypatch, tmp_path):
+    run_mapfolders(monkeypatch, tmp_path, ncpus=4)
+
+def test_process_mapfolders_serial(monkeypatch, tmp_path):
+    run_mapfolders(monkeypatch, tmp_path, ncpus=0)
+
+class FlagRow:
+    "records the keyword arguments for a row, out of order as for FakeRow"
+    def __init__(self, irow=0, **kws):
+        time.sleep(0.002*(8-irow))
+        self.irow = irow
+        self.has_xrf = kws['has_xrf']
+        self.read_ok = True
+
+class XRFMapFile(xm.GSEXRM_MapFile):
+    """map file with real maprow_args() for a folder where some rows
+    have no XRF data, and rows stored to a list"""
+    def __init__(self, folder, nrows=8, no_xrf=(3, 4)):
+        self.folder = folder
+        self.dimension, self.npts, self.nrows_expected = 2, 10, nrows
+        self.rowdata = [(1.0*i, '_unused_' if i in no_xrf else 'xsp3_%03d.h5' % i,
+                         'struck_%03d.nc' % i, 'xps_%03d.nc' % i, 0)
+                        for i in range(nrows)]
+        self.has_xrf, self.has_xrd1d, self.has_xrd2d = True, False, False
+        self.xrmmap = {'xrd1d': Group()}
+        self.xrmmap['xrd1d'].attrs = {}
+        self.xrdcalfile = self.masterfile = None
+        self.mask_xrd2d = self.bkgd_xrd2d = None
+        self.force_no_dtc, self.flip = False, True
+        self.azwdgs, self.qstps = 0, 4096
+        self.stored = []
+
+    def store_row(self, irow, row, flush=False, complete=False, callback=None):
+        self.stored.append((irow, row.irow, row.has_xrf))
+
+def test_process_rows_pooled_xrf_rows(monkeypatch, tmp_path):
+    monkeypatch.setattr(xm, 'GSEXRM_MapRow', FlagRow)
+    mfile = XRFMapFile(tmp_path.as_posix())
+    mfile._process_rows_pooled(0, 8, executor='threads', max_workers=4,
+                               queue_depth=8)
+    # rows are written in order, even though later rows are read first
+    assert [s[0] for s in mfile.stored] == list(range(8))
+    assert [s[1] for s in mfile.stored] == list(range(8))
+    # rows without XRF data do not change the other rows
+    assert [s[2] for s in mfile.stored] == [True]*3 + [False]*2 + [True]*3
+    assert mfile.has_xrf
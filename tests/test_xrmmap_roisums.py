@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+""" Tests of XRF Map ROI sums """
+import h5py
+import numpy as np
+from larch.xrmmap.xrm_mapfile import (GSEXRM_MapFile, calc_roi_sums, mca_cumsum,
+                                     cumsum_edges, cumsum_dtype, cumsum_at_edges,
+                                     update_cumsum, resize_cumsum, CUMSUM_NAME)
+
+def test_calc_roi_sums():
+    rng = np.random.default_rng(1)
+    nmca, npts, nchan, nroi = 3, 50, 512, 6
+    counts = rng.poisson(4, (nmca, npts, nchan)).astype(np.uint32)
+    dtfactor = rng.uniform(1.0, 1.5, (nmca, npts))
+    limits = np.sort(rng.integers(0, nchan, (nroi, nmca, 2)), axis=2)
+    limits[0, 0] = [-5, 20]
+    limits[1, 1] = [500, 600]
+
+    csum = mca_cumsum(counts)
+    assert csum.shape == (nmca, npts, nchan+1)
+    assert csum.dtype == np.uint64
+    assert np.all(csum[..., 0] == 0)
+
+    raw, cor = calc_roi_sums(counts, dtfactor, limits)
+    raw2, cor2 = calc_roi_sums(None, dtfactor, limits, csum=csum)
+    assert np.array_equal(raw, raw2) and np.array_equal(cor, cor2)
+    assert raw.shape == cor.shape == (nroi, nmca, npts)
+    for iroi in range(nroi):
+        for imca in range(nmca):
+            c1, c2 = max(0, limits[iroi, imca, 0]), limits[iroi, imca, 1]
+            expected = counts[imca, :, c1:c2].sum(axis=1)
+            assert np.array_equal(raw[iroi, imca], expected)
+            assert np.allclose(cor[iroi, imca], expected*dtfactor[imca])
+
+    # float counts, and empty ROIs at and past the last channel
+    limits[2, 2] = [nchan, nchan+10]
+    limits[3, 0] = [100, 100]
+    fcounts = counts*0.5
+    raw, cor = calc_roi_sums(fcounts, dtfactor, limits)
+    raw2, cor2 = calc_roi_sums(None, dtfactor, limits, csum=mca_cumsum(fcounts))
+    assert np.allclose(raw, raw2) and np.allclose(cor, cor2)
+    assert np.all(raw[2, 2] == 0) and np.all(raw[3, 0] == 0)
+    assert np.allclose(raw[1, 1], fcounts[1, :, 500:].sum(axis=1))
+
+def test_cumsum_at_edges():
+    rng = np.random.default_rng(2)
+    counts = rng.poisson(4, (5, 20, 100)).astype(np.uint32)
+    edges = cumsum_edges(100, 8)
+    assert edges[0] == 0 and edges[-1] == 100 and len(edges) == 14
+    csum = cumsum_at_edges(counts, edges, cumsum_dtype(counts.dtype))
+    assert csum.dtype == np.uint32 and csum.shape == (5, 20, 14)
+    assert np.array_equal(csum[..., 3] - csum[..., 1], counts[..., 8:24].sum(axis=2))
+    assert np.array_equal(csum[..., -1] - csum[..., -2], counts[..., 96:].sum(axis=2))
+
+    # uint32 sums wrap, but differences are exact
+    counts = np.full((2, 3, 10), 2**30, dtype=np.uint32)
+    csum = cumsum_at_edges(counts, cumsum_edges(10, 1), np.uint32)
+    assert np.all(csum[..., 7] - csum[..., 4] == 3*2**30)
+    assert cumsum_dtype(np.float64) == np.float64
+
+def open_mapfile(fname, write_access=True):
+    "GSEXRM_MapFile for a bare HDF5 file, without a raw data folder"
+    h5root = h5py.File(fname, 'a')
+    mfile = GSEXRM_MapFile.__new__(GSEXRM_MapFile)
+    mfile.h5root, mfile.xrmmap = h5root, h5root.require_group('xrmmap')
+    mfile.write_access, mfile.version, mfile.dtcorrect = write_access, '2.1.0', False
+    mfile.compress_args = {'compression': 'gzip'}
+    mfile.check_hostid = lambda: True
+    return mfile
+
+def test_set_roidata(tmp_path):
+    rng = np.random.default_rng(3)
+    nrows, npts, nchan = 10, 30, 256
+    names = ['Fe Ka', 'Cu Ka', 'Zn Ka']
+    limits = np.array([[[10, 40], [12, 42]], [[100, 130], [101, 131]],
+                       [[200, 256], [190, 260]]])
+    mfile = open_mapfile(tmp_path / 'map.h5')
+    xrmmap = mfile.xrmmap
+    xrmmap.create_dataset('config/rois/name', data=[n.encode() for n in names])
+    xrmmap.create_dataset('config/rois/limits', data=limits)
+    counts, dtfactor = {}, {}
+    for det in ('mca1', 'mca2', 'mcasum'):
+        grp = xrmmap.create_group(det)
+        grp.attrs['type'] = 'virtual mca detector' if det == 'mcasum' else 'mca detector'
+        counts[det] = rng.poisson(2, (nrows, npts, nchan)).astype(np.uint32)
+        dtfactor[det] = rng.uniform(1, 1.2, (nrows, npts))
+        grp.create_dataset('counts', data=counts[det], chunks=(4, npts, 64))
+        grp.create_dataset('dtfactor', data=dtfactor[det])
+        for name in names:
+            for attr in ('raw', 'cor'):
+                xrmmap.create_dataset('roimap/%s/%s/%s' % (det, name, attr),
+                                      (1, npts), np.float64,
+                                      maxshape=(None, npts))
+    mfile.last_row = nrows - 1
+    mfile.set_roidata()
+
+    roimap = xrmmap['roimap']
+    for iroi, name in enumerate(names):
+        sumraw, sumcor = 0, 0
+        for imca, det in enumerate(('mca1', 'mca2')):
+            c1, c2 = limits[iroi, imca]
+            raw = counts[det][:, :, c1:c2].sum(axis=2)
+            assert np.array_equal(roimap[det][name]['raw'][()], raw)
+            assert np.allclose(roimap[det][name]['cor'][()], raw*dtfactor[det])
+            sumraw = sumraw + raw
+            sumcor = sumcor + raw*dtfactor[det]
+        assert np.array_equal(roimap['mcasum'][name]['raw'][()], sumraw)
+        assert np.allclose(roimap['mcasum'][name]['cor'][()], sumcor)
+    mfile.h5root.close()
+
+def make_cumsum_map(fname, counts, nrows):
+    mfile = open_mapfile(fname)
+    grp = mfile.xrmmap.create_group('mcasum')
+    grp.attrs['type'] = 'virtual mca detector'
+    npts, nchan = counts.shape[1:]
+    grp.create_dataset('counts', data=counts[:nrows], chunks=(4, npts, 64),
+                       maxshape=(None, npts, nchan))
+    grp.create_dataset('energy', data=np.linspace(0, 20, nchan))
+    grp.create_dataset('dtfactor', data=np.ones((len(counts), npts)))
+    return mfile, grp
+
+RANGES = ((0, 200), (3, 17), (8, 16), (5, 6), (0, 7), (195, 200), (100, 100))
+
+def test_build_mca_cumsum(tmp_path):
+    rng = np.random.default_rng(4)
+    counts = rng.poisson(3, (22, 25, 200)).astype(np.uint32)
+    mfile, grp = make_cumsum_map(tmp_path / 'map.h5', counts, 20)
+    direct = [mfile._mca_erange_map(grp, c1, c2, use_cumsum=False)
+              for c1, c2 in RANGES]
+    assert CUMSUM_NAME not in grp
+
+    mfile.build_mca_cumsum(binsize=8)
+    dset = grp[CUMSUM_NAME]
+    assert dset.shape == (20, 25, 26) and dset.dtype == np.uint32
+    assert int(dset.attrs['nrows']) == 20 and int(dset.attrs['binsize']) == 8
+    # ranges not on bin edges are summed from the nearest edges and counts
+    for (c1, c2), ref in zip(RANGES, direct):
+        out = mfile._mca_erange_map(grp, c1, c2)
+        assert np.array_equal(ref, counts[:20, :, c1:c2].sum(axis=2))
+        assert np.array_equal(out, ref), (c1, c2)
+
+    # rows added with update_cumsum, with and without a precomputed cumsum
+    grp['counts'].resize((22, 25, 200))
+    resize_cumsum(grp, 22)
+    for irow in (20, 21):
+        grp['counts'][irow] = counts[irow]
+    update_cumsum(grp, 20, counts[20])
+    update_cumsum(grp, 21, None, csum=mca_cumsum(counts[21]))
+    assert int(dset.attrs['nrows']) == 22
+    for c1, c2 in RANGES:
+        out = mfile._mca_erange_map(grp, c1, c2)
+        assert np.array_equal(out, counts[:22, :, c1:c2].sum(axis=2))
+    mfile.h5root.close()
+
+def test_cumsum_stale_rows(tmp_path):
+    rng = np.random.default_rng(5)
+    counts = rng.poisson(3, (20, 25, 200)).astype(np.uint32)
+    mfile, grp = make_cumsum_map(tmp_path / 'map.h5', counts, 16)
+    mfile.build_mca_cumsum(binsize=4)
+    # shrink, then add rows without updating the cumulative sums
+    resize_cumsum(grp, 12)
+    dset = grp[CUMSUM_NAME]
+    assert dset.shape[0] == 12 and int(dset.attrs['nrows']) == 12
+    grp['counts'].resize((20, 25, 200))
+    grp['counts'][12:] = counts[12:]
+    update_cumsum(grp, 18, counts[18])   # past the valid rows: skipped
+    assert int(dset.attrs['nrows']) == 12
+
+    # read-only: stale rows are summed directly
+    mfile.write_access = False
+    out = mfile._mca_erange_map(grp, 5, 30)
+    assert np.array_equal(out, counts[:, :, 5:30].sum(axis=2))
+    assert int(dset.attrs['nrows']) == 12
+
+    # writable: stale rows are caught up first
+    mfile.write_access = True
+    for c1, c2 in RANGES:
+        out = mfile._mca_erange_map(grp, c1, c2)
+        assert np.array_equal(out, counts[:, :, c1:c2].sum(axis=2))
+    assert dset.shape[0] == 20 and int(dset.attrs['nrows']) == 20
+    mfile.h5root.close()